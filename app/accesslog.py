@@ -0,0 +1,186 @@
+# app/accesslog.py
+import asyncio, os, re, threading, time
+
+# generate_config points Xray's access log here; install.sh rotates it with copytruncate.
+ACCESS_LOG_PATH = os.environ.get("VUI_XRAY_ACCESS_LOG", "/var/log/xray/access.log")
+POLL_INTERVAL = float(os.environ.get("VUI_ACCESS_LOG_INTERVAL", "1"))
+# Distinct source IPs are counted over this sliding window (seconds).
+IP_WINDOW = int(os.environ.get("VUI_IP_WINDOW", "180"))
+ONLINE_WINDOW = 60
+MAX_IPS_PER_USER = 64
+LAST_SEEN_TTL = 24 * 3600
+PRUNE_INTERVAL = 10
+# On the first open, replay this much of the existing log so a restarted panel isn't blank.
+BACKLOG_BYTES = 1024 * 1024
+MAX_READ = 8 * 1024 * 1024
+
+# Matches accepted connections in both the old and the current Xray formats:
+#   2024/05/01 12:00:00 1.2.3.4:5678 accepted tcp:example.com:443 [inbound-443 -> direct] email: user1
+#   2024/05/01 12:00:00.123456 from tcp:[2001:db8::1]:5678 accepted tcp:example.com:443 [inbound-443 >> direct] email: user1
+ACCEPTED = re.compile(
+    rb'^(\d{4}/\d\d/\d\d \d\d:\d\d:\d\d)\S* (?:from )?(?:tcp:|udp:)?(\[[^\]\n]+\]|[^\s:]+):\d+ accepted [^\n]*? email: (\S+)',
+    re.M,
+)
+
+
+class LogTailer:
+    """Incremental reader for a file that may be rotated or truncated.
+
+    read() returns the complete lines appended since the last call. Rotation
+    (a new inode at the path) is handled by draining the old handle before
+    switching; truncation (size below our offset) restarts from the top.
+    """
+    def __init__(self, path: str, backlog: int = BACKLOG_BYTES):
+        self.path = path
+        self.backlog = backlog
+        self.file = None
+        self.inode = None
+        self.partial = b""
+        self._opened_before = False
+
+    def _drain(self):
+        chunks, size = [], 0
+        while size < MAX_READ:
+            chunk = self.file.read(MAX_READ - size)
+            if not chunk: break
+            chunks.append(chunk)
+            size += len(chunk)
+        return b"".join(chunks)
+
+    def _open(self, st):
+        self.file = open(self.path, "rb")
+        self.inode = st.st_ino
+        if not self._opened_before and st.st_size > self.backlog:
+            # Start mid-file: drop the first, partial line.
+            self.file.seek(st.st_size - self.backlog)
+            self.file.readline()
+        self._opened_before = True
+
+    def read(self) -> bytes:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        data = b""
+        if self.file is not None:
+            data = self._drain()
+            if st is None or st.st_ino != self.inode or st.st_size < self.file.tell():
+                self.file.close()
+                self.file = None
+                self.partial = b""
+        if self.file is None and st is not None:
+            self._open(st)
+            data += self._drain()
+        data = self.partial + data
+        end = data.rfind(b"\n") + 1
+        self.partial = data[end:]
+        return data[:end]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class AccessLogMonitor:
+    """Last-seen time and recent source IPs per user, from Xray's access log.
+
+    Memory is bounded: at most MAX_IPS_PER_USER addresses per user (oldest
+    evicted first), IPs older than the window are pruned each poll, and users
+    not seen for LAST_SEEN_TTL are forgotten.
+    """
+    def __init__(self, path: str = ACCESS_LOG_PATH, interval: float = POLL_INTERVAL, ip_window: int = IP_WINDOW):
+        self.tailer = LogTailer(path)
+        self.interval = interval
+        self.ip_window = ip_window
+        self.last_seen = {}  # email -> unix time
+        self.ips = {}  # email -> {ip: unix time}, least recently seen first
+        self.accepted = 0
+        self._pruned_at = 0
+        self._times = {}  # log timestamp string -> unix time
+        self._lock = threading.Lock()
+
+    def _parse_time(self, stamp: bytes):
+        ts = self._times.get(stamp)
+        if ts is None:
+            if len(self._times) > 4096: self._times.clear()
+            # Xray logs local time.
+            ts = self._times[stamp] = time.mktime(time.strptime(stamp.decode(), "%Y/%m/%d %H:%M:%S"))
+        return ts
+
+    def feed(self, data: bytes):
+        """Parse a chunk of complete log lines; returns the number of accepted-connection lines."""
+        matched = 0
+        with self._lock:
+            last_seen, ips, parse_time = self.last_seen, self.ips, self._parse_time
+            for stamp, ip, email in ACCEPTED.findall(data):
+                ts = parse_time(stamp)
+                email = email.decode()
+                if ts > last_seen.get(email, 0): last_seen[email] = ts
+                user_ips = ips.get(email)
+                if user_ips is None:
+                    user_ips = ips[email] = {}
+                ip = ip.strip(b"[]").decode()
+                user_ips.pop(ip, None)
+                user_ips[ip] = ts
+                if len(user_ips) > MAX_IPS_PER_USER:
+                    del user_ips[next(iter(user_ips))]
+                matched += 1
+            self.accepted += matched
+        return matched
+
+    def prune(self, now: float = None):
+        now = now or time.time()
+        cutoff = now - self.ip_window
+        with self._lock:
+            for email in list(self.ips):
+                user_ips = self.ips[email]
+                # Least recently seen first, so expired entries are a prefix.
+                for ip, ts in list(user_ips.items()):
+                    if ts >= cutoff: break
+                    del user_ips[ip]
+                if not user_ips: del self.ips[email]
+            stale = now - LAST_SEEN_TTL
+            for email in [e for e, ts in self.last_seen.items() if ts < stale]:
+                del self.last_seen[email]
+
+    def poll(self):
+        try:
+            data = self.tailer.read()
+        except OSError as e:
+            print(f"Could not read Xray access log: {e}")
+            return 0
+        matched = self.feed(data) if data else 0
+        now = time.time()
+        if now - self._pruned_at >= PRUNE_INTERVAL:
+            self.prune(now)
+            self._pruned_at = now
+        return matched
+
+    # --- Queries ---
+    def online(self, now: float = None, within: float = ONLINE_WINDOW) -> set:
+        cutoff = (now or time.time()) - within
+        with self._lock:
+            return {email for email, ts in self.last_seen.items() if ts >= cutoff}
+
+    def recent_ips(self, email: str, now: float = None) -> list:
+        cutoff = (now or time.time()) - self.ip_window
+        with self._lock:
+            return [ip for ip, ts in self.ips.get(email, {}).items() if ts >= cutoff]
+
+    def ip_counts(self, now: float = None) -> dict:
+        cutoff = (now or time.time()) - self.ip_window
+        with self._lock:
+            return {email: n for email, user_ips in self.ips.items() if (n := sum(1 for ts in user_ips.values() if ts >= cutoff))}
+
+    def over_limit(self, limit: int, now: float = None) -> dict:
+        """{email: [ips]} for users seen from more than `limit` addresses within the window."""
+        return {email: self.recent_ips(email, now) for email, n in self.ip_counts(now).items() if n > limit}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.poll)
+
+
+access_monitor = AccessLogMonitor()
@@ -0,0 +1,144 @@
+# app/admission.py
+import asyncio, json, os, time
+from collections import deque
+
+# VUI_ADMISSION=0 turns admission control off. Each class can be resized with
+# VUI_ADMISSION_<CLASS>=limit:queue, e.g. VUI_ADMISSION_ADMIN_READ=8:64.
+ADMISSION_ENABLED = os.environ.get("VUI_ADMISSION", "1").lower() not in ("0", "false", "no")
+
+# class -> (concurrent requests, queued requests, seconds a request may wait, Retry-After seconds)
+# Admin handlers do their database work on the event loop, so running more of
+# them at once adds little throughput and makes /sub wait behind all of them.
+# Together the admin limits also stay under the connection pool (5 + 10
+# overflow): past that, a checkout blocks the event loop until it times out.
+DEFAULT_CLASSES = {
+    "public": (64, 512, 5.0, 1),  # /sub: many cheap requests from VPN apps, served from the read model
+    "admin_read": (2, 64, 10.0, 2),
+    "admin_write": (1, 32, 15.0, 5),
+    "system": (1, 8, 30.0, 10),  # Xray control, restarts, certificates and bulk jobs
+    # Exports stream for as long as the download takes and hold their slot until the
+    # body is sent, so they get their own class instead of holding up Xray control.
+    "export": (2, 8, 30.0, 10),
+}
+SYSTEM_PREFIXES = ("/api/v1/xray/", "/api/v1/panel/restart", "/api/v1/panel/get-certificate",
+                   "/api/v1/clients/bulk", "/api/v1/archive/run")
+EXPORT_PREFIXES = ("/api/v1/export/",)
+UNLIMITED_PREFIXES = ("/static/",)  # served from memory; limiting them would only slow page loads
+
+
+def classify(method: str, path: str):
+    """The admission class of a request, or None for requests that skip admission."""
+    if path.startswith("/sub/"): return "public"
+    if path.startswith(UNLIMITED_PREFIXES): return None
+    if path.startswith(SYSTEM_PREFIXES): return "system"
+    if path.startswith(EXPORT_PREFIXES): return "export"
+    return "admin_read" if method in ("GET", "HEAD") else "admin_write"
+
+
+class Gate:
+    """A concurrency limit with a bounded FIFO queue in front of it.
+
+    Runs on the event loop only, so it needs no locks. A request that finds the
+    queue full, or waits longer than `timeout`, is shed.
+    """
+    def __init__(self, name: str, limit: int, queue: int, timeout: float, retry_after: int):
+        self.name, self.limit, self.queue, self.timeout, self.retry_after = name, limit, queue, timeout, retry_after
+        self.active = 0
+        self.waiters = deque()
+        self.admitted = self.shed = self.timed_out = self.max_queued = 0
+        self.wait_seconds = 0.0
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self.waiters) >= self.queue:
+            self.shed += 1
+            return False
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.max_queued = max(self.max_queued, len(self.waiters))
+        try:
+            await asyncio.wait((waiter,), timeout=self.timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.done():
+            self._abandon(waiter)
+            self.timed_out += 1
+            self.shed += 1
+            return False
+        # release() handed us its slot; active was not decremented.
+        self.admitted += 1
+        self.wait_seconds += time.perf_counter() - started
+        return True
+
+    def _abandon(self, waiter):
+        if waiter.done() and not waiter.cancelled():
+            self.release()  # the slot arrived just as we gave up: pass it on
+        else:
+            waiter.cancel()
+            try: self.waiters.remove(waiter)
+            except ValueError: pass
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def info(self):
+        return {"limit": self.limit, "queue_limit": self.queue, "active": self.active, "queued": len(self.waiters),
+                "max_queued": self.max_queued, "admitted": self.admitted, "shed": self.shed, "timed_out": self.timed_out,
+                "avg_wait_ms": round(self.wait_seconds * 1000 / self.admitted, 2) if self.admitted else 0.0}
+
+
+def _class_config(name, default):
+    value = os.environ.get(f"VUI_ADMISSION_{name.upper()}")
+    if not value: return default
+    limit, _, queue = value.partition(":")
+    return (int(limit), int(queue) if queue else default[1]) + default[2:]
+
+
+class AdmissionController:
+    def __init__(self, classes: dict = None):
+        classes = classes or {name: _class_config(name, cfg) for name, cfg in DEFAULT_CLASSES.items()}
+        self.gates = {name: Gate(name, *cfg) for name, cfg in classes.items()}
+
+    def gate(self, method: str, path: str):
+        name = classify(method, path)
+        return self.gates.get(name) if name else None
+
+    def info(self):
+        return {name: gate.info() for name, gate in self.gates.items()}
+
+
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """Admits each HTTP request through its class's Gate; shed requests get
+    503 with Retry-After before reaching the app (or the database)."""
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        gate = self.controller.gate(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if gate is None:
+            return await self.app(scope, receive, send)
+        if not await gate.acquire():
+            body = json.dumps({"detail": f"Server busy ({gate.name}); retry later."}).encode()
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                    (b"retry-after", str(gate.retry_after).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
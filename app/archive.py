@@ -0,0 +1,236 @@
+# app/archive.py
+import asyncio, os, time
+from collections import defaultdict
+from sqlalchemy import select, insert, delete, func, and_, or_, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .readmodel import read_model
+
+# Subscriptions disabled or expired for longer than VUI_ARCHIVE_AFTER_DAYS move,
+# with their clients and final usage, to subscriptions_archive/clients_archive,
+# so config generation, listings and the read model stop carrying them.
+# VUI_ARCHIVE_INTERVAL is seconds between scheduled runs; 0 (the default) leaves
+# archiving to `cli.py archive` and POST /api/v1/archive/run.
+ARCHIVE_INTERVAL = float(os.environ.get("VUI_ARCHIVE_INTERVAL", "0"))
+ARCHIVE_AFTER_DAYS = float(os.environ.get("VUI_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH = 500  # subscriptions per transaction; stays under SQLite's bound-parameter limit
+BATCH_PAUSE = 0.05  # seconds between batches, for writers waiting on the lock
+
+NOW_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+_MARK_INACTIVE = f"INSERT OR REPLACE INTO subscription_inactive (subscription_id, since) VALUES (NEW.id, {NOW_SQL});"
+
+# subscription_inactive holds when each disabled subscription was disabled. Like
+# the search triggers, these catch every writer, so "disabled for 90 days" needs
+# no column on subscriptions and no change to the code paths that disable.
+INACTIVE_TRIGGERS = {
+    "archive_inactive_insert": f"AFTER INSERT ON subscriptions WHEN NOT NEW.enabled BEGIN {_MARK_INACTIVE} END",
+    "archive_inactive_disable": f"""AFTER UPDATE OF enabled ON subscriptions
+        WHEN NOT NEW.enabled AND OLD.enabled BEGIN {_MARK_INACTIVE} END""",
+    "archive_inactive_enable": """AFTER UPDATE OF enabled ON subscriptions
+        WHEN NEW.enabled BEGIN DELETE FROM subscription_inactive WHERE subscription_id = NEW.id; END""",
+    "archive_inactive_delete": "AFTER DELETE ON subscriptions BEGIN DELETE FROM subscription_inactive WHERE subscription_id = OLD.id; END",
+}
+# Subscriptions already disabled when the triggers are added start their clock then.
+SEED_INACTIVE = f"INSERT OR IGNORE INTO subscription_inactive (subscription_id, since) SELECT id, {NOW_SQL} FROM subscriptions WHERE NOT enabled"
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def create_archive_triggers(engine):
+    with engine.begin() as conn:
+        existing = {name for (name,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))}
+        if all(name in existing for name in INACTIVE_TRIGGERS): return
+        for name, body in INACTIVE_TRIGGERS.items():
+            if name not in existing:
+                conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+        conn.execute(text(SEED_INACTIVE))
+
+
+def _stale_ids(db: Session, cutoff: int, after: int, limit: int):
+    sub, inactive = models.Subscription, models.SubscriptionInactive
+    expired = and_(sub.expiry_time > 0, sub.expiry_time < cutoff)
+    # Age counts from whichever came first, expiry or disable: a subscription the
+    # panel disabled when it ran out is as old as its expiry. Restored ones get a
+    # fresh `since` (restored=1) even when enabled, so they aren't moved straight back.
+    return db.scalars(
+        select(sub.id).outerjoin(inactive, inactive.subscription_id == sub.id)
+        .where(sub.id > after, or_(and_(inactive.since.is_(None), expired),
+                                   and_(inactive.since < cutoff, or_(sub.enabled == False, expired)),
+                                   and_(sub.enabled == False, inactive.restored == False, expired)))
+        .order_by(sub.id).limit(limit)).all()
+
+
+def _archive_batch(db: Session, ids: list, now: int):
+    sub, client = models.Subscription, models.Client
+    subs = db.execute(select(sub.id, sub.remark, sub.total_gb, sub.expiry_time, sub.sub_token, sub.enabled)
+                      .where(sub.id.in_(ids))).all()
+    clients = db.execute(select(client.id, client.subscription_id, client.inbound_id, client.uuid, client.remark,
+                                client.up_traffic, client.down_traffic).where(client.subscription_id.in_(ids))).all()
+    used = defaultdict(int)
+    for c in clients: used[c.subscription_id] += (c.up_traffic or 0) + (c.down_traffic or 0)
+    try:
+        archive_ids = db.scalars(
+            insert(models.ArchivedSubscription).returning(models.ArchivedSubscription.id, sort_by_parameter_order=True),
+            [{"subscription_id": s.id, "remark": s.remark, "total_gb": s.total_gb, "expiry_time": s.expiry_time,
+              "sub_token": s.sub_token, "enabled": s.enabled, "used_bytes": used[s.id], "archived_at": now} for s in subs]).all()
+        archive_of = {s.id: a for s, a in zip(subs, archive_ids)}
+        if clients:
+            db.execute(insert(models.ArchivedClient), [
+                {"archive_id": archive_of[c.subscription_id], "client_id": c.id, "inbound_id": c.inbound_id, "uuid": c.uuid,
+                 "remark": c.remark, "up_traffic": c.up_traffic, "down_traffic": c.down_traffic} for c in clients])
+        # The search and usage triggers drop these rows from their tables as well.
+        db.execute(delete(client).where(client.subscription_id.in_(ids)))
+        db.execute(delete(sub).where(sub.id.in_(ids)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    read_model.refresh_subscriptions(db, ids)
+    return len(subs), len(clients)
+
+
+def archive_stale(db: Session, days: float = ARCHIVE_AFTER_DAYS, batch: int = ARCHIVE_BATCH, dry_run: bool = False, now: int = None):
+    """Archive subscriptions disabled or expired for more than `days` days, `batch`
+    per transaction. Returns counts; with dry_run only counts the candidates."""
+    now = now or int(time.time())
+    cutoff = int(now - days * 24 * 60 * 60)
+    started = time.perf_counter()
+    report = {"subscriptions": 0, "clients": 0, "batches": 0, "cutoff": cutoff}
+    after = 0
+    while True:
+        ids = _stale_ids(db, cutoff, after, batch)
+        if not ids: break
+        after = ids[-1]
+        if dry_run:
+            report["subscriptions"] += len(ids)
+            continue
+        subs, clients = _archive_batch(db, ids, now)
+        report["subscriptions"] += subs
+        report["clients"] += clients
+        report["batches"] += 1
+        time.sleep(BATCH_PAUSE)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def list_archived(db: Session, query: str = None, after: int = None, limit: int = 50):
+    """Archived subscriptions, newest first, with their client count. `query` matches the remark."""
+    arch, client = models.ArchivedSubscription, models.ArchivedClient
+    q = (select(arch.id, arch.subscription_id, arch.remark, arch.total_gb, arch.expiry_time, arch.enabled,
+                arch.used_bytes, arch.archived_at,
+                select(func.count(client.id)).where(client.archive_id == arch.id).scalar_subquery().label("clients")))
+    if query:
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        q = q.where(arch.remark.like(pattern, escape="\\"))
+    if after is not None:
+        q = q.where(arch.id < after)
+    return db.execute(q.order_by(arch.id.desc()).limit(limit)).all()
+
+
+def find_archived(db: Session, archive_id: int = None, remark: str = None):
+    arch = models.ArchivedSubscription
+    if archive_id is not None: return db.get(arch, archive_id)
+    return db.scalars(select(arch).where(arch.remark == remark).order_by(arch.id.desc()).limit(1)).first()
+
+
+def restore_archived(db: Session, archived: models.ArchivedSubscription, now: int = None):
+    """Move an archived subscription and its clients back into the hot tables, with
+    their original ids where those are still free. Raises ArchiveError without
+    writing anything if a remark, token or uuid has been taken or an inbound is gone.
+
+    The restored subscription gets a fresh inactive clock, so it isn't archived
+    again before an admin has had the chance to extend or enable it.
+    """
+    sub, client = models.Subscription, models.Client
+    clients = list(archived.clients)
+    errors = []
+    if db.scalar(select(sub.id).where(sub.remark == archived.remark)):
+        errors.append(f"Subscription remark already exists: {archived.remark}")
+    if db.scalar(select(sub.id).where(sub.sub_token == archived.sub_token)):
+        errors.append(f"Subscription token already in use: {archived.remark}")
+    remarks = [c.remark for c in clients]
+    for (remark,) in db.execute(select(client.remark).where(client.remark.in_(remarks))):
+        errors.append(f"Client remark already exists: {remark}")
+    for (uuid,) in db.execute(select(client.uuid).where(client.uuid.in_([c.uuid for c in clients]))):
+        errors.append(f"Client uuid already in use: {uuid}")
+    inbound_ids = {c.inbound_id for c in clients}
+    known_inbounds = set(db.scalars(select(models.Inbound.id).where(models.Inbound.id.in_(inbound_ids))))
+    for inbound_id in sorted(inbound_ids - known_inbounds):
+        errors.append(f"Inbound not found: {inbound_id}")
+    if errors:
+        raise ArchiveError(errors)
+
+    now = now or int(time.time())
+    try:
+        restored = sub(id=None if db.get(sub, archived.subscription_id) else archived.subscription_id,
+                       remark=archived.remark, total_gb=archived.total_gb, expiry_time=archived.expiry_time,
+                       sub_token=archived.sub_token, enabled=archived.enabled)
+        db.add(restored)
+        db.flush()
+        taken = set(db.scalars(select(client.id).where(client.id.in_([c.client_id for c in clients]))))
+        restored_clients = [client(id=None if c.client_id in taken else c.client_id, inbound_id=c.inbound_id,
+                                   subscription_id=restored.id, uuid=c.uuid, remark=c.remark,
+                                   up_traffic=c.up_traffic, down_traffic=c.down_traffic) for c in clients]
+        db.add_all(restored_clients)
+        db.flush()
+        db.execute(text("INSERT OR REPLACE INTO subscription_inactive (subscription_id, since, restored) VALUES (:id, :now, 1)"),
+                   {"id": restored.id, "now": now})
+        db.delete(archived)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    read_model.refresh_subscriptions(db, [restored.id])
+    read_model.refresh_clients(db, [c.id for c in restored_clients])
+    return restored
+
+
+# --- Schedule ---
+class Archiver:
+    """Runs archive_stale every `interval` seconds in a worker thread and applies the
+    Xray config when anything moved (expired-but-enabled clients were still in it)."""
+    def __init__(self, interval: float = ARCHIVE_INTERVAL, days: float = ARCHIVE_AFTER_DAYS):
+        self.interval = interval
+        self.days = days
+        self.runs = 0
+        self.archived = 0
+        self.last = None
+        self.last_error = None
+
+    def archive(self, days: float = None, dry_run: bool = False):
+        from .xray import xray_manager
+        db = SessionLocal()
+        try:
+            report = archive_stale(db, self.days if days is None else days, dry_run=dry_run)
+            if report["subscriptions"] and not dry_run and xray_manager.generate_config(db):
+                xray_manager.apply_config()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Archiving failed: {e}")
+            raise
+        finally:
+            db.close()
+        if not dry_run:
+            self.runs += 1
+            self.archived += report["subscriptions"]
+            self.last, self.last_error = report, None
+        return report
+
+    def info(self):
+        return {"interval": self.interval, "after_days": self.days, "runs": self.runs, "archived": self.archived,
+                "last": self.last, "last_error": self.last_error}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.archive)
+            except Exception:
+                pass  # recorded in last_error
+
+
+archiver = Archiver()
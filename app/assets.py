@@ -0,0 +1,104 @@
+# app/assets.py
+import gzip, hashlib, mimetypes, re, threading
+from pathlib import Path
+from fastapi import Request, Response
+from .compression import accepted_encodings, brotli
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+STATIC_REF = re.compile(r'(["\'(])/static/([^"\')?#]+)')
+
+
+class Asset:
+    __slots__ = ("content_type", "etag", "identity", "gzip", "br")
+
+    def __init__(self, content_type: str, body: bytes):
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        self.identity = body
+        self.gzip = gzip.compress(body, compresslevel=9, mtime=0)
+        self.br = brotli.compress(body, quality=11) if brotli is not None else None
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if self.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        body = self.identity
+        if self.br is not None and "br" in accepted and len(self.br) < len(body):
+            body, headers["Content-Encoding"] = self.br, "br"
+        elif "gzip" in accepted and len(self.gzip) < len(body):
+            body, headers["Content-Encoding"] = self.gzip, "gzip"
+        return Response(content=body, media_type=self.content_type, headers=headers)
+
+
+class AssetPipeline:
+    """Fingerprinted, precompressed static files and in-memory HTML shells.
+
+    build() reads static/ once: every file is served under its original name
+    (revalidated via ETag) and under a content-hashed name like
+    css/base.1a2b3c4d5e.css (cached as immutable). HTML shells get their
+    /static/... references rewritten to the hashed names.
+
+    The build compresses at maximum levels, so startup runs it in a background
+    thread; the first request that needs assets before then waits for it.
+    """
+    def __init__(self, static_dir: Path, templates_dir: Path, url_prefix: str = "/static"):
+        self.static_dir = Path(static_dir)
+        self.templates_dir = Path(templates_dir)
+        self.url_prefix = url_prefix
+        self.manifest = {}
+        self.files = {}
+        self.hashed = {}
+        self.shells = {}
+        self._built = False
+        self._lock = threading.Lock()
+
+    def ensure_built(self):
+        if self._built: return
+        with self._lock:
+            if not self._built:
+                self.build()
+
+    def build(self):
+        manifest, files, hashed = {}, {}, {}
+        for path in sorted(p for p in self.static_dir.rglob("*") if p.is_file()):
+            name = path.relative_to(self.static_dir).as_posix()
+            body = path.read_bytes()
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type == "application/javascript":
+                content_type += "; charset=utf-8"
+            asset = Asset(content_type, body)
+            digest = asset.etag.strip('"')[:10]
+            stem, dot, ext = name.rpartition(".")
+            hashed_name = f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+            manifest[name] = hashed_name
+            files[name] = asset
+            hashed[hashed_name] = asset
+        self.manifest, self.files, self.hashed = manifest, files, hashed
+        self.shells = {}
+        for path in sorted(self.templates_dir.glob("*.html")):
+            # Not self.url(): that waits for the build this thread is running.
+            html = STATIC_REF.sub(lambda m: f"{m.group(1)}{self.url_prefix}/{manifest.get(m.group(2), m.group(2))}",
+                                  path.read_text(encoding="utf-8"))
+            self.shells[path.name] = Asset("text/html; charset=utf-8", html.encode("utf-8"))
+        self._built = True
+        return self
+
+    def url(self, name: str) -> str:
+        self.ensure_built()
+        return f"{self.url_prefix}/{self.manifest.get(name, name)}"
+
+    def static_response(self, request: Request, name: str) -> Response:
+        self.ensure_built()
+        asset = self.hashed.get(name)
+        if asset is not None:
+            return asset.response(request, IMMUTABLE)
+        asset = self.files.get(name)
+        if asset is not None:
+            return asset.response(request, REVALIDATE)
+        return Response(status_code=404)
+
+    def shell_response(self, request: Request, name: str) -> Response:
+        self.ensure_built()
+        return self.shells[name].response(request, "private, " + REVALIDATE)
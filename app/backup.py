@@ -0,0 +1,244 @@
+# app/backup.py
+import asyncio, fcntl, gzip, hashlib, os, shutil, sqlite3, tempfile, time
+from contextlib import contextmanager
+from datetime import datetime
+
+from .database import PANEL_LOCK_SUFFIX, data_path, engine, sqlite_path as database_path
+
+# Seconds between scheduled snapshots; 0 turns the schedule off (cli.py backup still works).
+BACKUP_INTERVAL = float(os.environ.get("VUI_BACKUP_INTERVAL", "86400"))
+BACKUP_DIR = data_path(os.environ.get("VUI_BACKUP_DIR", "backups"))
+BACKUP_KEEP = int(os.environ.get("VUI_BACKUP_KEEP", "7"))
+PAGES_PER_STEP = 256  # the source is read-locked only while a step copies these pages (rollback journal)
+STEP_PAUSE = 0.005  # seconds between steps, for writers waiting on the lock
+MAX_RESTARTS = 3  # a write from another connection restarts the copy; after this many, copy in one step
+REQUIRED_TABLES = {"settings", "inbounds", "subscriptions", "clients", "users"}
+PREFIX, SUFFIX = "panel-", ".db.gz"
+CHUNK = 1 << 20
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+@contextmanager
+def panel_stopped(target_path):
+    """Hold the panel lock of `target_path` exclusively; BackupError if a panel has it."""
+    with open(target_path + PANEL_LOCK_SUFFIX, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise BackupError(f"The panel is running on {target_path}; stop it (systemctl stop v-ui) before restoring")
+        yield  # closing the file releases the lock; a panel starting meanwhile waits for it
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""): digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy(source, target, pages):
+    # sqlite3's backup() starts over when another connection writes to the source
+    # between steps; remaining going back up is how that shows in the progress callback.
+    state = {"remaining": None, "restarts": 0}
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if pages > 0 and state["restarts"] > MAX_RESTARTS: raise _Restarted()
+        state["remaining"] = remaining
+    source.backup(target, pages=pages, progress=progress, sleep=STEP_PAUSE)
+    return state
+
+
+def check_database(path):
+    """Raise BackupError unless `path` is an intact SQLite file with the panel's tables."""
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+            tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{path}: {e}")
+    if result != "ok":
+        raise BackupError(f"{path}: integrity check failed: {result}")
+    missing = REQUIRED_TABLES - tables
+    if missing:
+        raise BackupError(f"{path}: not a panel database (missing {', '.join(sorted(missing))})")
+
+
+def create_snapshot(directory: str = None, source_path: str = None, pages: int = PAGES_PER_STEP):
+    """Copy the live database with the online backup API, check it, and gzip it into `directory`.
+
+    Returns a dict describing the snapshot. The file is written under a temporary
+    name and renamed when complete, next to a sha256sum-style .sha256 file.
+    """
+    source_path = source_path or database_path()
+    if not source_path:
+        raise BackupError(f"Backups need an SQLite file database, not {engine.url}")
+    directory = directory or BACKUP_DIR
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    fd, raw_path = tempfile.mkstemp(prefix=".backup-", suffix=".db", dir=directory)
+    os.close(fd)
+    partial = None
+    try:
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True, timeout=30)
+        target = sqlite3.connect(raw_path)
+        try:
+            # In WAL mode a reader never blocks writers, so one step is both the
+            # fastest copy and one that no write can restart.
+            if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal": pages = -1
+            try:
+                state = _copy(source, target, pages)
+            except _Restarted:
+                state = dict(_copy(source, target, -1), restarts=MAX_RESTARTS + 1)
+            state["pages_per_step"] = pages
+        finally:
+            target.close()
+            source.close()
+        copied = time.perf_counter()
+        check_database(raw_path)
+        size = os.path.getsize(raw_path)
+
+        name = PREFIX + datetime.now().strftime("%Y%m%d-%H%M%S") + SUFFIX
+        path = os.path.join(directory, name)
+        partial = path + ".partial"
+        with open(raw_path, "rb") as src, open(partial, "wb") as raw_out:
+            with gzip.GzipFile(filename=name[:-3], mode="wb", fileobj=raw_out, compresslevel=6, mtime=0) as out:
+                shutil.copyfileobj(src, out, CHUNK)
+            raw_out.flush()
+            os.fsync(raw_out.fileno())
+        checksum = sha256_file(partial)
+        os.replace(partial, path)
+        with open(path + ".sha256", "w") as f: f.write(f"{checksum}  {name}\n")
+    finally:
+        for p in (raw_path, partial):
+            if p and os.path.exists(p): os.unlink(p)
+    return {"name": name, "path": path, "sha256": checksum, "db_bytes": size, "bytes": os.path.getsize(path),
+            "pages_per_step": state["pages_per_step"], "restarts": state["restarts"],
+            "copy_seconds": round(copied - started, 3), "seconds": round(time.perf_counter() - started, 3)}
+
+
+def list_snapshots(directory: str = None):
+    """Snapshot paths in `directory`, newest first."""
+    directory = directory or BACKUP_DIR
+    if not os.path.isdir(directory): return []
+    names = sorted((n for n in os.listdir(directory) if n.startswith(PREFIX) and n.endswith(SUFFIX)), reverse=True)
+    return [os.path.join(directory, n) for n in names]
+
+
+def prune(directory: str = None, keep: int = BACKUP_KEEP):
+    removed = []
+    for path in list_snapshots(directory)[max(keep, 1):]:
+        for p in (path, path + ".sha256"):
+            if os.path.exists(p): os.unlink(p)
+        removed.append(os.path.basename(path))
+    return removed
+
+
+def verify_snapshot(path):
+    """Check the snapshot against its .sha256 file (when there is one). Returns the checksum."""
+    checksum = sha256_file(path)
+    if os.path.exists(path + ".sha256"):
+        with open(path + ".sha256") as f: expected = f.read().split()[0]
+        if checksum != expected:
+            raise BackupError(f"{os.path.basename(path)}: checksum mismatch ({checksum} != {expected})")
+    return checksum
+
+
+def restore_snapshot(path: str, target_path: str = None):
+    """Validate a snapshot and atomically replace the database with it.
+
+    The panel must be stopped: its open connections would keep writing to the
+    replaced file. A running panel holds the lock panel_stopped() checks, and a
+    journal or WAL file next to the database means a writer is (or was) active
+    and would be replayed onto the restored file. The replaced database is kept
+    as <db>.pre-restore. Returns that path.
+    """
+    target_path = target_path or database_path()
+    if not target_path:
+        raise BackupError(f"Restore needs an SQLite file database, not {engine.url}")
+    with panel_stopped(target_path):
+        return _restore(path, target_path)
+
+
+def _restore(path, target_path):
+    for suffix in ("-journal", "-wal"):
+        if os.path.exists(target_path + suffix) and os.path.getsize(target_path + suffix) > 0:
+            raise BackupError(f"{target_path}{suffix} exists; stop the panel before restoring")
+    verify_snapshot(path)
+
+    fd, staged = tempfile.mkstemp(prefix=".restore-", suffix=".db", dir=os.path.dirname(target_path))
+    try:
+        with os.fdopen(fd, "wb") as out:
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rb") as src: shutil.copyfileobj(src, out, CHUNK)
+            except (OSError, EOFError) as e:
+                raise BackupError(f"{os.path.basename(path)}: {e}")
+            out.flush()
+            os.fsync(out.fileno())
+        check_database(staged)
+        previous = None
+        if os.path.exists(target_path):
+            previous = target_path + ".pre-restore"
+            if os.path.exists(previous): os.unlink(previous)
+            try:
+                os.link(target_path, previous)  # keeps the old file without a window where the database is missing
+            except OSError:
+                shutil.copy2(target_path, previous)
+        os.replace(staged, target_path)
+        for suffix in ("-journal", "-wal", "-shm"):
+            if os.path.exists(target_path + suffix): os.unlink(target_path + suffix)
+    finally:
+        if os.path.exists(staged): os.unlink(staged)
+    return previous
+
+
+# --- Schedule ---
+class BackupScheduler:
+    """Takes a snapshot every `interval` seconds, counted from the newest one on disk,
+    so restarts don't postpone or repeat backups; keeps the newest `keep`."""
+    def __init__(self, interval: float = BACKUP_INTERVAL, directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP):
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+        self.last = None
+        self.last_error = None
+
+    def backup(self):
+        try:
+            self.last = create_snapshot(self.directory)
+            self.last_error = None
+            self.last["pruned"] = prune(self.directory, self.keep)
+            return self.last
+        except (BackupError, OSError, sqlite3.Error) as e:
+            self.last_error = str(e)
+            print(f"Backup failed: {e}")
+
+    def due_in(self):
+        snapshots = list_snapshots(self.directory)
+        if not snapshots: return 0.0
+        return max(0.0, os.path.getmtime(snapshots[0]) + self.interval - time.time())
+
+    def info(self):
+        snapshots = list_snapshots(self.directory)
+        return {"interval": self.interval, "count": len(snapshots),
+                "latest": os.path.basename(snapshots[0]) if snapshots else None,
+                "last": self.last, "last_error": self.last_error}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(self.due_in(), 1.0))
+            await asyncio.to_thread(self.backup)
+
+
+backups = BackupScheduler()
@@ -0,0 +1,99 @@
+# app/bulk.py
+import csv, io, json, os
+from urllib.parse import quote
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.orm import Session
+from . import models
+from .links import build_share_link
+
+# Column order for CSV input; a header row may reorder them or omit the optional ones.
+CSV_FIELDS = ("subscription_remark", "remark", "inbound_id", "total_mb", "expiry_days")
+OUTPUT_FIELDS = ("id", "remark", "uuid", "inbound_id", "subscription_remark", "sub_link", "config_link_domain", "config_link_ip")
+
+class BulkClient(BaseModel):
+    remark: str
+    subscription_remark: str
+    inbound_id: int
+    total_mb: int = Field(0, ge=0)
+    expiry_days: int = Field(0, ge=0)
+
+def validate_entries(rows, default_inbound_id: int = None):
+    """Check input rows (parsed JSON or parse_csv output) against BulkClient.
+
+    Returns plain dicts for crud.bulk_create_clients; raises ValueError naming the first bad entry.
+    """
+    if not isinstance(rows, list):
+        raise ValueError("expected a list of clients")
+    entries = []
+    for n, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise ValueError(f"entry {n}: expected an object, got {type(row).__name__}")
+        if row.get("inbound_id") is None and default_inbound_id is not None:
+            row = dict(row, inbound_id=default_inbound_id)
+        try:
+            entries.append(BulkClient(**row).dict())
+        except ValidationError as e:
+            problems = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'entry'}: {err['msg']}" for err in e.errors())
+            raise ValueError(f"entry {n}: {problems}") from None
+    return entries
+
+def sub_base_url(settings, ip_address: str = None):
+    """The panel's own address as clients reach it: the domain if set (else the IP), the panel port, https with a certificate."""
+    address = (settings.domain_name if settings else None) or ip_address
+    if not address: return ""
+    tls = bool(settings and settings.public_key_path and settings.private_key_path)
+    port = os.environ.get("VUI_PORT") or (settings.listen_port if settings else 2053)
+    return f"{'https' if tls else 'http'}://{address}:{port}"
+
+def parse_csv(text: str, default_inbound_id: int = None):
+    reader = csv.reader(io.StringIO(text))
+    header = None
+    entries = []
+    for line_no, row in enumerate(reader, start=1):
+        if not row or not any(cell.strip() for cell in row): continue
+        cells = [cell.strip() for cell in row]
+        if header is None:
+            if "remark" in cells:
+                header = cells
+                continue
+            header = list(CSV_FIELDS)
+        entry = dict(zip(header, cells))
+        try:
+            if not entry.get("inbound_id"):
+                if default_inbound_id is None: raise ValueError("inbound_id is missing")
+                entry["inbound_id"] = default_inbound_id
+            for key in ("inbound_id", "total_mb", "expiry_days"):
+                entry[key] = int(entry[key]) if entry.get(key) else 0
+        except ValueError as e:
+            raise ValueError(f"line {line_no}: {e}") from None
+        entries.append(entry)
+    return entries
+
+def iter_records(db: Session, created: list, settings=None, ip_address: str = None):
+    """Yield output records with share links for rows returned by crud.bulk_create_clients.
+
+    `settings` is the panel settings row (or read model record); its domain, when set,
+    is used for config_link_domain and the subscription link.
+
+    Inbounds are loaded up front, so the generator can be consumed after `db` is closed.
+    """
+    inbounds = {}
+    for ib in db.query(models.Inbound).filter(models.Inbound.id.in_({c["inbound_id"] for c in created})):
+        inbounds[ib.id] = (ib, json.loads(ib.stream_settings))
+    domain_address = settings.domain_name if settings and settings.domain_name else None
+    base_url = sub_base_url(settings, ip_address)
+
+    def records():
+        for c in created:
+            inbound, stream_settings = inbounds[c["inbound_id"]]
+            yield {
+                "id": c["id"],
+                "remark": c["remark"],
+                "uuid": c["uuid"],
+                "inbound_id": c["inbound_id"],
+                "subscription_remark": c["subscription_remark"],
+                "sub_link": f"{base_url}/sub/{quote(c['subscription_remark'], safe='')}",
+                "config_link_domain": build_share_link(inbound, c["uuid"], c["remark"], domain_address, stream_settings),
+                "config_link_ip": build_share_link(inbound, c["uuid"], c["remark"], ip_address, stream_settings),
+            }
+    return records()
@@ -0,0 +1,84 @@
+# app/collector.py
+import asyncio, os, threading, time
+from sqlalchemy.orm import Session
+
+from . import crud
+from .database import SessionLocal
+from .notifications import notifier
+from .webhook import traffic_webhook
+from .xray import query_xray_stats, split_stats
+
+# Seconds between background polls; 0 turns the background loop off.
+COLLECT_INTERVAL = float(os.environ.get("VUI_COLLECT_INTERVAL", "10"))
+# A client counts as online if it moved traffic within this many seconds.
+ONLINE_WINDOW = 60
+HISTORY_RETENTION = 7 * 24 * 3600
+
+
+class TrafficCollector:
+    """Folds Xray's counters into the database, one QueryStats call per tick.
+
+    User counters are added to clients; inbound and outbound counters go to
+    traffic_counters (running totals) and traffic_history (TRAFFIC_BUCKET
+    buckets), so per-inbound totals never need a scan over clients. The last
+    tick's per-tag rates and each user's last-active time are kept in memory.
+    """
+    def __init__(self, interval: float = COLLECT_INTERVAL, online_window: float = ONLINE_WINDOW):
+        self.interval = interval
+        self.online_window = online_window
+        self.rates = {"inbound": {}, "outbound": {}}  # kind -> tag -> {'up', 'down'} in bytes/s
+        self.last_seen = {}  # client remark -> unix time of last traffic
+        self.last_run = None
+        self._lock = threading.Lock()
+
+    def collect(self, db: Session, now: float = None):
+        """Poll once; returns the user deltas, or None if Xray was unreachable."""
+        with self._lock:
+            counters = query_xray_stats("", reset=True)
+            if counters is None:
+                return None
+            return self.apply(db, counters, now)
+
+    def apply(self, db: Session, counters: dict, now: float = None):
+        now = now or time.time()
+        stats = split_stats(counters)
+        users = stats.pop("user")
+        crud.update_clients_traffic(db, users)
+        crud.add_traffic_counters(db, stats, int(now))
+        traffic_webhook.record(db, users, now)
+        notifier.on_tick(db, users, now)
+
+        for email, s in users.items():
+            if s['up'] or s['down']:
+                self.last_seen[email] = now
+        elapsed = now - self.last_run if self.last_run else 0
+        self.rates = {kind: {tag: {'up': d['up'] / elapsed, 'down': d['down'] / elapsed} if elapsed > 0 else {'up': 0, 'down': 0}
+                             for tag, d in tags.items()}
+                      for kind, tags in stats.items()}
+        self.last_run = now
+        return users
+
+    def online(self, now: float = None) -> set:
+        cutoff = (now or time.time()) - self.online_window
+        return {email for email, seen in self.last_seen.items() if seen >= cutoff}
+
+    def tick(self):
+        db = SessionLocal()
+        try:
+            if self.collect(db) is not None:
+                crud.prune_traffic_history(db, int(time.time()) - HISTORY_RETENTION)
+            else:
+                notifier.on_unreachable(db)
+        except Exception as e:
+            print(f"Traffic collector failed: {e}")
+        finally:
+            db.close()
+
+    async def run(self):
+        # The first tick waits one interval so it doesn't compete with startup.
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.tick)
+
+
+collector = TrafficCollector()
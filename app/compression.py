@@ -0,0 +1,109 @@
+# app/compression.py
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript", "image/svg+xml")
+
+
+class _GzipCompressor:
+    encoding = "gzip"
+
+    def __init__(self, level):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliCompressor:
+    encoding = "br"
+
+    def __init__(self, quality):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._obj.process(data)
+        return out + (self._obj.finish() if final else self._obj.flush())
+
+
+def accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:].strip("0.") == "":
+            continue  # q=0 means "not acceptable"
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """Compress responses above `minimum_size` with brotli (when installed and
+    accepted) or gzip. Responses that already carry a Content-Encoding, such
+    as precompressed static files, pass through untouched."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _compressor(self, scope):
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accepted = accepted_encodings(value.decode("latin-1"))
+                if brotli is not None and "br" in accepted:
+                    return _BrotliCompressor(self.brotli_quality)
+                if "gzip" in accepted:
+                    return _GzipCompressor(self.gzip_level)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        compressor = self._compressor(scope)
+        if compressor is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        active = None  # None until the first body chunk decides; then True/False
+
+        async def send_compressed(message):
+            nonlocal start, active
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            body, more = message.get("body", b""), message.get("more_body", False)
+
+            if active is None:
+                headers = {k.lower(): v for k, v in start.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                active = (
+                    b"content-encoding" not in headers
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                    and (more or len(body) >= self.minimum_size)
+                )
+                if not active:
+                    await send(start)
+                    return await send(message)
+                body = compressor.compress(body, final=not more)
+                new_headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"vary")]
+                vary = headers.get(b"vary")
+                new_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                new_headers.append((b"content-encoding", compressor.encoding.encode()))
+                if not more:
+                    new_headers.append((b"content-length", str(len(body)).encode()))
+                await send(dict(start, headers=new_headers))
+                return await send({"type": "http.response.body", "body": body, "more_body": more})
+
+            if not active:
+                return await send(message)
+            await send({"type": "http.response.body", "body": compressor.compress(body, final=not more), "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
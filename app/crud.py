@@ -1,9 +1,13 @@
 # app/crud.py
 import secrets
 import uuid
+import time
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, insert, select, update, delete, case, literal, and_, or_, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from . import models, security
+from .search import NEVER_EXPIRES
+from .readmodel import read_model
 
 # --- User and Settings Functions ---
 def get_user_by_username(db: Session, username: str):
@@ -42,6 +46,7 @@ def get_settings(db: Session):
         db.add(default_settings)
         db.commit()
         db.refresh(default_settings)
+        read_model.refresh_settings(db)
     return settings
 
 def update_settings(db: Session, new_settings: dict):
@@ -51,6 +56,7 @@ def update_settings(db: Session, new_settings: dict):
             setattr(settings_obj, key, value)
         db.commit()
         db.refresh(settings_obj)
+        read_model.refresh_settings(db)
     return settings_obj
 
 # --- Inbound Functions ---
@@ -71,6 +77,7 @@ def create_inbound(db: Session, inbound_data: dict):
     db.add(db_inbound)
     db.commit()
     db.refresh(db_inbound)
+    read_model.refresh_inbounds(db, [db_inbound.id])
     return db_inbound
 
 def update_inbound(db: Session, inbound_id: int, inbound_data: dict):
@@ -80,6 +87,7 @@ def update_inbound(db: Session, inbound_id: int, inbound_data: dict):
             if hasattr(db_inbound, key): setattr(db_inbound, key, value)
         db.commit()
         db.refresh(db_inbound)
+        read_model.refresh_inbounds(db, [inbound_id])
     return db_inbound
 
 def delete_inbound(db: Session, inbound_id: int):
@@ -87,6 +95,7 @@ def delete_inbound(db: Session, inbound_id: int):
     if db_inbound:
         db.delete(db_inbound)
         db.commit()
+        read_model.refresh_inbounds(db, [inbound_id])
         return True
     return False
 
@@ -109,6 +118,7 @@ def create_subscription(db: Session, remark: str, total_gb: float = 0, expiry_ti
     db.add(db_sub)
     db.commit()
     db.refresh(db_sub)
+    read_model.refresh_subscriptions(db, [db_sub.id])
     return db_sub
 
 def update_subscription(db: Session, sub_id: int, sub_data: dict):
@@ -118,6 +128,7 @@ def update_subscription(db: Session, sub_id: int, sub_data: dict):
             if value is not None: setattr(db_sub, key, value)
         db.commit()
         db.refresh(db_sub)
+        read_model.refresh_subscriptions(db, [sub_id])
     return db_sub
 
 def reset_traffic_for_subscription(db: Session, subscription_id: int):
@@ -126,6 +137,7 @@ def reset_traffic_for_subscription(db: Session, subscription_id: int):
         models.Client.down_traffic: 0
     })
     db.commit()
+    read_model.reset_traffic(db, subscription_id)
 
 def get_client_by_id(db: Session, client_id: int):
     return db.query(models.Client).filter(models.Client.id == client_id).first()
@@ -136,6 +148,7 @@ def create_client(db: Session, inbound_id: int, subscription_id: int, remark: st
     db.add(db_client)
     db.commit()
     db.refresh(db_client)
+    read_model.refresh_clients(db, [db_client.id])
     return db_client
 
 def update_client(db: Session, client_id: int, client_data: dict):
@@ -146,8 +159,18 @@ def update_client(db: Session, client_id: int, client_data: dict):
                 setattr(db_client, key, value)
         db.commit()
         db.refresh(db_client)
+        read_model.refresh_clients(db, [client_id])
     return db_client
 
+def delete_client(db: Session, client_id: int):
+    db_client = get_client_by_id(db, client_id)
+    if db_client:
+        db.delete(db_client)
+        db.commit()
+        read_model.refresh_clients(db, [client_id])
+        return True
+    return False
+
 def get_clients_for_inbound(db: Session, inbound_id: int):
     return db.query(models.Client).filter(models.Client.inbound_id == inbound_id).all()
     
@@ -155,12 +178,363 @@ def get_total_usage_for_subscription(db: Session, subscription_id: int):
     total_usage = db.query(func.sum(models.Client.up_traffic + models.Client.down_traffic)).filter(models.Client.subscription_id == subscription_id).scalar()
     return total_usage or 0
 
+# --- Client Stats Listing (Core queries, plain rows) ---
+CLIENT_STATS_SORTS = ("id", "usage", "expiry", "online")
+
+def _subscription_usage(inbound_id: int):
+    # Usage of every subscription that has a client on this inbound, summed over all its clients.
+    on_inbound = select(models.Client.subscription_id).where(models.Client.inbound_id == inbound_id)
+    return (
+        select(models.Client.subscription_id, func.sum(models.Client.up_traffic + models.Client.down_traffic).label("used"))
+        .where(models.Client.subscription_id.in_(on_inbound))
+        .group_by(models.Client.subscription_id)
+        .subquery()
+    )
+
+def get_subscriptions_to_disable(db: Session, inbound_id: int, now: int):
+    usage = _subscription_usage(inbound_id)
+    sub = models.Subscription
+    q = select(sub.id).join(usage, usage.c.subscription_id == sub.id).where(
+        sub.enabled == True,
+        or_(and_(sub.total_gb > 0, usage.c.used >= sub.total_gb * 1024 * 1024 * 1024),
+            and_(sub.expiry_time > 0, sub.expiry_time <= now)),
+    )
+    return [sub_id for (sub_id,) in db.execute(q)]
+
+def disable_subscriptions(db: Session, sub_ids: list):
+    for chunk in _chunked(sub_ids):
+        db.execute(update(models.Subscription).where(models.Subscription.id.in_(chunk)).values(enabled=False))
+    db.commit()
+    read_model.refresh_subscriptions(db, sub_ids)
+
+def _client_stats_query(inbound_id: int, search: str = None):
+    usage = _subscription_usage(inbound_id)
+    client, sub = models.Client, models.Subscription
+    used = func.coalesce(usage.c.used, 0)
+    q = (
+        select(client.id, client.remark, client.uuid, client.subscription_id, sub.remark.label("sub_remark"),
+               sub.enabled, sub.total_gb, sub.expiry_time, client.up_traffic, client.down_traffic,
+               used.label("used_traffic_bytes"))
+        .join(sub, sub.id == client.subscription_id)
+        .outerjoin(usage, usage.c.subscription_id == client.subscription_id)
+        .where(client.inbound_id == inbound_id)
+    )
+    if search:
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        q = q.where(or_(client.remark.like(pattern, escape="\\"), sub.remark.like(pattern, escape="\\")))
+    return q, used
+
+def get_client_stats_rows(db: Session, inbound_id: int, search: str = None, sort: str = "id", descending: bool = False,
+                          after: tuple = None, limit: int = None, online_remarks=()):
+    """Return one Row per client of the inbound, ordered by `sort` then id.
+
+    `after` is the (sort_key, id) of the last row of the previous page; rows carry
+    their sort_key so the caller can build the next cursor.
+    """
+    q, used = _client_stats_query(inbound_id, search)
+    client = models.Client
+    if sort == "usage":
+        key = used
+    elif sort == "expiry":
+        key = case((models.Subscription.expiry_time == 0, NEVER_EXPIRES), else_=models.Subscription.expiry_time)
+    elif sort == "online":
+        key = case((client.remark.in_(list(online_remarks)), 1), else_=0) if online_remarks else literal(0)
+    else:
+        key = client.id
+    q = q.add_columns(key.label("sort_key"))
+    if after is not None:
+        key_value, last_id = after
+        if descending:
+            q = q.where(or_(key < key_value, and_(key == key_value, client.id < last_id)))
+        else:
+            q = q.where(or_(key > key_value, and_(key == key_value, client.id > last_id)))
+    q = q.order_by(key.desc(), client.id.desc()) if descending else q.order_by(key, client.id)
+    if limit:
+        q = q.limit(limit)
+    return db.execute(q).all()
+
+def count_client_stats_rows(db: Session, inbound_id: int, search: str = None):
+    q, _ = _client_stats_query(inbound_id, search)
+    return db.execute(select(func.count()).select_from(q.subquery())).scalar()
+
+# --- Bulk Provisioning ---
+BULK_CHUNK = 500  # stays well under SQLite's bound-parameter limit
+
+class BulkCreateError(ValueError):
+    pass
+
+def _chunked(items, size=BULK_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def bulk_create_clients(db: Session, entries: list):
+    """Create many clients (and any missing subscriptions) in a single transaction.
+
+    Each entry is a dict with remark, subscription_remark, inbound_id and optionally
+    total_mb / expiry_days, which only apply to subscriptions created here.
+    Returns one dict per created client, in input order. Raises BulkCreateError
+    without writing anything if an entry conflicts with the batch or the database.
+    """
+    remarks = [e["remark"] for e in entries]
+    errors = []
+    seen = set()
+    for remark in remarks:
+        if remark in seen: errors.append(f"Duplicate client remark in batch: {remark}")
+        seen.add(remark)
+    for chunk in _chunked(seen):
+        for (remark,) in db.query(models.Client.remark).filter(models.Client.remark.in_(chunk)):
+            errors.append(f"Client remark already exists: {remark}")
+    inbound_ids = {e["inbound_id"] for e in entries}
+    known_inbounds = {i for (i,) in db.query(models.Inbound.id).filter(models.Inbound.id.in_(inbound_ids))}
+    for inbound_id in sorted(inbound_ids - known_inbounds):
+        errors.append(f"Inbound not found: {inbound_id}")
+    if errors:
+        raise BulkCreateError(errors)
+
+    sub_remarks = {e["subscription_remark"] for e in entries}
+    sub_ids = {}
+    for chunk in _chunked(sub_remarks):
+        sub_ids.update(db.query(models.Subscription.remark, models.Subscription.id).filter(models.Subscription.remark.in_(chunk)))
+
+    now = int(time.time())
+    new_subs = {}
+    for e in entries:
+        remark = e["subscription_remark"]
+        if remark in sub_ids or remark in new_subs: continue
+        total_mb, expiry_days = e.get("total_mb") or 0, e.get("expiry_days") or 0
+        new_subs[remark] = {
+            "remark": remark,
+            "total_gb": total_mb / 1024 if total_mb > 0 else 0,
+            "expiry_time": now + expiry_days * 24 * 60 * 60 if expiry_days > 0 else 0,
+            "sub_token": secrets.token_urlsafe(16),
+            "enabled": True,
+        }
+    try:
+        if new_subs:
+            db.execute(insert(models.Subscription), list(new_subs.values()))
+            for chunk in _chunked(new_subs):
+                sub_ids.update(db.query(models.Subscription.remark, models.Subscription.id).filter(models.Subscription.remark.in_(chunk)))
+
+        client_rows = [{
+            "inbound_id": e["inbound_id"],
+            "subscription_id": sub_ids[e["subscription_remark"]],
+            "uuid": str(uuid.uuid4()),
+            "remark": e["remark"],
+            "up_traffic": 0,
+            "down_traffic": 0,
+        } for e in entries]
+        db.execute(insert(models.Client), client_rows)
+        client_ids = {}
+        for chunk in _chunked(remarks):
+            client_ids.update(db.query(models.Client.remark, models.Client.id).filter(models.Client.remark.in_(chunk)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    read_model.refresh_subscriptions(db, [sub_ids[r] for r in new_subs])
+    read_model.refresh_clients(db, client_ids.values())
+
+    created = []
+    for e, row in zip(entries, client_rows):
+        sub = new_subs.get(e["subscription_remark"])
+        created.append(dict(row, id=client_ids[row["remark"]], subscription_remark=e["subscription_remark"],
+                            subscription_created=sub is not None))
+    return created
+
+# --- Import from other panels (see app/importer.py) ---
+def import_clients(db: Session, subscriptions: dict, clients: list):
+    """Insert one chunk of imported users in a single transaction.
+
+    `subscriptions` maps remark -> {total_gb, expiry_time, enabled}; subscriptions
+    that already exist are reused as they are. `clients` are dicts with uuid,
+    remark, inbound_id, subscription_remark, up_traffic and down_traffic; a client
+    whose uuid or remark is already taken is skipped. Returns
+    (subscriptions_created, clients_created, skipped_clients).
+    """
+    client = models.Client
+    sub_ids = {}
+    for chunk in _chunked(subscriptions):
+        sub_ids.update(db.query(models.Subscription.remark, models.Subscription.id).filter(models.Subscription.remark.in_(chunk)))
+    taken_uuids, taken_remarks = set(), set()
+    for chunk in _chunked(c["uuid"] for c in clients):
+        taken_uuids.update(u for (u,) in db.query(client.uuid).filter(client.uuid.in_(chunk)))
+    for chunk in _chunked(c["remark"] for c in clients):
+        taken_remarks.update(r for (r,) in db.query(client.remark).filter(client.remark.in_(chunk)))
+    rows, skipped = [], []
+    for c in clients:
+        if c["uuid"] in taken_uuids or c["remark"] in taken_remarks:
+            skipped.append(c)
+            continue
+        taken_uuids.add(c["uuid"])
+        taken_remarks.add(c["remark"])
+        rows.append(c)
+    # Subscriptions only get created for clients that are actually imported.
+    wanted = {c["subscription_remark"] for c in rows}
+    new_subs = [dict(subscriptions[r], remark=r, sub_token=secrets.token_urlsafe(16)) for r in wanted if r not in sub_ids]
+    try:
+        if new_subs:
+            db.execute(insert(models.Subscription), new_subs)
+            for chunk in _chunked(s["remark"] for s in new_subs):
+                sub_ids.update(db.query(models.Subscription.remark, models.Subscription.id).filter(models.Subscription.remark.in_(chunk)))
+        if rows:
+            db.execute(insert(client), [{
+                "inbound_id": c["inbound_id"], "subscription_id": sub_ids[c["subscription_remark"]], "uuid": c["uuid"],
+                "remark": c["remark"], "up_traffic": c["up_traffic"], "down_traffic": c["down_traffic"],
+            } for c in rows])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    read_model.refresh_subscriptions(db, [sub_ids[s["remark"]] for s in new_subs])
+    if rows:
+        client_ids = []
+        for chunk in _chunked(c["uuid"] for c in rows):
+            client_ids.extend(i for (i,) in db.query(client.id).filter(client.uuid.in_(chunk)))
+        read_model.refresh_clients(db, client_ids)
+    return len(new_subs), len(rows), skipped
+
 def update_clients_traffic(db: Session, traffic_data: dict):
-    client_remarks = traffic_data.keys()
-    clients = db.query(models.Client).filter(models.Client.remark.in_(client_remarks)).all()
-    for client in clients:
-        stats = traffic_data.get(client.remark)
-        if stats:
-            client.up_traffic += stats['up']
-            client.down_traffic += stats['down']
-    db.commit()
\ No newline at end of file
+    # Increments happen in SQL (up_traffic = up_traffic + ?) so a background
+    # collector and a request handler writing at the same time can't lose a delta.
+    if not traffic_data: return
+    clients = models.Client.__table__
+    params = []
+    for chunk in _chunked(traffic_data.keys()):
+        for client_id, remark in db.execute(select(clients.c.id, clients.c.remark).where(clients.c.remark.in_(chunk))):
+            stats = traffic_data[remark]
+            if stats['up'] or stats['down']:
+                params.append({"_id": client_id, "_up": stats['up'], "_down": stats['down']})
+    if params:
+        stmt = (update(clients).where(clients.c.id == bindparam("_id"))
+                .values(up_traffic=clients.c.up_traffic + bindparam("_up"), down_traffic=clients.c.down_traffic + bindparam("_down")))
+        db.execute(stmt, params)
+    db.commit()
+    read_model.add_traffic(db, params)
+
+# --- Inbound/Outbound Traffic Counters ---
+TRAFFIC_BUCKET = 300  # seconds per traffic_history row
+
+def add_traffic_counters(db: Session, deltas: dict, now: int):
+    """Add {kind: {tag: {'up', 'down'}}} deltas to the running totals and the current history bucket."""
+    rows = [{"kind": kind, "tag": tag, "up": d['up'], "down": d['down']}
+            for kind, tags in deltas.items() for tag, d in tags.items() if d['up'] or d['down']]
+    if not rows: return
+    counters, history = models.TrafficCounter.__table__, models.TrafficHistory.__table__
+    stmt = sqlite_insert(counters).values(updated_at=now)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["kind", "tag"],
+        set_={"up": counters.c.up + stmt.excluded.up, "down": counters.c.down + stmt.excluded.down, "updated_at": now},
+    ), rows)
+    stmt = sqlite_insert(history).values(bucket=now - now % TRAFFIC_BUCKET)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["kind", "tag", "bucket"],
+        set_={"up": history.c.up + stmt.excluded.up, "down": history.c.down + stmt.excluded.down},
+    ), rows)
+    db.commit()
+
+def prune_traffic_history(db: Session, before: int):
+    db.execute(delete(models.TrafficHistory).where(models.TrafficHistory.bucket < before))
+    db.commit()
+
+def get_traffic_counters(db: Session, kind: str = None):
+    tc = models.TrafficCounter
+    q = select(tc.kind, tc.tag, tc.up, tc.down, tc.updated_at).order_by(tc.kind, tc.tag)
+    if kind: q = q.where(tc.kind == kind)
+    return db.execute(q).all()
+
+def get_traffic_history(db: Session, kind: str, tag: str = None, since: int = 0):
+    # Without a tag, buckets are summed over every tag of the kind (e.g. the whole node).
+    th = models.TrafficHistory
+    if tag:
+        q = select(th.bucket, th.up, th.down).where(th.kind == kind, th.tag == tag, th.bucket >= since)
+    else:
+        q = (select(th.bucket, func.sum(th.up).label("up"), func.sum(th.down).label("down"))
+             .where(th.kind == kind, th.bucket >= since).group_by(th.bucket))
+    return db.execute(q.order_by(th.bucket)).all()
+
+# --- Background Jobs ---
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+def create_job(db: Session, job_id: str, kind: str):
+    job = models.Job(id=job_id, kind=kind, status="queued", progress=0, message="", created_at=time.time())
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def update_job(db: Session, job_id: str, **fields):
+    db.execute(update(models.Job).where(models.Job.id == job_id).values(**fields))
+    db.commit()
+
+def get_job(db: Session, job_id: str):
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+def get_jobs(db: Session, limit: int = 20):
+    return db.query(models.Job).order_by(models.Job.created_at.desc()).limit(limit).all()
+
+def fail_interrupted_jobs(db: Session, now: float):
+    # Jobs still queued/running at startup were cut off by the panel stopping.
+    db.execute(update(models.Job).where(models.Job.status.in_(ACTIVE_JOB_STATUSES))
+               .values(status="failed", message="Interrupted by a panel restart.", finished_at=now))
+    db.commit()
+
+def prune_jobs(db: Session, before: float):
+    db.execute(delete(models.Job).where(models.Job.status.notin_(ACTIVE_JOB_STATUSES), models.Job.created_at < before))
+    db.commit()
+
+# --- External Traffic Outbox ---
+def enqueue_traffic(db: Session, rows: list):
+    """rows: dicts with batch_id, created_at and users (JSON text)."""
+    if not rows: return
+    db.execute(insert(models.TrafficOutbox), [dict(r, attempts=0, next_attempt_at=r["created_at"]) for r in rows])
+    db.commit()
+
+def get_due_traffic(db: Session, now: float, limit: int):
+    ob = models.TrafficOutbox
+    q = select(ob.id, ob.batch_id, ob.created_at, ob.users, ob.attempts).where(ob.next_attempt_at <= now).order_by(ob.id).limit(limit)
+    return db.execute(q).all()
+
+def delete_traffic(db: Session, ids: list):
+    for chunk in _chunked(ids):
+        db.execute(delete(models.TrafficOutbox).where(models.TrafficOutbox.id.in_(chunk)))
+    db.commit()
+
+def retry_traffic(db: Session, ids: list, next_attempt_at: float):
+    for chunk in _chunked(ids):
+        db.execute(update(models.TrafficOutbox).where(models.TrafficOutbox.id.in_(chunk))
+                   .values(attempts=models.TrafficOutbox.attempts + 1, next_attempt_at=next_attempt_at))
+    db.commit()
+
+def count_traffic_outbox(db: Session):
+    return db.execute(select(func.count()).select_from(models.TrafficOutbox)).scalar()
+
+# --- Notifications ---
+def get_subscription_usage_by_remarks(db: Session, remarks: list):
+    # Subscriptions owning any of these clients, with usage summed over all their clients.
+    client, sub = models.Client, models.Subscription
+    sub_ids = set()
+    for chunk in _chunked(remarks):
+        sub_ids.update(sid for (sid,) in db.execute(select(client.subscription_id).where(client.remark.in_(chunk)).distinct()))
+    rows = []
+    for chunk in _chunked(sub_ids):
+        q = (select(sub.id, sub.remark, sub.total_gb, sub.expiry_time, sub.enabled,
+                    func.sum(client.up_traffic + client.down_traffic).label("used"))
+             .join(client, client.subscription_id == sub.id).where(sub.id.in_(chunk)).group_by(sub.id))
+        rows.extend(db.execute(q).all())
+    return rows
+
+def get_subscriptions_expiring(db: Session, before: int):
+    sub = models.Subscription
+    q = select(sub.id, sub.remark, sub.expiry_time).where(sub.enabled == True, sub.expiry_time > 0, sub.expiry_time <= before)
+    return db.execute(q).all()
+
+def get_notification_keys(db: Session):
+    return {key for (key,) in db.execute(select(models.NotificationState.key))}
+
+def set_notification_keys(db: Session, added: list, removed: list, now: float):
+    if added:
+        db.execute(sqlite_insert(models.NotificationState).on_conflict_do_nothing(), [{"key": k, "created_at": now} for k in added])
+    for chunk in _chunked(removed):
+        db.execute(delete(models.NotificationState).where(models.NotificationState.key.in_(chunk)))
+    db.commit()
@@ -1,17 +1,82 @@
 # app/database.py
 
-from sqlalchemy import create_engine
+import fcntl, os
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "sqlite:///./panel.db"
+DATABASE_URL = os.environ.get("VUI_DATABASE_URL", "sqlite:///./panel.db")
+# VUI_SQLITE_WAL=1 switches the database to WAL; app/maintenance.py then checkpoints it.
+SQLITE_WAL = os.environ.get("VUI_SQLITE_WAL", "").lower() in ("1", "true", "yes")
+WAL_AUTOCHECKPOINT = 10000  # pages; a fallback, scheduled checkpoints normally run well before this
 
 engine = create_engine(
     DATABASE_URL, connect_args={"check_same_thread": False}
 )
+
+if engine.url.get_backend_name() == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Only applies to a new, empty database; `cli.py maintenance --convert` switches an existing one.
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT}")
+        cursor.close()
+
+def _data_dir():
+    if os.environ.get("VUI_DATA_DIR"): return os.path.abspath(os.environ["VUI_DATA_DIR"])
+    if engine.url.get_backend_name() == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        return os.path.dirname(os.path.abspath(engine.url.database))
+    return os.getcwd()
+
+# Files the panel writes besides the database (backups, replica snapshots, the alert
+# log) live next to it, or under VUI_DATA_DIR, not in whatever directory it was started from.
+DATA_DIR = _data_dir()
+
+def data_path(path: str) -> str:
+    """`path` resolved against DATA_DIR; absolute paths are returned as they are."""
+    return os.path.join(DATA_DIR, path)
+
+def sqlite_path():
+    path = engine.url.database
+    if engine.url.get_backend_name() != "sqlite" or not path or path == ":memory:":
+        return None
+    return os.path.abspath(path)
+
+# The panel holds a shared lock on <db>.lock while it runs; `cli.py restore` takes it
+# exclusively, so it refuses while a panel process has the database open, even an idle one.
+PANEL_LOCK_SUFFIX = ".lock"
+_panel_lock = None
+
+def hold_panel_lock():
+    """Take the running-panel lock for this process (waits while a restore holds it)."""
+    global _panel_lock
+    path = sqlite_path()
+    if _panel_lock is not None or not path: return
+    f = open(path + PANEL_LOCK_SUFFIX, "a")
+    fcntl.flock(f, fcntl.LOCK_SH)
+    _panel_lock = f
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+_schema_checked = False
+
 def create_db_and_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # Safe to call from every entry point; the schema is only checked once per process.
+    global _schema_checked
+    if _schema_checked: return
+    Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so indexes added to an existing
+    # table later (e.g. clients.remark) are created here.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    from .search import create_search_index
+    create_search_index(engine)
+    from .archive import create_archive_triggers
+    create_archive_triggers(engine)
+    _schema_checked = True
\ No newline at end of file
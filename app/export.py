@@ -0,0 +1,103 @@
+# app/export.py
+import csv, io, json, zlib
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+from . import models
+from .responses import orjson
+
+SCOPES = ("subscriptions", "clients")
+FORMATS = ("csv", "jsonl")
+PAGE_ROWS = 1000
+FLUSH_BYTES = 64 * 1024  # output is handed on in chunks of about this size
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+
+def export_query(scope: str):
+    """Select for one export row per subscription or per client; usage is summed in SQL."""
+    client, sub, inbound = models.Client, models.Subscription, models.Inbound
+    expiry_utc = case((sub.expiry_time > 0, func.datetime(sub.expiry_time, "unixepoch")), else_="")
+    if scope == "subscriptions":
+        return (
+            select(sub.id, sub.remark, sub.enabled, sub.total_gb, sub.expiry_time, expiry_utc.label("expiry_utc"),
+                   func.count(client.id).label("client_count"),
+                   func.coalesce(func.sum(client.up_traffic), 0).label("up_traffic"),
+                   func.coalesce(func.sum(client.down_traffic), 0).label("down_traffic"),
+                   func.coalesce(func.sum(client.up_traffic + client.down_traffic), 0).label("used_bytes"))
+            .outerjoin(client, client.subscription_id == sub.id)
+            .group_by(sub.id)
+        ), sub.id
+    return (
+        select(client.id, client.remark, client.uuid, client.inbound_id, inbound.remark.label("inbound_remark"),
+               client.subscription_id, sub.remark.label("subscription_remark"), sub.enabled, sub.total_gb,
+               sub.expiry_time, expiry_utc.label("expiry_utc"), client.up_traffic, client.down_traffic,
+               (client.up_traffic + client.down_traffic).label("used_bytes"))
+        .join(sub, sub.id == client.subscription_id)
+        .outerjoin(inbound, inbound.id == client.inbound_id)
+    ), client.id
+
+
+def iter_rows(db: Session, scope: str, page_rows: int = PAGE_ROWS):
+    # Keyset pages rather than one long cursor: SQLite (not in WAL mode) holds a
+    # shared lock for as long as a read is open, which would block the collector's
+    # writes for the whole download. Each page ends its read before it is yielded.
+    q, key = export_query(scope)
+    last = None
+    while True:
+        page = q if last is None else q.where(key > last)
+        rows = db.execute(page.order_by(key).limit(page_rows)).all()
+        db.rollback()
+        if not rows: return
+        yield from rows
+        last = rows[-1][0]
+
+
+class UsageExport:
+    """Iterable of encoded chunks (CSV or JSON lines, optionally gzipped) for one scope.
+
+    Memory stays at one page of rows plus one output chunk, whatever the row count.
+    """
+    def __init__(self, db: Session, scope: str, fmt: str = "csv", compress: bool = False):
+        if scope not in SCOPES: raise ValueError(f"Unknown export scope: {scope}")
+        if fmt not in FORMATS: raise ValueError(f"Unknown export format: {fmt}")
+        self.db, self.scope, self.fmt, self.compress = db, scope, fmt, compress
+        self.fields = list(export_query(scope)[0].selected_columns.keys())
+        self.rows = 0
+
+    @property
+    def media_type(self):
+        return "application/gzip" if self.compress else MEDIA_TYPES[self.fmt]
+
+    def filename(self, stamp: str):
+        return f"{self.scope}-usage-{stamp}.{self.fmt}" + (".gz" if self.compress else "")
+
+    def _text(self):
+        buf = io.StringIO()
+        if self.fmt == "csv":
+            writer = csv.writer(buf)
+            writer.writerow(self.fields)
+            write = writer.writerow
+        else:
+            fields = self.fields
+            if orjson is not None:
+                write = lambda row: buf.write(orjson.dumps(dict(zip(fields, row))).decode() + "\n")
+            else:
+                write = lambda row: buf.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n")
+        for row in iter_rows(self.db, self.scope):
+            write(row)
+            self.rows += 1
+            if buf.tell() >= FLUSH_BYTES:
+                yield buf.getvalue().encode("utf-8")
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue().encode("utf-8")
+
+    def __iter__(self):
+        if not self.compress:
+            yield from self._text()
+            return
+        gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in self._text():
+            out = gz.compress(chunk)
+            if out: yield out
+        yield gz.flush()
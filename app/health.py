@@ -0,0 +1,76 @@
+# app/health.py
+import asyncio, os, threading, time
+from collections import deque
+
+from .xray import get_xray_sys_stats
+
+# Seconds between GetSysStats polls; 0 turns the sampler off.
+SAMPLE_INTERVAL = float(os.environ.get("VUI_SYSSTATS_INTERVAL", "5"))
+HISTORY_SIZE = 720  # one hour at the default interval
+# Xray's reported start time (sample time - uptime) may drift by rounding; a
+# jump forward larger than this means Xray restarted between two samples.
+RESTART_SLACK = 3
+
+
+class XrayHealthSampler:
+    """Ring buffer of Xray's Go runtime stats, with restart detection.
+
+    Each sample is GetSysStats plus the sample time; gc_pause_ms and gc_runs are
+    the deltas since the previous sample. A sample whose implied start time
+    (time - uptime) moved forward marks a restart.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL, size: int = HISTORY_SIZE):
+        self.interval = interval
+        self.samples = deque(maxlen=size)
+        self.restarts = deque(maxlen=50)  # unix times at which Xray (re)started
+        self.reachable = None
+        self._lock = threading.Lock()
+
+    def sample(self, now: float = None):
+        stats = get_xray_sys_stats()
+        now = now or time.time()
+        with self._lock:
+            if stats is None:
+                if self.reachable is not False: print("Xray API is unreachable; runtime sampling paused.")
+                self.reachable = False
+                return None
+            self.reachable = True
+            stats["time"] = now
+            prev = self.samples[-1] if self.samples else None
+            started_at = now - stats["uptime"]
+            restarted = prev is not None and started_at - (prev["time"] - prev["uptime"]) > RESTART_SLACK
+            if restarted:
+                self.restarts.append(round(started_at))
+            if prev is None or restarted:
+                stats["gc_runs"], stats["gc_pause_ms"] = 0, 0.0
+            else:
+                stats["gc_runs"] = stats["num_gc"] - prev["num_gc"]
+                stats["gc_pause_ms"] = (stats["pause_total_ns"] - prev["pause_total_ns"]) / 1e6
+            stats["restarted"] = restarted
+            self.samples.append(stats)
+            return stats
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def history(self, since: float = 0):
+        with self._lock:
+            return [s for s in self.samples if s["time"] >= since]
+
+    def summary(self):
+        latest = self.latest()
+        return {
+            "reachable": self.reachable,
+            "latest": latest,
+            "restarts": list(self.restarts),
+            "last_restart": self.restarts[-1] if self.restarts else None,
+        }
+
+    async def run(self):
+        # Like the traffic collector, the first poll waits one interval so grpc loads after startup.
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.sample)
+
+
+sampler = XrayHealthSampler()
@@ -0,0 +1,198 @@
+# app/importer.py
+import json, sqlite3, time
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+
+from . import crud
+
+CHUNK = 5000  # clients per transaction
+SUPPORTED_PROTOCOLS = ("vless",)  # what generate_config and the share links handle
+GB = 1024 ** 3
+
+
+class SourceError(ValueError):
+    pass
+
+
+# --- Sources ---
+# A source yields ("inbound", dict) before the clients of that inbound, and
+# ("client", dict) for each user. Client dicts carry inbound_key (the source's
+# inbound id, or None when the source has no inbounds), uuid, remark,
+# subscription_remark, total_gb, expiry_time, enabled, up_traffic, down_traffic.
+
+def _expiry_from_ms(value, now):
+    # 3x-ui: 0 = never, negative = a duration that starts on first use.
+    value = int(value or 0)
+    if value == 0: return 0
+    return int(now + -value / 1000) if value < 0 else int(value / 1000)
+
+
+def _xui_clients(inbound_key, settings, traffic, now):
+    try:
+        clients = json.loads(settings or "{}").get("clients", [])
+    except ValueError:
+        clients = []
+    for c in clients:
+        email = c.get("email")
+        if not email or not c.get("id"): continue
+        up, down, enabled = traffic.get(email, (0, 0, True))
+        yield "client", {
+            "inbound_key": inbound_key, "uuid": c["id"], "remark": email,
+            # 3x-ui groups a user's clients across inbounds by subId.
+            "subscription_remark": c.get("subId") or email,
+            "total_gb": (c.get("totalGB") or 0) / GB,
+            "expiry_time": _expiry_from_ms(c.get("expiryTime"), now),
+            "enabled": bool(c.get("enable", True)) and bool(enabled),
+            "up_traffic": up or 0, "down_traffic": down or 0,
+        }
+
+
+def _xui_inbound(row):
+    return "inbound", {"key": row["id"], "remark": row["remark"] or f"inbound-{row['port']}", "port": row["port"],
+                       "protocol": row["protocol"], "enabled": bool(row["enable"]),
+                       "stream_settings": row["stream_settings"] or "{}", "sniffing_settings": row["sniffing"] or "{}"}
+
+
+def iter_xui_sqlite(conn: sqlite3.Connection, now: float):
+    for row in conn.execute("SELECT id, remark, enable, port, protocol, settings, stream_settings, sniffing FROM inbounds ORDER BY id"):
+        yield _xui_inbound(row)
+        traffic = {r["email"]: (r["up"], r["down"], r["enable"]) for r in
+                   conn.execute("SELECT email, up, down, enable FROM client_traffics WHERE inbound_id = ?", (row["id"],))}
+        yield from _xui_clients(row["id"], row["settings"], traffic, now)
+
+
+def _marzban_expiry(value):
+    if not value: return 0
+    if isinstance(value, (int, float)): return int(value)
+    # Newer Marzban stores a naive datetime in UTC; read as local time it would shift by the server's offset.
+    expire = datetime.fromisoformat(str(value))
+    if expire.tzinfo is None: expire = expire.replace(tzinfo=timezone.utc)
+    return int(expire.timestamp())
+
+
+def _marzban_client(username, status, used, data_limit, expire, proxy_settings):
+    settings = json.loads(proxy_settings) if isinstance(proxy_settings, str) else proxy_settings
+    # Marzban only tracks total usage, so it all goes to down_traffic.
+    return "client", {
+        "inbound_key": None, "uuid": settings["id"], "remark": username, "subscription_remark": username,
+        "total_gb": (data_limit or 0) / GB, "expiry_time": _marzban_expiry(expire),
+        "enabled": status in ("active", "on_hold"), "up_traffic": 0, "down_traffic": used or 0,
+    }
+
+
+def iter_marzban_sqlite(conn: sqlite3.Connection, now: float):
+    q = ("SELECT u.username, u.status, u.used_traffic, u.data_limit, u.expire, p.settings FROM users u "
+         "JOIN proxies p ON p.user_id = u.id WHERE upper(p.type) = 'VLESS' ORDER BY u.id")
+    for row in conn.execute(q):
+        yield _marzban_client(*row)
+
+
+def iter_json(data, now: float):
+    if isinstance(data, dict) and "users" in data:  # Marzban GET /api/users
+        for u in data["users"]:
+            vless = (u.get("proxies") or {}).get("vless")
+            if vless and vless.get("id"):
+                yield _marzban_client(u["username"], u.get("status"), u.get("used_traffic"), u.get("data_limit"), u.get("expire"), vless)
+        return
+    inbounds = data.get("obj", []) if isinstance(data, dict) else data  # 3x-ui GET /panel/api/inbounds/list
+    for ib in inbounds:
+        yield _xui_inbound({**ib, "sniffing": ib.get("sniffing"), "stream_settings": ib.get("streamSettings", ib.get("stream_settings"))})
+        traffic = {s["email"]: (s.get("up"), s.get("down"), s.get("enable", True)) for s in ib.get("clientStats") or []}
+        yield from _xui_clients(ib["id"], ib.get("settings"), traffic, now)
+
+
+def open_source(path: str):
+    """(kind, events) for a 3x-ui or Marzban SQLite database, or their JSON API dumps."""
+    now = time.time()
+    with open(path, "rb") as f:
+        is_sqlite = f.read(16) == b"SQLite format 3\x00"
+    if not is_sqlite:
+        with open(path, encoding="utf-8-sig") as f:
+            data = json.load(f)  # the stdlib has no incremental parser; these dumps are API responses
+        kind = "marzban" if isinstance(data, dict) and "users" in data else "3x-ui"
+        return kind, iter_json(data, now)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError as e:
+        conn.close()
+        raise SourceError(str(e))
+    if {"inbounds", "client_traffics"} <= tables:
+        return "3x-ui", iter_xui_sqlite(conn, now)
+    if {"users", "proxies"} <= tables:
+        return "marzban", iter_marzban_sqlite(conn, now)
+    conn.close()
+    raise SourceError("Not a 3x-ui or Marzban database.")
+
+
+# --- Importer ---
+class Importer:
+    """Maps source events onto inbounds, subscriptions and clients.
+
+    Inbounds are matched by port (created when missing); clients are written by
+    crud.import_clients in transactions of `chunk`, keeping their UUIDs and
+    traffic. With `inbound_id`, every client goes to that inbound and the
+    source's inbounds are ignored; sources without inbounds (Marzban) need it.
+    """
+    def __init__(self, db: Session, inbound_id: int = None, chunk: int = CHUNK, progress=None):
+        self.db = db
+        self.inbound_id = inbound_id
+        self.chunk = chunk
+        self.progress = progress
+        self.inbounds = {}  # source inbound key -> our inbound id, or None when skipped
+        self.stats = {"read": 0, "inbounds_created": 0, "inbounds_reused": 0, "inbounds_skipped": 0,
+                      "subscriptions_created": 0, "clients_created": 0, "clients_skipped": 0, "seconds": 0.0}
+        self.skipped = []  # (remark, reason)
+
+    def _inbound(self, spec):
+        if self.inbound_id is not None: return
+        if spec["protocol"] not in SUPPORTED_PROTOCOLS:
+            self.inbounds[spec["key"]] = None
+            self.stats["inbounds_skipped"] += 1
+            return
+        existing = crud.get_inbound_by_port(self.db, spec["port"])
+        if existing:
+            self.inbounds[spec["key"]] = existing.id if existing.protocol == spec["protocol"] else None
+            self.stats["inbounds_reused" if existing.protocol == spec["protocol"] else "inbounds_skipped"] += 1
+            return
+        remark = spec["remark"]
+        if crud.get_inbound_by_remark(self.db, remark): remark = f"{remark}-{spec['port']}"
+        inbound = crud.create_inbound(self.db, {
+            "remark": remark, "port": spec["port"], "protocol": spec["protocol"], "enabled": spec["enabled"],
+            "settings": "{}", "stream_settings": spec["stream_settings"], "sniffing_settings": spec["sniffing_settings"]})
+        self.inbounds[spec["key"]] = inbound.id
+        self.stats["inbounds_created"] += 1
+
+    def _flush(self, subscriptions, clients):
+        if not clients: return
+        subs_created, clients_created, skipped = crud.import_clients(self.db, subscriptions, clients)
+        self.stats["subscriptions_created"] += subs_created
+        self.stats["clients_created"] += clients_created
+        self.stats["clients_skipped"] += len(skipped)
+        self.skipped.extend((c["remark"], "uuid or remark already exists") for c in skipped)
+        subscriptions.clear()
+        clients.clear()
+        if self.progress: self.progress(self.stats)
+
+    def run(self, events):
+        started = time.perf_counter()
+        subscriptions, clients = {}, []
+        for kind, item in events:
+            if kind == "inbound":
+                self._inbound(item)
+                continue
+            self.stats["read"] += 1
+            inbound_id = self.inbound_id if self.inbound_id is not None else self.inbounds.get(item["inbound_key"])
+            if inbound_id is None:
+                self.stats["clients_skipped"] += 1
+                self.skipped.append((item["remark"], "no matching vless inbound"))
+                continue
+            subscriptions.setdefault(item["subscription_remark"], {
+                "total_gb": item["total_gb"], "expiry_time": item["expiry_time"], "enabled": item["enabled"]})
+            clients.append(dict(item, inbound_id=inbound_id))
+            if len(clients) >= self.chunk:
+                self._flush(subscriptions, clients)
+        self._flush(subscriptions, clients)
+        self.stats["seconds"] = round(time.perf_counter() - started, 3)
+        return self.stats
@@ -0,0 +1,141 @@
+# app/jobs.py
+import os, subprocess, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import crud
+from .database import SessionLocal
+
+JOB_WORKERS = int(os.environ.get("VUI_JOB_WORKERS", "2"))
+MAX_PENDING = 16
+JOB_RETENTION = 30 * 24 * 3600
+
+
+class JobError(Exception):
+    """Raised inside a job to fail it with a user-facing message."""
+
+class JobCancelled(Exception):
+    pass
+
+class JobConflict(Exception):
+    """Another job with the same single-flight key is active; args[0] is its id."""
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobContext:
+    """Handed to each job function: progress reporting and cancellable waits/commands."""
+    def __init__(self, runner, job_id: str):
+        self.runner = runner
+        self.job_id = job_id
+        self.cancelled = threading.Event()
+
+    def progress(self, percent: int, message: str = None):
+        fields = {"progress": percent}
+        if message is not None: fields["message"] = message
+        self.runner._update(self.job_id, **fields)
+
+    def check(self):
+        if self.cancelled.is_set(): raise JobCancelled()
+
+    def sleep(self, seconds: float):
+        if self.cancelled.wait(seconds): raise JobCancelled()
+
+    def run(self, args: list, timeout: float):
+        """Run a command without a shell, killing it on cancel or timeout; returns CompletedProcess."""
+        self.check()
+        try:
+            proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        except FileNotFoundError:
+            raise JobError(f"Command not found: {args[0]}")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=0.5)
+                return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+            except subprocess.TimeoutExpired:
+                if self.cancelled.is_set() or time.monotonic() > deadline:
+                    proc.kill()
+                    proc.communicate()
+                    if self.cancelled.is_set(): raise JobCancelled()
+                    raise JobError(f"{args[0]} timed out after {int(timeout)} seconds.")
+
+
+class JobRunner:
+    """Runs long operations off the event loop and records them in the jobs table.
+
+    submit() returns a job id immediately. At most JOB_WORKERS jobs run at once
+    and MAX_PENDING may be waiting. Jobs are single-flight per key: submitting
+    a kind that is already queued or running returns the existing job, while a
+    different kind under the same key raises JobConflict.
+    """
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.active = {}  # single-flight key -> (job id, kind)
+        self.contexts = {}  # job id -> (JobContext, Future)
+        self._lock = threading.Lock()
+
+    def _update(self, job_id: str, **fields):
+        db = SessionLocal()
+        try: crud.update_job(db, job_id, **fields)
+        finally: db.close()
+
+    def recover(self):
+        db = SessionLocal()
+        try:
+            now = time.time()
+            crud.fail_interrupted_jobs(db, now)
+            crud.prune_jobs(db, now - JOB_RETENTION)
+        finally: db.close()
+
+    def submit(self, kind: str, fn, *args, key: str = None):
+        """Queue fn(ctx, *args); returns (job_id, created)."""
+        key = key or kind
+        with self._lock:
+            current = self.active.get(key)
+            if current:
+                job_id, current_kind = current
+                if current_kind != kind: raise JobConflict(job_id, current_kind)
+                return job_id, False
+            if len(self.contexts) >= MAX_PENDING: raise JobQueueFull()
+            job_id = uuid.uuid4().hex
+            db = SessionLocal()
+            try: crud.create_job(db, job_id, kind)
+            finally: db.close()
+            ctx = JobContext(self, job_id)
+            self.active[key] = (job_id, kind)
+            self.contexts[job_id] = (ctx, self.executor.submit(self._run, ctx, key, fn, args))
+        return job_id, True
+
+    def _run(self, ctx: JobContext, key: str, fn, args):
+        try:
+            if ctx.cancelled.is_set(): raise JobCancelled()
+            self._update(ctx.job_id, status="running", started_at=time.time())
+            message = fn(ctx, *args) or ""
+            self._update(ctx.job_id, status="succeeded", progress=100, message=message, finished_at=time.time())
+        except JobCancelled:
+            self._update(ctx.job_id, status="cancelled", message="Cancelled.", finished_at=time.time())
+        except JobError as e:
+            self._update(ctx.job_id, status="failed", message=str(e), finished_at=time.time())
+        except Exception as e:
+            print(f"Job {ctx.job_id} failed: {e}")
+            self._update(ctx.job_id, status="failed", message=f"Unexpected error: {e}", finished_at=time.time())
+        finally:
+            with self._lock:
+                self.active.pop(key, None)
+                self.contexts.pop(ctx.job_id, None)
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; False if the job isn't queued or running here."""
+        with self._lock:
+            entry = self.contexts.get(job_id)
+        if entry is None: return False
+        entry[0].cancelled.set()
+        return True
+
+    def shutdown(self):
+        for ctx, _ in list(self.contexts.values()): ctx.cancelled.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+runner = JobRunner()
@@ -0,0 +1,67 @@
+# app/links.py
+import json, socket
+from urllib.parse import quote
+
+
+def get_server_public_ip():
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except Exception as e:
+        print(f"Could not determine server IP: {e}")
+    return "127.0.0.1"
+
+
+class Proxy:
+    """One client on one inbound as a subscription sees it, parsed once from the stream settings."""
+    __slots__ = ("name", "protocol", "uuid", "server", "port", "network", "security", "path", "host",
+                 "service_name", "sni", "fingerprint", "public_key", "short_id")
+
+    def __init__(self, inbound, client_uuid: str, client_remark: str, address: str, stream_settings: dict = None):
+        if stream_settings is None:
+            stream_settings = json.loads(inbound.stream_settings)
+        self.name = f"{inbound.remark}-{client_remark}"
+        self.protocol, self.uuid, self.server, self.port = inbound.protocol, client_uuid, address, inbound.port
+        self.network = stream_settings.get("network", "tcp")
+        self.security = stream_settings.get("security", "none")
+        self.path = self.host = self.service_name = self.sni = self.fingerprint = self.public_key = self.short_id = None
+        if self.network == "ws":
+            ws_opts = stream_settings.get("wsSettings", {})
+            self.path = ws_opts.get("path", "/")
+            self.host = ws_opts.get("headers", {}).get("Host", address)
+        elif self.network == "grpc":
+            self.service_name = stream_settings.get("grpcSettings", {}).get("serviceName", "")
+        # Inbounds imported from other panels may carry TLS or REALITY settings.
+        if self.security == "tls":
+            tls = stream_settings.get("tlsSettings", {})
+            self.sni = tls.get("serverName") or None
+            self.fingerprint = (tls.get("settings") or {}).get("fingerprint")
+        elif self.security == "reality":
+            reality = stream_settings.get("realitySettings", {})
+            self.sni = next(iter(reality.get("serverNames") or []), None)
+            self.short_id = next(iter(reality.get("shortIds") or []), None)
+            extra = reality.get("settings") or {}
+            self.public_key, self.fingerprint = extra.get("publicKey"), extra.get("fingerprint")
+
+    def share_link(self):
+        params = {"type": self.network, "security": self.security}
+        if self.network == "ws":
+            params["path"], params["host"] = self.path, self.host
+        elif self.network == "grpc":
+            params["serviceName"] = self.service_name
+        for key, value in (("sni", self.sni), ("fp", self.fingerprint), ("pbk", self.public_key), ("sid", self.short_id)):
+            if value: params[key] = value
+        query_string = "&".join([f"{k}={v}" for k, v in params.items()])
+        return f"{self.protocol}://{self.uuid}@{self.server}:{self.port}?{query_string}#{quote(self.name)}"
+
+
+def build_share_link(inbound, client_uuid: str, client_remark: str, address: str, stream_settings: dict = None):
+    """Build the vless://... link for one client on `inbound`.
+
+    `stream_settings` can be passed pre-parsed when building many links for the same inbound.
+    """
+    if not address: return ""
+    return Proxy(inbound, client_uuid, client_remark, address, stream_settings).share_link()
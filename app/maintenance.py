@@ -0,0 +1,193 @@
+# app/maintenance.py
+import asyncio, os, sqlite3, time
+
+from .backup import database_path
+
+# Seconds between maintenance passes; 0 turns the schedule off (cli.py maintenance still works).
+MAINTENANCE_INTERVAL = float(os.environ.get("VUI_MAINTENANCE_INTERVAL", "900"))
+ANALYZE_INTERVAL = float(os.environ.get("VUI_ANALYZE_INTERVAL", "86400"))  # full ANALYZE; PRAGMA optimize runs every pass
+ANALYSIS_LIMIT = 1000  # rows ANALYZE samples per index, so it stays quick on large tables
+VACUUM_PAGES_PER_STEP = 256  # each incremental_vacuum step is one short write transaction
+VACUUM_MAX_PAGES = int(os.environ.get("VUI_VACUUM_MAX_PAGES", "20000"))  # pages returned to the OS per pass
+VACUUM_MIN_FREE = 64  # free pages worth a vacuum
+STEP_PAUSE = 0.01  # seconds between vacuum steps, for writers waiting on the lock
+QUIET_SECONDS = 2.0  # no commits from other connections for this long counts as quiet
+WAL_TRUNCATE_BYTES = 4 << 20  # a WAL file larger than this is truncated at the next quiet checkpoint
+BUSY_TIMEOUT = 5.0
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+class MaintenanceError(Exception):
+    pass
+
+
+def _connect(path):
+    return sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def unused_percent(conn):
+    """Share of the bytes in used pages that hold no data (half-empty pages left by
+    deletes), from the dbstat table; None where SQLite is built without it.
+
+    Reads every page of the database under one read transaction, which in
+    rollback-journal mode holds off writers for the whole scan: only for
+    `cli.py maintenance`, not the scheduled passes."""
+    try:
+        unused, size = conn.execute("SELECT sum(unused), sum(pgsize) FROM dbstat WHERE aggregate = TRUE").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return round(unused * 100 / size, 1) if size else 0.0
+
+
+def metrics(conn, path, fragmentation: bool = False):
+    """File size, free pages and WAL size of the database behind `conn`; with
+    `fragmentation`, also unused_percent()."""
+    page_size, page_count, freelist = _pragma(conn, "page_size"), _pragma(conn, "page_count"), _pragma(conn, "freelist_count")
+    wal = path + "-wal"
+    return {
+        "file_bytes": os.path.getsize(path), "wal_bytes": os.path.getsize(wal) if os.path.exists(wal) else 0,
+        "page_size": page_size, "page_count": page_count, "freelist_pages": freelist,
+        "free_bytes": freelist * page_size, "free_percent": round(freelist * 100 / page_count, 1) if page_count else 0.0,
+        "unused_percent": unused_percent(conn) if fragmentation else None,
+        "auto_vacuum": AUTO_VACUUM_MODES.get(_pragma(conn, "auto_vacuum"), "unknown"),
+        "journal_mode": _pragma(conn, "journal_mode"),
+    }
+
+
+def analyze(conn, full: bool):
+    """PRAGMA optimize, plus a sampled ANALYZE when `full`. Returns seconds taken.
+
+    On SQLite 3.46+ optimize re-analyzes any table whose size changed a lot; on
+    older versions it only covers tables this connection queried, so the
+    scheduled ANALYZE is what keeps the planner's statistics current there.
+    """
+    started = time.perf_counter()
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    if full: conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize = 0x10002")
+    return round(time.perf_counter() - started, 3)
+
+
+def incremental_vacuum(conn, max_pages: int = VACUUM_MAX_PAGES, step: int = VACUUM_PAGES_PER_STEP):
+    """Return up to `max_pages` free pages to the OS, `step` pages per transaction.
+
+    Needs auto_vacuum=INCREMENTAL (see convert()). Stops early if a step has to
+    wait longer than BUSY_TIMEOUT for the write lock. Returns pages freed.
+    """
+    freed = 0
+    while freed < max_pages:
+        before = _pragma(conn, "freelist_count")
+        if before == 0: break
+        try:
+            # executescript steps the pragma to completion; execute() would free a single page.
+            conn.executescript(f"PRAGMA incremental_vacuum({min(step, max_pages - freed)})")
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e): raise
+            break
+        after = _pragma(conn, "freelist_count")
+        if after >= before: break
+        freed += before - after
+        time.sleep(STEP_PAUSE)
+    return freed
+
+
+def is_quiet(conn, seconds: float = QUIET_SECONDS):
+    """True if no other connection committed during the next `seconds`."""
+    version = _pragma(conn, "data_version")
+    time.sleep(seconds)
+    return _pragma(conn, "data_version") == version
+
+
+def checkpoint(conn, quiet: bool, wal_bytes: int):
+    """Copy the WAL into the database. Outside quiet periods only PASSIVE, which never
+    waits for readers or writers; when quiet, a large WAL is also truncated."""
+    mode = "TRUNCATE" if quiet and wal_bytes > WAL_TRUNCATE_BYTES else "PASSIVE"
+    busy, log, done = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"mode": mode, "busy": bool(busy), "wal_pages": log, "checkpointed": done}
+
+
+def convert(path: str = None):
+    """Switch the database to auto_vacuum=INCREMENTAL. This needs a full VACUUM,
+    which rewrites the file and blocks writers for its duration: run it with the
+    panel stopped."""
+    path = path or database_path()
+    if not path:
+        raise MaintenanceError("Maintenance needs an SQLite file database")
+    conn = _connect(path)
+    try:
+        if _pragma(conn, "auto_vacuum") == 2: return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+def run_pass(path: str = None, full_analyze: bool = True, vacuum_pages: int = VACUUM_MAX_PAGES, fragmentation: bool = False):
+    """One maintenance pass: statistics, incremental vacuum, WAL checkpoint. Returns a report."""
+    path = path or database_path()
+    if not path:
+        raise MaintenanceError("Maintenance needs an SQLite file database")
+    started = time.perf_counter()
+    conn = _connect(path)
+    try:
+        before = metrics(conn, path, fragmentation)
+        report = {"before": before, "analyze_seconds": analyze(conn, full_analyze), "analyzed": full_analyze,
+                  "vacuumed_pages": 0, "checkpoint": None}
+        if before["auto_vacuum"] == "incremental" and before["freelist_pages"] >= VACUUM_MIN_FREE:
+            report["vacuumed_pages"] = incremental_vacuum(conn, vacuum_pages)
+        if before["journal_mode"] == "wal":
+            wal_bytes = os.path.getsize(path + "-wal") if os.path.exists(path + "-wal") else 0
+            report["checkpoint"] = checkpoint(conn, is_quiet(conn), wal_bytes)
+        report["after"] = metrics(conn, path, fragmentation)
+    finally:
+        conn.close()
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+# --- Schedule ---
+class MaintenanceScheduler:
+    """Runs a maintenance pass every `interval` seconds in a worker thread, on its
+    own connection (never one from the request pool); the full ANALYZE only
+    every `analyze_interval`."""
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL, analyze_interval: float = ANALYZE_INTERVAL):
+        self.interval = interval
+        self.analyze_interval = analyze_interval
+        self.last = None
+        self.last_error = None
+        self.last_analyze = None
+        self.passes = 0
+        self.vacuumed_pages = 0
+
+    def maintain(self):
+        full = self.last_analyze is None or time.time() - self.last_analyze >= self.analyze_interval
+        try:
+            self.last = run_pass(full_analyze=full)
+            self.last_error = None
+        except (MaintenanceError, OSError, sqlite3.Error) as e:
+            self.last_error = str(e)
+            print(f"Database maintenance failed: {e}")
+            return
+        if full: self.last_analyze = time.time()
+        self.passes += 1
+        self.vacuumed_pages += self.last["vacuumed_pages"]
+        if self.last["after"]["auto_vacuum"] != "incremental" and self.last["after"]["free_percent"] >= 20:
+            print("Database has many free pages but auto_vacuum is off; run `cli.py maintenance --convert` with the panel stopped.")
+        return self.last
+
+    def info(self):
+        return {"interval": self.interval, "passes": self.passes, "vacuumed_pages": self.vacuumed_pages,
+                "last_analyze": self.last_analyze, "last": self.last, "last_error": self.last_error}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.maintain)
+
+
+maintenance = MaintenanceScheduler()
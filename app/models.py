@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Boolean, BigInteger, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Boolean, BigInteger, ForeignKey, Float, UniqueConstraint
 from .database import Base
 from sqlalchemy.orm import relationship
 
@@ -29,19 +29,35 @@ class Subscription(Base):
     id = Column(Integer, primary_key=True, index=True)
     remark = Column(String, unique=True, index=True, nullable=False)
     total_gb = Column(Float, default=0)
-    expiry_time = Column(BigInteger, default=0)
+    expiry_time = Column(BigInteger, default=0, index=True)
     sub_token = Column(String, unique=True, index=True, nullable=False)
     enabled = Column(Boolean, default=True) # Enabled status is here
     
     clients = relationship("Client", back_populates="subscription", cascade="all, delete-orphan")
 
+class SubscriptionUsage(Base):
+    # Usage summed over a subscription's clients, kept current by SQLite triggers
+    # (see app/search.py) so usage filters can use an index.
+    __tablename__ = "subscription_usage"
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), primary_key=True)
+    used = Column(BigInteger, default=0)
+    percent = Column(Float, nullable=True, index=True) # of the quota; NULL without one
+
+class SubscriptionInactive(Base):
+    # When each disabled subscription was disabled, kept by SQLite triggers (see
+    # app/archive.py); archival counts from here.
+    __tablename__ = "subscription_inactive"
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), primary_key=True)
+    since = Column(BigInteger, nullable=False, index=True)
+    restored = Column(Boolean, nullable=False, server_default="0") # since is a restore's grace start, not a disable
+
 class Client(Base):
     __tablename__ = "clients"
     id = Column(Integer, primary_key=True, index=True)
     inbound_id = Column(Integer, ForeignKey("inbounds.id"), nullable=False)
-    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=False)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=False, index=True)
     uuid = Column(String, unique=True, nullable=False)
-    remark = Column(String) # This is the client's specific name/email
+    remark = Column(String, index=True) # This is the client's specific name/email
     up_traffic = Column(BigInteger, default=0)
     down_traffic = Column(BigInteger, default=0)
     
@@ -60,4 +76,81 @@ class Inbound(Base):
     stream_settings = Column(String, default='{}')
     sniffing_settings = Column(String, default='{}')
     
-    clients = relationship("Client", back_populates="inbound", cascade="all, delete-orphan")
\ No newline at end of file
+    clients = relationship("Client", back_populates="inbound", cascade="all, delete-orphan")
+
+class TrafficCounter(Base):
+    # Running totals of Xray's inbound>>> and outbound>>> counters, keyed by tag.
+    __tablename__ = "traffic_counters"
+    __table_args__ = (UniqueConstraint("kind", "tag"),)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False) # "inbound" or "outbound"
+    tag = Column(String, nullable=False)
+    up = Column(BigInteger, default=0)
+    down = Column(BigInteger, default=0)
+    updated_at = Column(BigInteger, default=0)
+
+class TrafficHistory(Base):
+    __tablename__ = "traffic_history"
+    __table_args__ = (UniqueConstraint("kind", "tag", "bucket"),)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    tag = Column(String, nullable=False)
+    bucket = Column(BigInteger, nullable=False, index=True) # unix time, start of the bucket
+    up = Column(BigInteger, default=0)
+    down = Column(BigInteger, default=0)
+
+class Job(Base):
+    # Background operations (certbot, Xray service control); see app/jobs.py.
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued", index=True) # queued, running, succeeded, failed, cancelled
+    progress = Column(Integer, default=0)
+    message = Column(String, default="")
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+
+class TrafficOutbox(Base):
+    # Per-user traffic deltas waiting to be pushed to external_traffic_uri; see app/webhook.py.
+    __tablename__ = "traffic_outbox"
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(String, unique=True, nullable=False)
+    created_at = Column(Float, nullable=False)
+    users = Column(String, nullable=False) # JSON: {"email": [up, down], ...}
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(Float, nullable=False, index=True)
+
+class NotificationState(Base):
+    # Alerts already sent, so each threshold fires once until it re-arms; see app/notifications.py.
+    __tablename__ = "notification_state"
+    key = Column(String, primary_key=True)
+    created_at = Column(Float, nullable=False)
+
+class ArchivedSubscription(Base):
+    # Subscriptions moved out of the hot tables by app/archive.py, with their final usage.
+    __tablename__ = "subscriptions_archive"
+    id = Column(Integer, primary_key=True)
+    subscription_id = Column(Integer, nullable=False) # id it had in subscriptions
+    remark = Column(String, nullable=False, index=True)
+    total_gb = Column(Float, default=0)
+    expiry_time = Column(BigInteger, default=0)
+    sub_token = Column(String, nullable=False)
+    enabled = Column(Boolean, default=False)
+    used_bytes = Column(BigInteger, default=0)
+    archived_at = Column(BigInteger, nullable=False, index=True)
+
+    clients = relationship("ArchivedClient", back_populates="subscription", cascade="all, delete-orphan")
+
+class ArchivedClient(Base):
+    __tablename__ = "clients_archive"
+    id = Column(Integer, primary_key=True)
+    archive_id = Column(Integer, ForeignKey("subscriptions_archive.id"), nullable=False, index=True)
+    client_id = Column(Integer, nullable=False) # id it had in clients
+    inbound_id = Column(Integer, nullable=False)
+    uuid = Column(String, nullable=False)
+    remark = Column(String, index=True)
+    up_traffic = Column(BigInteger, default=0)
+    down_traffic = Column(BigInteger, default=0)
+
+    subscription = relationship("ArchivedSubscription", back_populates="clients")
@@ -0,0 +1,193 @@
+# app/notifications.py
+import asyncio, json, os, threading, time
+from collections import deque
+
+from . import crud
+from .database import data_path
+from .readmodel import read_model
+
+USAGE_THRESHOLDS = (80, 90, 100)  # percent of the subscription's quota
+EXPIRY_DAYS = (3, 1, 0)  # 0 = expired
+EXPIRY_CHECK_INTERVAL = 600
+NODE_DOWN_AFTER = 30  # seconds of failed polls before a node_down alert
+RATE_LIMIT = 30  # alerts dispatched per RATE_WINDOW; the rest are counted as suppressed
+RATE_WINDOW = 60
+
+
+# --- Sinks ---
+class FileSink:
+    """Appends alerts as JSON lines; the default local sink."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, alerts):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for alert in alerts: f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+    async def send(self, alerts: list):
+        await asyncio.to_thread(self._write, alerts)
+
+
+class WebhookSink:
+    """POSTs {"alerts": [...]} to a URL, retrying a few times with backoff."""
+    def __init__(self, url: str, retries: int = 3):
+        self.url = url
+        self.retries = retries
+        self.client = None
+
+    async def send(self, alerts: list):
+        import httpx
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=10, headers={"User-Agent": "v-ui-panel"})
+        for attempt in range(self.retries):
+            try:
+                response = await self.client.post(self.url, json={"alerts": alerts})
+                if response.is_success: return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"webhook {self.url} did not accept {len(alerts)} alerts")
+
+
+def default_sinks():
+    sinks = [FileSink(data_path(os.environ.get("VUI_NOTIFY_FILE", "notifications.jsonl")))]
+    if os.environ.get("VUI_NOTIFY_WEBHOOK"):
+        sinks.append(WebhookSink(os.environ["VUI_NOTIFY_WEBHOOK"]))
+    return sinks
+
+
+# --- Engine ---
+class NotificationEngine:
+    """Threshold alerts fed by the traffic collector.
+
+    Usage rules are evaluated only for subscriptions whose clients moved
+    traffic in the tick; expiry rules run every EXPIRY_CHECK_INTERVAL; node
+    rules follow the collector's reachability. Each alert has a dedupe key
+    stored in notification_state, so it fires once and re-arms when the
+    condition clears (traffic reset, quota raised, expiry extended).
+    Dispatch to the sinks happens on the event loop, rate-limited to
+    RATE_LIMIT alerts per RATE_WINDOW.
+
+    A sink is any object with `async send(alerts: list)`.
+    """
+    def __init__(self, sinks: list = None, interval: float = 1.0):
+        self.sinks = default_sinks() if sinks is None else sinks
+        self.interval = interval
+        self.fired = None  # dedupe keys, loaded on first use
+        self.pending = deque()
+        self.recent = deque(maxlen=100)
+        self.suppressed = 0
+        self._window_start = 0.0
+        self._window_count = 0
+        self._expiry_checked_at = 0.0
+        self._unreachable_since = None
+        self._node_down = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enabled(db) -> bool:
+        settings = read_model.ensure(db).settings
+        return bool(settings and settings.notifications_enabled)
+
+    def _alert(self, rule, message, now, subscription=None, **extra):
+        return dict({"rule": rule, "subscription": subscription, "message": message, "time": now}, **extra)
+
+    def _check_usage(self, db, remarks, now, added, removed):
+        alerts = []
+        for row in crud.get_subscription_usage_by_remarks(db, remarks):
+            if not row.total_gb or row.total_gb <= 0: continue
+            percent = row.used / (row.total_gb * 1024 ** 3) * 100
+            crossed = [t for t in USAGE_THRESHOLDS if percent >= t]
+            for t in USAGE_THRESHOLDS:
+                key = f"usage:{row.id}:{t}"
+                if t in crossed:
+                    if key not in self.fired: added.append(key)
+                elif key in self.fired:
+                    removed.append(key)
+            # Jumping past several thresholds in one tick sends only the highest.
+            if crossed and f"usage:{row.id}:{crossed[-1]}" not in self.fired:
+                alerts.append(self._alert("usage", f"Subscription {row.remark} has used {percent:.0f}% of its {row.total_gb:g} GB.",
+                                          now, row.remark, threshold=crossed[-1], value=round(percent, 1)))
+        return alerts
+
+    def _check_expiry(self, db, now, added):
+        alerts = []
+        for row in crud.get_subscriptions_expiring(db, int(now + max(EXPIRY_DAYS) * 86400)):
+            days_left = (row.expiry_time - now) / 86400
+            due = [d for d in EXPIRY_DAYS if days_left <= d]
+            if not due: continue
+            # The key includes expiry_time, so extending a subscription re-arms it.
+            keys = [f"expiry:{row.id}:{d}:{row.expiry_time}" for d in due]
+            if keys[-1] in self.fired: continue
+            added.extend(k for k in keys if k not in self.fired)
+            text = "has expired" if due[-1] == 0 else f"expires in {max(days_left, 0):.1f} days"
+            alerts.append(self._alert("expiry", f"Subscription {row.remark} {text}.", now, row.remark,
+                                      threshold=due[-1], value=round(days_left, 2)))
+        return alerts
+
+    def on_tick(self, db, users: dict, now: float = None):
+        """Evaluate rules after a successful collector tick."""
+        if not self.enabled(db): return 0
+        now = now or time.time()
+        with self._lock:
+            if self.fired is None: self.fired = crud.get_notification_keys(db)
+            added, removed, alerts = [], [], []
+            changed = [email for email, s in users.items() if s['up'] or s['down']]
+            if changed:
+                alerts += self._check_usage(db, changed, now, added, removed)
+            if now - self._expiry_checked_at >= EXPIRY_CHECK_INTERVAL:
+                alerts += self._check_expiry(db, now, added)
+                self._expiry_checked_at = now
+            self._unreachable_since = None
+            if self._node_down:
+                self._node_down = False
+                alerts.append(self._alert("node_up", "Xray API is reachable again.", now))
+            if added or removed:
+                crud.set_notification_keys(db, added, removed, now)
+                self.fired.update(added)
+                self.fired.difference_update(removed)
+            self._queue(alerts, now)
+            return len(alerts)
+
+    def on_unreachable(self, db, now: float = None):
+        """Called when a collector tick could not reach Xray."""
+        now = now or time.time()
+        with self._lock:
+            if self._unreachable_since is None: self._unreachable_since = now
+            if self._node_down or now - self._unreachable_since < NODE_DOWN_AFTER: return
+            if not self.enabled(db): return
+            self._node_down = True
+            self._queue([self._alert("node_down", f"Xray API unreachable for {int(now - self._unreachable_since)} seconds.", now)], now)
+
+    def _queue(self, alerts, now):
+        if now - self._window_start >= RATE_WINDOW:
+            self._window_start, self._window_count = now, 0
+        for alert in alerts:
+            if self._window_count >= RATE_LIMIT:
+                self.suppressed += 1
+                continue
+            self._window_count += 1
+            self.pending.append(alert)
+
+    async def dispatch(self):
+        alerts = []
+        while self.pending: alerts.append(self.pending.popleft())
+        if self.suppressed and not alerts and time.time() - self._window_start >= RATE_WINDOW:
+            count, self.suppressed = self.suppressed, 0
+            alerts.append(self._alert("suppressed", f"{count} more alerts were rate-limited.", time.time(), value=count))
+        if not alerts: return 0
+        self.recent.extend(alerts)
+        for sink in self.sinks:
+            try:
+                await sink.send(alerts)
+            except Exception as e:
+                print(f"Notification sink {type(sink).__name__} failed: {e}")
+        return len(alerts)
+
+    async def run(self):
+        while True:
+            await self.dispatch()
+            await asyncio.sleep(self.interval)
+
+
+notifier = NotificationEngine()
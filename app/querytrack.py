@@ -0,0 +1,128 @@
+# app/querytrack.py
+import contextvars, os, re, threading, time
+from collections import Counter
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# VUI_QUERY_TRACKING=1 counts statements per request (X-Query-Count header,
+# per-route totals in system stats) and logs likely N+1 patterns.
+TRACKING = os.environ.get("VUI_QUERY_TRACKING", "").lower() in ("1", "true", "yes")
+REPEAT_THRESHOLD = int(os.environ.get("VUI_QUERY_REPEAT_THRESHOLD", "10"))  # same shape this often = N+1
+
+_current = contextvars.ContextVar("query_stats", default=None)
+_installed = set()
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+_SPACES = re.compile(r"\s+")
+
+
+def shape(statement: str) -> str:
+    """The statement with whitespace collapsed and IN (?, ?, ...) lists folded,
+    so a query run once per row looks the same each time."""
+    return _IN_LIST.sub("(...)", _SPACES.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Statements run inside one track() block: count, total time and time per shape."""
+    def __init__(self, label: str = None):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.shape_seconds = Counter()
+        self._lock = threading.Lock()  # sync dependencies and to_thread work share the request's stats
+
+    def record(self, statement: str, elapsed: float):
+        key = shape(statement)
+        with self._lock:
+            self.count += 1
+            self.seconds += elapsed
+            self.shapes[key] += 1
+            self.shape_seconds[key] += elapsed
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD):
+        """[(shape, count)] for statements run at least `threshold` times: the usual sign of a query per row."""
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+    def summary(self, threshold: int = REPEAT_THRESHOLD):
+        return {"label": self.label, "queries": self.count, "ms": round(self.seconds * 1000, 2),
+                "repeated": [{"count": n, "statement": s[:200]} for s, n in self.repeated(threshold)]}
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def install(engine):
+    """Listen for statements on `engine`; cheap when nothing is being tracked."""
+    if id(engine) in _installed: return
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    _installed.add(id(engine))
+
+
+@contextmanager
+def track(label: str = None):
+    """Count the statements run in this block, including in threads it starts with
+    asyncio.to_thread or Starlette's threadpool (they copy the context)."""
+    stats = QueryStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class RouteTotals:
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def add(self, route: str, stats: QueryStats):
+        with self._lock:
+            r = self.routes.setdefault(route, {"requests": 0, "queries": 0, "max_queries": 0, "ms": 0.0, "n_plus_one": 0})
+            r["requests"] += 1
+            r["queries"] += stats.count
+            r["max_queries"] = max(r["max_queries"], stats.count)
+            r["ms"] = round(r["ms"] + stats.seconds * 1000, 2)
+            if stats.repeated(): r["n_plus_one"] += 1
+
+    def summary(self):
+        with self._lock:
+            return {route: dict(r, avg_queries=round(r["queries"] / r["requests"], 1)) for route, r in self.routes.items()}
+
+
+route_totals = RouteTotals()
+
+
+class QueryTrackingMiddleware:
+    """Tracks each HTTP request's statements, adds X-Query-Count (statements run
+    before the response started), and prints the statements a request repeated
+    at least REPEAT_THRESHOLD times."""
+    def __init__(self, app, threshold: int = REPEAT_THRESHOLD, totals: RouteTotals = route_totals):
+        self.app = app
+        self.threshold = threshold
+        self.totals = totals
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with track() as stats:
+            async def send_with_count(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-query-count", str(stats.count).encode())]
+                await send(message)
+            await self.app(scope, receive, send_with_count)
+        route = scope.get("route")
+        stats.label = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        self.totals.add(stats.label, stats)
+        for statement, count in stats.repeated(self.threshold):
+            print(f"Possible N+1 in {stats.label}: {count}x {statement[:200]}")
@@ -0,0 +1,364 @@
+# app/readmodel.py
+import asyncio, json, math, os, threading, time, zlib
+from sqlalchemy import Integer, select, func
+
+from . import models
+from .database import SessionLocal
+
+# Seconds between checks that the model still matches the database (writes made
+# by another process, e.g. cli.py, don't go through this process's hooks). 0 turns it off.
+CHECK_INTERVAL = float(os.environ.get("VUI_READMODEL_CHECK_INTERVAL", "30"))
+CHUNK = 500
+LOAD_ATTEMPTS = 3
+
+_inbounds, _subs, _clients, _settings = (models.Inbound.__table__, models.Subscription.__table__,
+                                         models.Client.__table__, models.Settings.__table__)
+
+
+# --- Records ---
+class InboundRecord:
+    __slots__ = ("id", "remark", "enabled", "port", "protocol", "settings", "stream_settings", "sniffing_settings",
+                 "stream", "client_ids")
+    FIELDS = __slots__[:8]
+
+    def __init__(self, id, remark, enabled, port, protocol, settings, stream_settings, sniffing_settings):
+        self.id, self.remark, self.enabled, self.port, self.protocol = id, remark, enabled, port, protocol
+        self.settings, self.stream_settings, self.sniffing_settings = settings, stream_settings, sniffing_settings
+        try:
+            self.stream = json.loads(stream_settings or "{}")  # parsed once, shared by every reader
+        except ValueError:
+            self.stream = {}
+        self.client_ids = {}  # ordered set of client ids
+
+
+class SubscriptionRecord:
+    __slots__ = ("id", "remark", "total_gb", "expiry_time", "sub_token", "enabled", "client_ids")
+    FIELDS = __slots__[:6]
+
+    def __init__(self, id, remark, total_gb, expiry_time, sub_token, enabled):
+        self.id, self.remark, self.total_gb, self.expiry_time = id, remark, total_gb or 0, expiry_time or 0
+        self.sub_token, self.enabled = sub_token, enabled
+        self.client_ids = []  # a handful per subscription; a list is smaller than a set
+
+
+class ClientRecord:
+    __slots__ = ("id", "inbound_id", "subscription_id", "uuid", "remark", "up_traffic", "down_traffic")
+    FIELDS = __slots__
+
+    def __init__(self, id, inbound_id, subscription_id, uuid, remark, up_traffic, down_traffic):
+        self.id, self.inbound_id, self.subscription_id, self.uuid, self.remark = id, inbound_id, subscription_id, uuid, remark
+        self.up_traffic, self.down_traffic = up_traffic or 0, down_traffic or 0
+
+
+class SettingsRecord:
+    __slots__ = tuple(c.name for c in _settings.columns)
+    FIELDS = __slots__
+
+    def __init__(self, row):
+        for name in self.FIELDS: setattr(self, name, getattr(row, name))
+
+
+def _values(record):
+    return tuple(getattr(record, f) for f in record.FIELDS)
+
+
+def _checksum(*values):
+    # Same value in Python and, registered as vui_checksum, in SQLite; NULL and "" collide, which is harmless here.
+    return zlib.crc32("\x1f".join(v or "" for v in values).encode("utf-8"))
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), CHUNK):
+        yield ids[i:i + CHUNK]
+
+
+# --- Model ---
+class ReadModel:
+    """In-process copy of inbounds, subscriptions, clients and settings.
+
+    Loaded once (see ensure) and then kept current by the crud write paths,
+    which call the refresh_* / add_traffic hooks after they commit. Hooks only
+    apply to writes through the engine the model was loaded from; other
+    databases (benchmarks, cli.py) leave it alone. `version` goes up with
+    every change; `config_version` only with changes to what clients are
+    served (everything but traffic), for caches of rendered subscriptions.
+    Writes from other processes are caught by refresh_if_stale, which compares
+    aggregates (counts, sums, checksums of the text columns) with the database
+    and reloads on a mismatch.
+
+    Records are returned as-is for speed: treat them as read-only.
+    """
+    def __init__(self, interval: float = CHECK_INTERVAL):
+        self.interval = interval
+        self.version = 0
+        self.config_version = 0
+        self.loaded = False
+        self.bind = None
+        self.loaded_at = None
+        self.load_ms = None
+        self.reloads = 0
+        self.inbounds = {}  # id -> InboundRecord
+        self.subscriptions = {}  # id -> SubscriptionRecord
+        self.subscriptions_by_remark = {}
+        self.clients = {}  # id -> ClientRecord
+        self.settings = None
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self._missed = False
+
+    # --- Loading ---
+    def _read(self, db):
+        inbounds = {r.id: InboundRecord(*r) for r in db.execute(select(*(_inbounds.c[f] for f in InboundRecord.FIELDS)).order_by(_inbounds.c.id))}
+        subs = {r.id: SubscriptionRecord(*r) for r in db.execute(select(*(_subs.c[f] for f in SubscriptionRecord.FIELDS)).order_by(_subs.c.id))}
+        clients = {}
+        for r in db.execute(select(*(_clients.c[f] for f in ClientRecord.FIELDS)).order_by(_clients.c.id)):
+            c = clients[r.id] = ClientRecord(*r)
+            if c.inbound_id in inbounds: inbounds[c.inbound_id].client_ids[c.id] = None
+            if c.subscription_id in subs: subs[c.subscription_id].client_ids.append(c.id)
+        row = db.execute(select(_settings).where(_settings.c.id == 1)).first()
+        return inbounds, subs, clients, SettingsRecord(row) if row else None
+
+    def load(self, db):
+        """(Re)build the whole model from `db`."""
+        with self._load_lock:
+            for attempt in range(LOAD_ATTEMPTS):
+                self._loading, self._missed = True, False
+                started = time.perf_counter()
+                inbounds, subs, clients, settings = self._read(db)
+                with self._lock:
+                    # A write that committed mid-read may be missing from what we read; read again.
+                    if self._missed and attempt < LOAD_ATTEMPTS - 1: continue
+                    self.inbounds, self.subscriptions, self.clients, self.settings = inbounds, subs, clients, settings
+                    self.subscriptions_by_remark = {s.remark: s for s in subs.values()}
+                    self.bind, self.loaded, self._loading = db.get_bind(), True, False
+                    self.loaded_at, self.load_ms = time.time(), round((time.perf_counter() - started) * 1000, 1)
+                    self.version += 1
+                    self.config_version += 1
+                    return self
+
+    def ensure(self, db):
+        """The model, loaded from `db`'s engine if it isn't already."""
+        if not (self.loaded and self.bind is db.get_bind()):
+            self.load(db)
+        return self
+
+    def preload(self):
+        db = SessionLocal()
+        try: self.ensure(db)
+        except Exception as e: print(f"Could not load the read model: {e}")
+        finally: db.close()
+
+    def _tracks(self, db):
+        if self._loading: self._missed = True
+        return self.loaded and db.get_bind() is self.bind
+
+    # --- Write hooks (called by crud after commit) ---
+    def refresh_settings(self, db):
+        if not self._tracks(db): return
+        row = db.execute(select(_settings).where(_settings.c.id == 1)).first()
+        with self._lock:
+            self.settings = SettingsRecord(row) if row else None
+            self.version += 1
+            self.config_version += 1
+
+    def refresh_inbounds(self, db, ids):
+        """Re-read these inbounds; ids that no longer exist are dropped with their clients."""
+        if not self._tracks(db): return
+        rows = [r for chunk in _chunks(ids) for r in db.execute(
+            select(*(_inbounds.c[f] for f in InboundRecord.FIELDS)).where(_inbounds.c.id.in_(chunk)))]
+        with self._lock:
+            found = set()
+            for r in rows:
+                found.add(r.id)
+                record = InboundRecord(*r)
+                old = self.inbounds.get(r.id)
+                if old is not None: record.client_ids = old.client_ids
+                self.inbounds[r.id] = record
+            for inbound_id in set(ids) - found:
+                old = self.inbounds.pop(inbound_id, None)
+                if old is not None:
+                    for client_id in list(old.client_ids): self._drop_client(client_id)
+            self.version += 1
+            self.config_version += 1
+
+    def refresh_subscriptions(self, db, ids):
+        """Re-read these subscriptions; ids that no longer exist are dropped with their clients."""
+        if not self._tracks(db): return
+        rows = [r for chunk in _chunks(ids) for r in db.execute(
+            select(*(_subs.c[f] for f in SubscriptionRecord.FIELDS)).where(_subs.c.id.in_(chunk)))]
+        with self._lock:
+            found = set()
+            for r in rows:
+                found.add(r.id)
+                sub = self.subscriptions.get(r.id)
+                if sub is None:
+                    sub = self.subscriptions[r.id] = SubscriptionRecord(*r)
+                else:
+                    if sub.remark != r.remark: self.subscriptions_by_remark.pop(sub.remark, None)
+                    client_ids = sub.client_ids
+                    sub.__init__(*r)
+                    sub.client_ids = client_ids
+                self.subscriptions_by_remark[sub.remark] = sub
+            for sub_id in set(ids) - found:
+                sub = self.subscriptions.pop(sub_id, None)
+                if sub is not None:
+                    self.subscriptions_by_remark.pop(sub.remark, None)
+                    for client_id in list(sub.client_ids): self._drop_client(client_id)
+            self.version += 1
+            self.config_version += 1
+
+    def refresh_clients(self, db, ids):
+        """Re-read these clients; ids that no longer exist are dropped."""
+        if not self._tracks(db): return
+        rows = [r for chunk in _chunks(ids) for r in db.execute(
+            select(*(_clients.c[f] for f in ClientRecord.FIELDS)).where(_clients.c.id.in_(chunk)))]
+        with self._lock:
+            for client_id in ids: self._drop_client(client_id)
+            for r in rows: self._add_client(ClientRecord(*r))
+            self.version += 1
+            self.config_version += 1
+
+    def add_traffic(self, db, params):
+        """params: the {"_id", "_up", "_down"} rows crud.update_clients_traffic added in SQL."""
+        if not params or not self._tracks(db): return
+        with self._lock:
+            for p in params:
+                c = self.clients.get(p["_id"])
+                if c is not None:
+                    c.up_traffic += p["_up"]
+                    c.down_traffic += p["_down"]
+            self.version += 1
+
+    def reset_traffic(self, db, subscription_id):
+        if not self._tracks(db): return
+        with self._lock:
+            sub = self.subscriptions.get(subscription_id)
+            for client_id in (sub.client_ids if sub else ()):
+                c = self.clients[client_id]
+                c.up_traffic = c.down_traffic = 0
+            self.version += 1
+
+    def _add_client(self, c):
+        self.clients[c.id] = c
+        if c.inbound_id in self.inbounds: self.inbounds[c.inbound_id].client_ids[c.id] = None
+        if c.subscription_id in self.subscriptions: self.subscriptions[c.subscription_id].client_ids.append(c.id)
+
+    def _drop_client(self, client_id):
+        c = self.clients.pop(client_id, None)
+        if c is None: return
+        inbound = self.inbounds.get(c.inbound_id)
+        if inbound is not None: inbound.client_ids.pop(client_id, None)
+        sub = self.subscriptions.get(c.subscription_id)
+        if sub is not None and client_id in sub.client_ids: sub.client_ids.remove(client_id)
+
+    # --- Reads ---
+    def inbound_list(self):
+        with self._lock: return list(self.inbounds.values())
+
+    def subscription_list(self):
+        with self._lock: return list(self.subscriptions.values())
+
+    def clients_of_subscription(self, sub):
+        with self._lock: return [self.clients[i] for i in sub.client_ids]
+
+    def usage(self, sub):
+        with self._lock: return sum(self.clients[i].up_traffic + self.clients[i].down_traffic for i in sub.client_ids)
+
+    def xray_inbounds(self):
+        """[(inbound, [client, ...])] for enabled inbounds, counting only clients of enabled subscriptions."""
+        with self._lock:
+            result = []
+            for inbound in self.inbounds.values():
+                if not inbound.enabled: continue
+                clients = [c for c in map(self.clients.__getitem__, inbound.client_ids)
+                           if (sub := self.subscriptions.get(c.subscription_id)) is not None and sub.enabled]
+                result.append((inbound, clients))
+            return result
+
+    def info(self):
+        return {"loaded": self.loaded, "version": self.version, "inbounds": len(self.inbounds),
+                "subscriptions": len(self.subscriptions), "clients": len(self.clients),
+                "load_ms": self.load_ms, "loaded_at": self.loaded_at, "reloads": self.reloads}
+
+    # --- Consistency ---
+    def check(self, db):
+        """Compare every record and index with a fresh read of `db`; returns a list of differences."""
+        inbounds, subs, clients, settings = self._read(db)
+        problems = []
+        with self._lock:
+            for name, mine, theirs in (("inbound", self.inbounds, inbounds), ("subscription", self.subscriptions, subs),
+                                       ("client", self.clients, clients)):
+                for key in mine.keys() - theirs.keys(): problems.append(f"{name} {key}: not in the database")
+                for key in theirs.keys() - mine.keys(): problems.append(f"{name} {key}: missing")
+                for key in mine.keys() & theirs.keys():
+                    if _values(mine[key]) != _values(theirs[key]): problems.append(f"{name} {key}: fields differ")
+                    elif name != "client" and sorted(mine[key].client_ids) != sorted(theirs[key].client_ids):
+                        problems.append(f"{name} {key}: client ids differ")
+            if self.subscriptions_by_remark.keys() != {s.remark for s in subs.values()}:
+                problems.append("subscriptions_by_remark index differs")
+            if (settings and _values(settings)) != (self.settings and _values(self.settings)):
+                problems.append("settings differ")
+        return problems
+
+    def _fingerprint(self, db):
+        ib, sub, c = _inbounds.c, _subs.c, _clients.c
+        total = lambda col: func.coalesce(func.sum(col, type_=Integer), 0)  # Integer: sum() of a Boolean would come back as bool
+        checksum = lambda *cols: total(func.vui_checksum(*cols))
+        db.connection().connection.driver_connection.create_function("vui_checksum", -1, _checksum, deterministic=True)
+        return (
+            db.execute(select(func.count(), func.max(ib.id), total(ib.port), total(ib.enabled),
+                              checksum(ib.remark, ib.protocol, ib.settings, ib.stream_settings, ib.sniffing_settings))).one(),
+            db.execute(select(func.count(), func.max(sub.id), total(sub.enabled), func.total(sub.total_gb),
+                              total(sub.expiry_time), checksum(sub.remark, sub.sub_token))).one(),
+            db.execute(select(func.count(), func.max(c.id), total(c.inbound_id), total(c.subscription_id),
+                              total(c.up_traffic + c.down_traffic), checksum(c.uuid, c.remark))).one(),
+        )
+
+    def _own_fingerprint(self):
+        with self._lock:
+            ibs, subs, clients = self.inbounds.values(), self.subscriptions.values(), self.clients.values()
+            return (
+                (len(ibs), max(self.inbounds, default=None), sum(i.port for i in ibs), sum(bool(i.enabled) for i in ibs),
+                 sum(_checksum(i.remark, i.protocol, i.settings, i.stream_settings, i.sniffing_settings) for i in ibs)),
+                (len(subs), max(self.subscriptions, default=None), sum(bool(s.enabled) for s in subs),
+                 math.fsum(s.total_gb for s in subs), sum(s.expiry_time for s in subs),
+                 sum(_checksum(s.remark, s.sub_token) for s in subs)),
+                (len(clients), max(self.clients, default=None), sum(c.inbound_id for c in clients),
+                 sum(c.subscription_id for c in clients), sum(c.up_traffic + c.down_traffic for c in clients),
+                 sum(_checksum(c.uuid, c.remark) for c in clients)),
+            )
+
+    def refresh_if_stale(self, db):
+        """Reload if the database no longer matches the model; returns True if it reloaded."""
+        if not (self.loaded and self.bind is db.get_bind()):
+            self.load(db)
+            return True
+        version = self.version
+        theirs, mine = self._fingerprint(db), self._own_fingerprint()
+        same = all(a == b or (isinstance(a, float) and math.isclose(a, b, rel_tol=1e-9))
+                   for t, m in zip(theirs, mine) for a, b in zip(t, m))
+        row = db.execute(select(_settings).where(_settings.c.id == 1)).first()
+        same = same and (row and _values(SettingsRecord(row))) == (self.settings and _values(self.settings))
+        # A hook landing between the two reads is not staleness; the next check will tell.
+        if same or self.version != version: return False
+        self.load(db)
+        self.reloads += 1
+        return True
+
+    def _refresh(self):
+        db = SessionLocal()
+        try: return self.refresh_if_stale(db)
+        finally: db.close()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self._refresh)
+            except Exception as e:
+                print(f"Read model check failed: {e}")
+
+
+read_model = ReadModel()
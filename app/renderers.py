@@ -0,0 +1,201 @@
+# app/renderers.py
+import base64, json, os, threading, time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from .links import Proxy
+
+CACHE_SIZE = int(os.environ.get("VUI_SUB_CACHE_SIZE", "20000"))  # subscriptions with cached output
+GB = 1024 ** 3
+YAML_SEPARATORS = (", ", ": ")
+
+
+def _dumps(value, separators=(",", ":")):
+    return json.dumps(value, ensure_ascii=False, separators=separators)
+
+
+def info_link(sub, used_bytes, now=None):
+    """The placeholder vless link whose name shows days and traffic left, listed first in base64 output."""
+    gb_total = sub.total_gb
+    gb_left = gb_total - used_bytes / GB
+    days_left_str = "∞"
+    if sub.expiry_time > 0:
+        days_left = (sub.expiry_time - (now or time.time())) / (24 * 60 * 60)
+        days_left_str = f"{int(days_left)} روز" if days_left > 0 else "0 روز"
+    left_str = f"{gb_left:.2f}GB" if gb_total > 0 else "∞"
+    remark = f" ⏳ {days_left_str} | 🔋 {left_str} "
+    return f"vless://00000000-0000-0000-0000-000000000000@127.0.0.1:1080?type=tcp#{quote(remark)}"
+
+
+# --- Renderers ---
+# A renderer turns a subscription's parsed proxies into one client format.
+# render() output is cached per subscription; finish() runs on every request,
+# so it should only add what changes with traffic and time.
+class Renderer:
+    name = None
+    media_type = "text/plain"
+    user_agents = ()  # lowercase User-Agent substrings that select this format
+
+    def render(self, proxies: list, title: str) -> bytes:
+        raise NotImplementedError
+
+    def finish(self, body: bytes, sub, used_bytes: int) -> bytes:
+        return body
+
+
+class Base64Renderer(Renderer):
+    """Share links, one per line, base64-encoded (v2rayNG, Nekoray, Shadowrocket...)."""
+    name = "base64"
+    user_agents = ("v2rayng", "nekoray", "nekobox", "shadowrocket", "hiddify", "v2box", "streisand")
+
+    def render(self, proxies, title):
+        return "\n".join(p.share_link() for p in proxies).encode("utf-8")
+
+    def finish(self, body, sub, used_bytes):
+        lines = info_link(sub, used_bytes).encode("utf-8")
+        if body: lines += b"\n" + body
+        return base64.b64encode(lines)
+
+
+class ClashRenderer(Renderer):
+    """A Clash / Clash.Meta (mihomo) profile with one selector group.
+
+    Proxies are written as JSON flow mappings, which are valid YAML, so no YAML library is needed
+    (with ": " after keys, which YAML 1.1 parsers require).
+    """
+    name = "clash"
+    media_type = "text/yaml; charset=utf-8"
+    user_agents = ("clash", "mihomo", "stash")
+    GROUP = "PROXY"
+
+    def proxy(self, p):
+        entry = {"name": p.name, "type": p.protocol, "server": p.server, "port": p.port, "uuid": p.uuid,
+                 "network": p.network, "udp": True, "tls": p.security in ("tls", "reality")}
+        if p.sni: entry["servername"] = p.sni
+        if p.fingerprint: entry["client-fingerprint"] = p.fingerprint
+        if p.security == "reality": entry["reality-opts"] = {"public-key": p.public_key or "", "short-id": p.short_id or ""}
+        if p.network == "ws":
+            entry["ws-opts"] = {"path": p.path, "headers": {"Host": p.host}}
+        elif p.network == "grpc":
+            entry["grpc-opts"] = {"grpc-service-name": p.service_name}
+        return entry
+
+    def render(self, proxies, title):
+        names = [p.name for p in proxies] or ["DIRECT"]
+        lines = ["mixed-port: 7890", "allow-lan: false", "mode: rule", "log-level: warning", "proxies:"]
+        lines.extend("  - " + _dumps(self.proxy(p), YAML_SEPARATORS) for p in proxies)
+        if not proxies: lines[-1] = "proxies: []"
+        lines += ["proxy-groups:", "  - " + _dumps({"name": self.GROUP, "type": "select", "proxies": names}, YAML_SEPARATORS),
+                  "rules:", f"  - MATCH,{self.GROUP}", ""]
+        return "\n".join(lines).encode("utf-8")
+
+
+class SingBoxRenderer(Renderer):
+    """A sing-box client config: a local mixed inbound and a selector over the proxies."""
+    name = "sing-box"
+    media_type = "application/json"
+    user_agents = ("sing-box", "sfa/", "sfi/", "sfm/")
+
+    def outbound(self, p):
+        entry = {"type": p.protocol, "tag": p.name, "server": p.server, "server_port": p.port, "uuid": p.uuid}
+        if p.security in ("tls", "reality"):
+            tls = entry["tls"] = {"enabled": True}
+            if p.sni: tls["server_name"] = p.sni
+            if p.fingerprint: tls["utls"] = {"enabled": True, "fingerprint": p.fingerprint}
+            if p.security == "reality": tls["reality"] = {"enabled": True, "public_key": p.public_key or "", "short_id": p.short_id or ""}
+        if p.network == "ws":
+            entry["transport"] = {"type": "ws", "path": p.path, "headers": {"Host": p.host}}
+        elif p.network == "grpc":
+            entry["transport"] = {"type": "grpc", "service_name": p.service_name}
+        return entry
+
+    def render(self, proxies, title):
+        names = [p.name for p in proxies] or ["direct"]
+        config = {
+            "log": {"level": "warn"},
+            "inbounds": [{"type": "mixed", "tag": "mixed-in", "listen": "127.0.0.1", "listen_port": 2080}],
+            "outbounds": [{"type": "selector", "tag": "proxy", "outbounds": names, "default": names[0]}]
+                         + [self.outbound(p) for p in proxies] + [{"type": "direct", "tag": "direct"}],
+            "route": {"final": "proxy"},
+        }
+        return _dumps(config).encode("utf-8")
+
+
+RENDERERS = {}
+
+
+def register(renderer: Renderer):
+    RENDERERS[renderer.name] = renderer
+    return renderer
+
+
+# Order matters for User-Agent matching: some apps (Hiddify) mention several cores in theirs.
+for _renderer in (Base64Renderer(), ClashRenderer(), SingBoxRenderer()):
+    register(_renderer)
+
+
+def pick(user_agent: str = None, requested: str = None):
+    """The renderer for ?format= (KeyError when unknown) or for the User-Agent; None means a browser."""
+    if requested: return RENDERERS[requested]
+    ua = (user_agent or "").lower()
+    for renderer in RENDERERS.values():
+        if any(keyword in ua for keyword in renderer.user_agents): return renderer
+    return None
+
+
+# --- Cache ---
+class RenderCache:
+    """Rendered output per subscription and format, least recently used first out.
+
+    A subscription's proxies are parsed once and shared by every format; the
+    whole cache is dropped when the read model's config_version moves, so any
+    change to inbounds, clients, subscriptions or settings invalidates every
+    format together. Traffic updates don't touch it.
+    """
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.version = None
+        self.entries = OrderedDict()  # subscription id -> {"proxies": [...], renderer name: bytes}
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def render(self, model, sub, renderer: Renderer, address):
+        """Cached renderer.render() output for `sub`; `address()` is only called on a miss."""
+        version = model.config_version
+        with self._lock:
+            if self.version != version:
+                self.entries.clear()
+                self.version = version
+            entry = self.entries.get(sub.id)
+            if entry is not None:
+                self.entries.move_to_end(sub.id)
+                body = entry.get(renderer.name)
+                if body is not None:
+                    self.hits += 1
+                    return body
+            self.misses += 1
+        if entry is None:
+            host, proxies = address(), []
+            for client in model.clients_of_subscription(sub):
+                inbound = model.inbounds.get(client.inbound_id)
+                if inbound: proxies.append(Proxy(inbound, client.uuid, client.remark, host, inbound.stream))
+            entry = {"proxies": proxies}
+        body = renderer.render(entry["proxies"], sub.remark)
+        with self._lock:
+            # Don't keep output built from a model that changed while we rendered.
+            if self.version == version == model.config_version:
+                entry[renderer.name] = body
+                self.entries[sub.id] = entry
+                if len(self.entries) > self.size: self.entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.version = None
+
+    def info(self):
+        return {"subscriptions": len(self.entries), "hits": self.hits, "misses": self.misses, "formats": list(RENDERERS)}
+
+
+subscription_cache = RenderCache()
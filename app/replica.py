@@ -0,0 +1,146 @@
+# app/replica.py
+import asyncio, gzip, json, os, shutil, sqlite3, tempfile, time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from . import backup
+from .database import data_path
+from .readmodel import ReadModel, read_model
+
+# VUI_REPLICA=1 runs main.py as a read-only replica: it serves /sub and the
+# subscription page from the newest snapshot in VUI_REPLICA_DIR and nothing else.
+# The panel ships snapshots there every VUI_REPLICA_SHIP_INTERVAL seconds (0 = off);
+# replicas on other hosts need the directory synced or mounted.
+REPLICA_MODE = os.environ.get("VUI_REPLICA", "").lower() in ("1", "true", "yes")
+REPLICA_DIR = data_path(os.environ.get("VUI_REPLICA_DIR", "replica"))
+SHIP_INTERVAL = float(os.environ.get("VUI_REPLICA_SHIP_INTERVAL", "0"))
+POLL_INTERVAL = float(os.environ.get("VUI_REPLICA_POLL_INTERVAL", "5"))
+REPLICA_ADDRESS = os.environ.get("VUI_REPLICA_ADDRESS")  # share-link host when the panel has no domain set
+SHIP_KEEP = 3  # a replica may still be reading the previous snapshot
+REPLICA_PREFIXES = ("/sub/", "/static/", "/replica/")
+
+
+class ReplicaError(Exception):
+    pass
+
+
+def load_snapshot(path: str):
+    """Decompress and check a snapshot, then build a ReadModel from it. The
+    model holds everything /sub needs, so the file is deleted afterwards."""
+    fd, raw = tempfile.mkstemp(prefix="vui-replica-", suffix=".db")
+    os.close(fd)
+    try:
+        backup.verify_snapshot(path)
+        with open(raw, "wb") as out, gzip.open(path, "rb") as src:
+            shutil.copyfileobj(src, out, backup.CHUNK)
+        backup.check_database(raw)
+        engine = create_engine(f"sqlite:///file:{raw}?mode=ro&uri=true")
+        try:
+            with Session(engine) as db:
+                return ReadModel(interval=0).load(db)
+        finally:
+            engine.dispose()
+    except (OSError, EOFError) as e:
+        raise ReplicaError(f"{os.path.basename(path)}: {e}")
+    finally:
+        os.unlink(raw)
+
+
+class Replica:
+    """The snapshot currently served. refresh() loads a newer snapshot off to the
+    side and swaps it in with one assignment, so a request sees either the old
+    model or the new one, never a mix; requests already holding the old model
+    finish with it."""
+    def __init__(self, directory: str = REPLICA_DIR, interval: float = POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.model = None
+        self.name = None
+        self.swapped_at = None
+        self.swaps = 0
+        self.load_ms = None
+        self.last_error = None
+
+    def refresh(self):
+        """Swap in the newest snapshot if it isn't the one being served. Returns True on a swap."""
+        snapshots = backup.list_snapshots(self.directory)
+        if not snapshots or os.path.basename(snapshots[0]) == self.name: return False
+        started = time.perf_counter()
+        try:
+            model = load_snapshot(snapshots[0])
+        except (ReplicaError, backup.BackupError, OSError, sqlite3.Error) as e:
+            self.last_error = str(e)  # keep serving the current snapshot
+            print(f"Replica could not load {os.path.basename(snapshots[0])}: {e}")
+            return False
+        # Rendered-subscription caches key on config_version: keep it moving forward across models.
+        if self.model: model.config_version = self.model.config_version + 1
+        self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.name, self.swapped_at, self.last_error = os.path.basename(snapshots[0]), time.time(), None
+        self.model = model
+        self.swaps += 1
+        return True
+
+    def info(self):
+        model = self.model
+        return {"snapshot": self.name, "loaded": model is not None, "swaps": self.swaps, "load_ms": self.load_ms,
+                "age_seconds": round(time.time() - self.swapped_at, 1) if self.swapped_at else None,
+                "subscriptions": len(model.subscriptions) if model else 0, "last_error": self.last_error}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"Replica refresh failed: {e}")
+
+
+class SnapshotShipper:
+    """On the panel: writes a snapshot to the replica directory every `interval`
+    seconds when the data changed since the last one, and keeps the newest SHIP_KEEP."""
+    def __init__(self, directory: str = REPLICA_DIR, interval: float = SHIP_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.shipped_version = None
+        self.last = None
+        self.last_error = None
+
+    def ship(self):
+        version = read_model.version if read_model.loaded else None
+        if version is not None and version == self.shipped_version: return None
+        try:
+            self.last = backup.create_snapshot(self.directory)
+            backup.prune(self.directory, SHIP_KEEP)
+            self.shipped_version, self.last_error = version, None
+            return self.last
+        except (backup.BackupError, OSError, sqlite3.Error) as e:
+            self.last_error = str(e)
+            print(f"Replica snapshot failed: {e}")
+
+    def info(self):
+        return {"interval": self.interval, "directory": self.directory, "last": self.last, "last_error": self.last_error}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(self.interval, 1.0))  # snapshot names have one-second resolution
+            await asyncio.to_thread(self.ship)
+
+
+replica = Replica()
+shipper = SnapshotShipper()
+
+
+class ReplicaOnlyMiddleware:
+    """In replica mode, answers 404 for everything outside REPLICA_PREFIXES (the
+    admin API and pages need the panel's database)."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(REPLICA_PREFIXES):
+            return await self.app(scope, receive, send)
+        body = json.dumps({"detail": "Not available on a replica."}).encode()
+        await send({"type": "http.response.start", "status": 404,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
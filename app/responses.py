@@ -0,0 +1,22 @@
+# app/responses.py
+import json
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for large listings.
+
+    Routes return it directly with plain dicts/lists built from explicit schemas,
+    which skips FastAPI's jsonable_encoder walk (and its ORM introspection).
+    Content must already be JSON-native: str, int, float, bool, None, dict, list.
+    """
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
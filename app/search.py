@@ -0,0 +1,166 @@
+# app/search.py
+import time
+from sqlalchemy import select, func, literal_column, table, exists, and_, or_, case, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import models
+
+GB_EXPR = "1073741824.0"
+NEVER_EXPIRES = 2 ** 62  # sorts "no expiry" after every real timestamp
+MIN_FTS_QUERY = 3  # trigram tokens: shorter queries fall back to LIKE
+
+# subscription_search is an FTS5 trigram index with one row per subscription
+# (rowid = subscriptions.id) holding its remark and its clients' remarks;
+# subscription_usage holds summed client traffic and percent of quota. Both
+# are maintained by triggers, so every writer (crud, importer, cli.py, another
+# process) keeps them current without going through Python.
+FTS_TABLE = "CREATE VIRTUAL TABLE subscription_search USING fts5(remarks, tokenize = 'trigram')"
+
+
+def _fts_refresh(sub_id):
+    return f"""
+    DELETE FROM subscription_search WHERE rowid = {sub_id};
+    INSERT INTO subscription_search (rowid, remarks)
+        SELECT id, remark || ' ' || ifnull((SELECT group_concat(remark, ' ') FROM clients WHERE subscription_id = {sub_id}), '')
+        FROM subscriptions WHERE id = {sub_id};"""
+
+
+def _add_usage(sub_id, delta):
+    return f"""
+    UPDATE subscription_usage SET used = used + ({delta}),
+        percent = (SELECT CASE WHEN total_gb > 0 THEN (subscription_usage.used + ({delta})) * 100.0 / (total_gb * {GB_EXPR}) END
+                   FROM subscriptions WHERE id = {sub_id})
+    WHERE subscription_id = {sub_id};"""
+
+
+NEW_BYTES = "ifnull(NEW.up_traffic, 0) + ifnull(NEW.down_traffic, 0)"
+OLD_BYTES = "ifnull(OLD.up_traffic, 0) + ifnull(OLD.down_traffic, 0)"
+
+USAGE_TRIGGERS = {
+    "search_usage_sub_insert": f"""AFTER INSERT ON subscriptions BEGIN
+        INSERT OR REPLACE INTO subscription_usage (subscription_id, used, percent)
+        VALUES (NEW.id, 0, CASE WHEN NEW.total_gb > 0 THEN 0.0 END); END""",
+    "search_usage_sub_quota": f"""AFTER UPDATE OF total_gb ON subscriptions BEGIN
+        UPDATE subscription_usage SET percent = CASE WHEN NEW.total_gb > 0 THEN used * 100.0 / (NEW.total_gb * {GB_EXPR}) END
+        WHERE subscription_id = NEW.id; END""",
+    "search_usage_sub_delete": "AFTER DELETE ON subscriptions BEGIN DELETE FROM subscription_usage WHERE subscription_id = OLD.id; END",
+    "search_usage_client_insert": f"AFTER INSERT ON clients BEGIN {_add_usage('NEW.subscription_id', NEW_BYTES)} END",
+    # The collector's path: one primary-key update per client that moved traffic.
+    "search_usage_client_traffic": f"""AFTER UPDATE OF up_traffic, down_traffic ON clients
+        WHEN NEW.subscription_id = OLD.subscription_id BEGIN
+        {_add_usage('NEW.subscription_id', f'{NEW_BYTES} - ({OLD_BYTES})')} END""",
+    "search_usage_client_move": f"""AFTER UPDATE OF subscription_id ON clients
+        WHEN NEW.subscription_id != OLD.subscription_id BEGIN
+        {_add_usage('OLD.subscription_id', f'-({OLD_BYTES})')} {_add_usage('NEW.subscription_id', NEW_BYTES)} END""",
+    "search_usage_client_delete": f"AFTER DELETE ON clients BEGIN {_add_usage('OLD.subscription_id', f'-({OLD_BYTES})')} END",
+}
+
+FTS_TRIGGERS = {
+    "search_fts_sub_insert": f"AFTER INSERT ON subscriptions BEGIN {_fts_refresh('NEW.id')} END",
+    "search_fts_sub_remark": f"AFTER UPDATE OF remark ON subscriptions BEGIN {_fts_refresh('NEW.id')} END",
+    "search_fts_sub_delete": "AFTER DELETE ON subscriptions BEGIN DELETE FROM subscription_search WHERE rowid = OLD.id; END",
+    "search_fts_client_insert": f"AFTER INSERT ON clients BEGIN {_fts_refresh('NEW.subscription_id')} END",
+    "search_fts_client_update": f"""AFTER UPDATE OF remark, subscription_id ON clients BEGIN
+        {_fts_refresh('OLD.subscription_id')} {_fts_refresh('NEW.subscription_id')} END""",
+    "search_fts_client_delete": f"AFTER DELETE ON clients BEGIN {_fts_refresh('OLD.subscription_id')} END",
+}
+
+REBUILD_USAGE = f"""
+    INSERT INTO subscription_usage (subscription_id, used, percent)
+    SELECT s.id, ifnull(u.used, 0), CASE WHEN s.total_gb > 0 THEN ifnull(u.used, 0) * 100.0 / (s.total_gb * {GB_EXPR}) END
+    FROM subscriptions s LEFT JOIN (
+        SELECT subscription_id, sum(ifnull(up_traffic, 0) + ifnull(down_traffic, 0)) AS used FROM clients GROUP BY subscription_id
+    ) u ON u.subscription_id = s.id"""
+REBUILD_FTS = """
+    INSERT INTO subscription_search (rowid, remarks)
+    SELECT s.id, s.remark || ' ' || ifnull(group_concat(c.remark, ' '), '')
+    FROM subscriptions s LEFT JOIN clients c ON c.subscription_id = s.id GROUP BY s.id"""
+
+fts_available = True
+
+
+def create_search_index(engine):
+    """Create the FTS table and triggers where missing; backfill whatever was just created."""
+    global fts_available
+    with engine.begin() as conn:
+        existing = {name for (name,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"))}
+        if "subscription_search" not in existing:
+            try:
+                conn.execute(text(FTS_TABLE))
+                conn.execute(text(REBUILD_FTS))
+            except OperationalError as e:  # SQLite built without FTS5
+                print(f"Subscription search falls back to LIKE: {e}")
+                fts_available = False
+        triggers = dict(USAGE_TRIGGERS, **(FTS_TRIGGERS if fts_available else {}))
+        if not all(name in existing for name in USAGE_TRIGGERS):
+            # The usage table may have missed writes made while its triggers did not exist.
+            conn.execute(text("DELETE FROM subscription_usage"))
+            conn.execute(text(REBUILD_USAGE))
+        for name, body in triggers.items():
+            if name not in existing:
+                conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+
+
+def rebuild_search_index(db: Session):
+    db.execute(text("DELETE FROM subscription_usage"))
+    db.execute(text(REBUILD_USAGE))
+    if fts_available:
+        db.execute(text("DELETE FROM subscription_search"))
+        db.execute(text(REBUILD_FTS))
+    db.commit()
+
+
+def _fts_phrase(query: str):
+    return '"' + query.replace('"', '""') + '"'
+
+
+def search_subscriptions(db: Session, query: str = None, enabled: bool = None, expiring_days: int = None,
+                         min_usage: float = None, after: tuple = None, limit: int = 50, now: int = None, count: bool = True,
+                         sort: str = "id", descending: bool = False):
+    """Subscriptions matching every given filter, ordered by `sort` (id, remark, expiry
+    or usage) then id, `limit` rows after `after`, the (sort_key, id) of the last row
+    of the previous page; rows carry their sort_key for the next cursor.
+
+    `query` is a case-insensitive substring of the subscription's or one of its clients' remarks.
+    Returns (rows, total) where total counts every match, not just this page; with
+    count=False (later pages of a walk) the count query is skipped and total is None.
+    """
+    sub, usage, client = models.Subscription, models.SubscriptionUsage, models.Client
+    q = (select(sub.id, sub.remark, sub.total_gb, sub.expiry_time, sub.sub_token, sub.enabled,
+                func.coalesce(usage.used, 0).label("used"), usage.percent.label("usage_percent"))
+         .outerjoin(usage, usage.subscription_id == sub.id))
+    if query:
+        if fts_available and len(query) >= MIN_FTS_QUERY:
+            fts = table("subscription_search")
+            q = q.where(sub.id.in_(select(literal_column("rowid")).select_from(fts)
+                                   .where(literal_column("subscription_search").op("MATCH")(_fts_phrase(query)))))
+        else:
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            q = q.where(or_(sub.remark.like(pattern, escape="\\"),
+                            exists().where(client.subscription_id == sub.id, client.remark.like(pattern, escape="\\"))))
+    if enabled is not None:
+        q = q.where(sub.enabled == enabled)
+    if expiring_days is not None:
+        now = int(now or time.time())
+        q = q.where(sub.expiry_time > now, sub.expiry_time <= now + expiring_days * 86400)
+    if min_usage is not None:
+        q = q.where(usage.percent >= min_usage)
+    total = db.execute(select(func.count()).select_from(q.subquery())).scalar() if count else None
+    if sort == "remark":
+        key = sub.remark
+    elif sort == "expiry":
+        key = case((sub.expiry_time == 0, NEVER_EXPIRES), else_=sub.expiry_time)
+    elif sort == "usage":
+        key = func.coalesce(usage.used, 0)
+    else:
+        key = sub.id
+    q = q.add_columns(key.label("sort_key"))
+    if after is not None:
+        key_value, last_id = after
+        if descending:
+            q = q.where(or_(key < key_value, and_(key == key_value, sub.id < last_id)))
+        else:
+            q = q.where(or_(key > key_value, and_(key == key_value, sub.id > last_id)))
+    q = q.order_by(key.desc(), sub.id.desc()) if descending else q.order_by(key, sub.id)
+    return db.execute(q.limit(limit)).all(), total
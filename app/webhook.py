@@ -0,0 +1,151 @@
+# app/webhook.py
+import asyncio, json, os, random, socket, time, uuid
+
+from . import crud
+from .database import SessionLocal
+from .readmodel import read_model
+from .responses import orjson
+
+NODE_NAME = os.environ.get("VUI_NODE_NAME") or socket.gethostname()
+BATCH_USERS = 5000  # users per outbox row (one collector tick may span several rows)
+MAX_BODY = 1024 * 1024  # rows are packed into requests up to this size
+CONCURRENCY = 4
+REQUEST_TIMEOUT = 10
+BACKOFF_BASE = 2
+BACKOFF_MAX = 300
+
+
+def _dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+class TrafficWebhook:
+    """Pushes per-user traffic deltas to Settings.external_traffic_uri.
+
+    The collector records each tick's non-zero deltas as rows in the
+    traffic_outbox table (a persistent queue in the panel database), so nothing
+    is lost while the receiver is down or the panel restarts. The delivery
+    loop packs due rows into POSTs of at most MAX_BODY bytes:
+
+        {"node": "...", "batches": [{"id": "<batch id>", "ts": 1714557600.0, "users": {"email": [up, down]}}]}
+
+    Each batch id is delivered until a 2xx is received, so receivers should
+    ignore batch ids they have already applied. Failed rows back off
+    exponentially (BACKOFF_BASE * 2**attempts, capped at BACKOFF_MAX, with jitter).
+    """
+    def __init__(self, interval: float = 1.0, concurrency: int = CONCURRENCY,
+                 backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = None
+        self.stats = {"requests": 0, "batches": 0, "failures": 0, "last_error": None, "last_success": None}
+
+    @staticmethod
+    def target(db):
+        settings = read_model.ensure(db).settings
+        if settings and settings.external_traffic_enabled and settings.external_traffic_uri:
+            return settings.external_traffic_uri
+        return None
+
+    def record(self, db, users: dict, now: float = None):
+        """Queue a collector tick's user deltas; a no-op while the webhook is disabled."""
+        if not users or not self.target(db): return 0
+        now = now or time.time()
+        items = [(email, s['up'], s['down']) for email, s in users.items() if s['up'] or s['down']]
+        rows = [{"batch_id": uuid.uuid4().hex, "created_at": now,
+                 "users": _dumps({email: [up, down] for email, up, down in items[i:i + BATCH_USERS]})}
+                for i in range(0, len(items), BATCH_USERS)]
+        crud.enqueue_traffic(db, rows)
+        return len(rows)
+
+    def _load(self, now: float):
+        db = SessionLocal()
+        try:
+            uri = self.target(db)
+            return uri, crud.get_due_traffic(db, now, self.concurrency * 50) if uri else []
+        finally: db.close()
+
+    def _settle(self, delivered: list, failed: list):
+        db = SessionLocal()
+        try:
+            if delivered: crud.delete_traffic(db, delivered)
+            now = time.time()
+            for ids, attempts in failed:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempts) * random.uniform(0.5, 1.0)
+                crud.retry_traffic(db, ids, now + delay)
+        finally: db.close()
+
+    def _pack(self, rows):
+        # Row payloads are embedded as stored, without decoding them again.
+        head = '{"node":' + _dumps(NODE_NAME) + ',"batches":['
+        requests, ids, parts, size, attempts = [], [], [], len(head), 0
+        for row in rows:
+            part = f'{{"id":"{row.batch_id}","ts":{row.created_at!r},"users":{row.users}}}'
+            if parts and size + len(part) + 1 > MAX_BODY:
+                requests.append((ids, attempts, head + ",".join(parts) + "]}"))
+                ids, parts, size, attempts = [], [], len(head), 0
+            ids.append(row.id)
+            parts.append(part)
+            size += len(part) + 1
+            attempts = max(attempts, row.attempts)
+        if parts:
+            requests.append((ids, attempts, head + ",".join(parts) + "]}"))
+        return requests
+
+    async def _post(self, uri: str, body: str):
+        import httpx
+        if self.client is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self.client = httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT,
+                                            headers={"Content-Type": "application/json", "User-Agent": "v-ui-panel"})
+        self.stats["requests"] += 1
+        try:
+            response = await self.client.post(uri, content=body.encode())
+            if response.is_success: return True
+            self.stats["last_error"] = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            self.stats["last_error"] = f"{type(e).__name__}: {e}"
+        self.stats["failures"] += 1
+        return False
+
+    async def deliver_once(self) -> int:
+        """Send every due row once; returns the number of rows delivered."""
+        uri, rows = await asyncio.to_thread(self._load, time.time())
+        if not rows: return 0
+        requests = self._pack(rows)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(body):
+            async with semaphore:
+                return await self._post(uri, body)
+
+        results = await asyncio.gather(*(send(body) for _, _, body in requests))
+        delivered = [i for (ids, _, _), ok in zip(requests, results) if ok for i in ids]
+        failed = [(ids, attempts) for (ids, attempts, _), ok in zip(requests, results) if not ok]
+        await asyncio.to_thread(self._settle, delivered, failed)
+        if delivered:
+            self.stats["batches"] += len(delivered)
+            self.stats["last_success"] = time.time()
+        return len(delivered)
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    delivered = await self.deliver_once()
+                except Exception as e:
+                    print(f"Traffic webhook delivery failed: {e}")
+                    delivered = 0
+                # Keep going while catching up; otherwise wait for the next tick.
+                if not delivered: await asyncio.sleep(self.interval)
+        finally:
+            if self.client is not None:
+                await self.client.aclose()
+                self.client = None
+
+
+traffic_webhook = TrafficWebhook()
@@ -0,0 +1,243 @@
+# app/xray.py
+import os, json, subprocess
+from typing import List
+from sqlalchemy.orm import Session
+
+from .readmodel import read_model
+from .accesslog import ACCESS_LOG_PATH
+
+# Address of the Xray API inbound (see the "api" inbound in generate_config).
+XRAY_API_ADDRESS = os.environ.get("VUI_XRAY_API", "127.0.0.1:62789")
+XRAY_API_PORT = int(XRAY_API_ADDRESS.rsplit(":", 1)[1])
+# A full "user>>>" query is ~85 bytes per user; gRPC's 4MB default overflows around 50k users.
+XRAY_API_MAX_MESSAGE = 256 * 1024 * 1024
+
+
+# --- Xray API Client ---
+_channels = {}
+
+def get_stats_stub():
+    """StatsService stub over one long-lived gRPC channel per API address.
+
+    Reusing the channel keeps the HTTP/2 connection open between polls instead
+    of reconnecting every time; gRPC reconnects it by itself after an Xray restart.
+    """
+    # grpc and the protobuf stubs are imported on first use to keep startup fast.
+    import grpc
+    from .xray_api import stats_pb2_grpc
+    stub = _channels.get(XRAY_API_ADDRESS)
+    if stub is None:
+        channel = grpc.insecure_channel(XRAY_API_ADDRESS, options=[("grpc.max_receive_message_length", XRAY_API_MAX_MESSAGE)])
+        stub = _channels[XRAY_API_ADDRESS] = stats_pb2_grpc.StatsServiceStub(channel)
+    return stub
+
+def get_handler_stub():
+    """HandlerService stub, on its own channel to the same API inbound."""
+    import grpc
+    from .xray_api import handler_pb2_grpc
+    stub = _channels.get(("handler", XRAY_API_ADDRESS))
+    if stub is None:
+        stub = _channels[("handler", XRAY_API_ADDRESS)] = handler_pb2_grpc.HandlerServiceStub(grpc.insecure_channel(XRAY_API_ADDRESS))
+    return stub
+
+def alter_inbound_users(changes):
+    """Apply [(tag, email, uuid or None to remove)] to the running Xray through HandlerService.
+
+    Raises grpc.RpcError on the first failure; the caller falls back to a restart.
+    """
+    from .xray_api import handler_pb2 as pb
+    stub = get_handler_stub()
+    for tag, email, uuid in changes:
+        if uuid is None:
+            op = pb.TypedMessage(type="xray.app.proxyman.command.RemoveUserOperation",
+                                 value=pb.RemoveUserOperation(email=email).SerializeToString())
+        else:
+            account = pb.TypedMessage(type="xray.proxy.vless.Account", value=pb.VlessAccount(id=uuid).SerializeToString())
+            op = pb.TypedMessage(type="xray.app.proxyman.command.AddUserOperation",
+                                 value=pb.AddUserOperation(user=pb.User(level=0, email=email, account=account)).SerializeToString())
+        stub.AlterInbound(pb.AlterInboundRequest(tag=tag, operation=op), timeout=5)
+    return len(changes)
+
+def query_xray_stats(pattern: str = "", reset: bool = True):
+    """Raw QueryStats counters as {name: value}, or None when Xray can't be reached.
+
+    The default empty pattern returns user, inbound and outbound counters in a
+    single call, so one poll covers all three.
+    """
+    from .xray_api import stats_pb2
+    try:
+        res = get_stats_stub().QueryStats(stats_pb2.QueryStatsRequest(pattern=pattern, reset=reset), timeout=30)
+        return {stat.name: stat.value for stat in res.stat}
+    except Exception as e:
+        print(f"Could not connect to Xray API: {e}")
+        return None
+
+def get_xray_sys_stats():
+    """Xray's Go runtime stats (GetSysStats) as a dict, or None when Xray can't be reached."""
+    from .xray_api import stats_pb2
+    try:
+        res = get_stats_stub().GetSysStats(stats_pb2.SysStatsRequest(), timeout=5)
+    except Exception:
+        return None  # polled every few seconds; the sampler reports state changes instead
+    return {
+        "goroutines": res.NumGoroutine, "num_gc": res.NumGC, "alloc": res.Alloc, "total_alloc": res.TotalAlloc,
+        "sys": res.Sys, "mallocs": res.Mallocs, "frees": res.Frees, "live_objects": res.LiveObjects,
+        "pause_total_ns": res.PausedTotalNs, "uptime": res.Uptime,
+    }
+
+def split_stats(counters: dict):
+    """Split "kind>>>name>>>traffic>>>uplink|downlink" counters by kind.
+
+    Returns {kind: {name: {'up': int, 'down': int}}} for kind in user, inbound
+    and outbound.
+    """
+    result = {"user": {}, "inbound": {}, "outbound": {}}
+    for name, value in counters.items():
+        parts = name.split('>>>')
+        if len(parts) != 4 or parts[0] not in result: continue
+        kind, tag, direction = parts[0], parts[1], parts[3]
+        entry = result[kind].get(tag)
+        if entry is None:
+            entry = result[kind][tag] = {'up': 0, 'down': 0}
+        if direction == 'uplink':
+            entry['up'] += value
+        elif direction == 'downlink':
+            entry['down'] += value
+    return result
+
+def get_xray_stats(emails: List[str]):
+    counters = query_xray_stats("user>>>")
+    return split_stats(counters)["user"] if counters else {}
+
+def inbound_tag(port: int) -> str:
+    return f"inbound-{port}"
+
+
+# --- Helper functions for system interaction ---
+def run_shell_command(command):
+    try:
+        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        return result.stdout.strip()
+    except subprocess.CalledProcessError as e:
+        print(f"Error executing command: {e.stderr.strip()}")
+        return None
+
+def get_xray_status():
+    status = run_shell_command("systemctl is-active xray.service")
+    return status if status else "unknown"
+
+def get_xray_version():
+    output = run_shell_command("/usr/local/bin/xray --version")
+    if output:
+        return output.splitlines()[0]
+    return "Not Found"
+
+
+# --- XRAY CONFIG MANAGER ---
+HANDLER_PROTOCOLS = ("vless",)  # protocols whose users can be added and removed through HandlerService
+HANDLER_MAX_CHANGES = 2000  # beyond this many user changes a restart is quicker than one RPC each
+
+def _split_users(config):
+    """(config without HandlerService-managed clients as a JSON string, {tag: {email: uuid}})."""
+    users, shape = {}, dict(config, inbounds=[])
+    for inbound in config["inbounds"]:
+        if inbound["protocol"] in HANDLER_PROTOCOLS:
+            users[inbound["tag"]] = {c["email"]: c["id"] for c in inbound["settings"]["clients"]}
+            inbound = dict(inbound, settings=dict(inbound["settings"], clients=None))
+        shape["inbounds"].append(inbound)
+    return json.dumps(shape, sort_keys=True), users
+
+def _user_changes(before, after):
+    changes = []
+    for tag, users in after.items():
+        old = before.get(tag, {})
+        changes += [(tag, email, None) for email, uuid in old.items() if users.get(email) != uuid]
+        changes += [(tag, email, uuid) for email, uuid in users.items() if old.get(email) != uuid]
+    return changes
+
+class XrayManager:
+    """Writes config.json from the read model and applies it.
+
+    When only users of HANDLER_PROTOCOLS inbounds changed since the config the
+    running Xray was last given, apply_config adds and removes them through the
+    API: a restart would drop every connection and every unread traffic counter.
+    Anything else, the first apply after the panel starts, an API error, or a
+    config.json rewritten by another process (cli.py commands restart Xray
+    themselves) restarts the service with the file.
+    """
+    def __init__(self, config_path="/usr/local/etc/xray/config.json"):
+        self.config_path = config_path
+        self.written = None  # _split_users() of the last config written
+        self.applied = None  # ... and of the one the running Xray has, when known
+        self.stamp = None  # config.json's stat after our last write
+        self.api_applies = 0
+        self.restarts = 0
+
+    def generate_config(self, db: Session):
+        config = { "log": { "loglevel": "warning", "access": ACCESS_LOG_PATH } }
+        config.update({
+            "api": { "tag": "api", "services": ["StatsService", "HandlerService"] },
+            "stats": {},
+            "policy": {
+                "levels": { "0": { "statsUserUplink": True, "statsUserDownlink": True } },
+                "system": { "statsInboundUplink": True, "statsInboundDownlink": True, "statsOutboundUplink": True, "statsOutboundDownlink": True }
+            },
+            "inbounds": [{ "tag": "api", "listen": "127.0.0.1", "port": XRAY_API_PORT, "protocol": "dokodemo-door", "settings": { "address": "127.0.0.1" } }],
+            "outbounds": [{ "protocol": "freedom", "tag": "direct" }, { "protocol": "blackhole", "tag": "api" }],
+            "routing": { "domainStrategy": "AsIs", "rules": [ { "type": "field", "inboundTag": ["api"], "outboundTag": "api" } ] }
+        })
+
+        # config.json decides who can connect: pick up writes from other processes
+        # (cli.py) now rather than at the next scheduled staleness check.
+        read_model.refresh_if_stale(db)
+        for inbound, clients in read_model.xray_inbounds():
+            xray_clients = [{"id": c.uuid, "email": c.remark, "level": 0} for c in clients]
+
+            if not xray_clients: continue
+            xray_inbound = {
+                "port": inbound.port, "listen": "0.0.0.0", "protocol": inbound.protocol,
+                "settings": { "clients": xray_clients, "decryption": "none" },
+                "streamSettings": inbound.stream, "tag": inbound_tag(inbound.port)
+            }
+            config["inbounds"].append(xray_inbound)
+
+        if self._file_stamp() != self.stamp:
+            self.applied = None  # someone else wrote (and applied) the file since; what Xray runs is unknown
+        try:
+            with open(self.config_path, 'w') as f: json.dump(config, f, indent=4)
+        except Exception as e:
+            print(f"FATAL: Error writing Xray config: {e}")
+            return False
+        self.written, self.stamp = _split_users(config), self._file_stamp()
+        return True
+
+    def _file_stamp(self):
+        try: st = os.stat(self.config_path)
+        except OSError: return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def apply_config(self):
+        written, applied = self.written, self.applied
+        if written is not None and applied is not None and written[0] == applied[0]:
+            changes = _user_changes(applied[1], written[1])
+            if len(changes) <= HANDLER_MAX_CHANGES:
+                try:
+                    alter_inbound_users(changes)
+                    self.applied = written
+                    self.api_applies += 1
+                    return f"{len(changes)} user changes applied through the Xray API"
+                except Exception as e:
+                    print(f"Could not apply user changes through the Xray API, restarting Xray: {e}")
+        return self.restart()
+
+    def restart(self):
+        result = run_shell_command("sudo systemctl restart xray.service")
+        self.restarted(result is not None)
+        return result
+
+    def restarted(self, reloaded: bool):
+        """Record a restart done elsewhere. `reloaded`: Xray is running the last written
+        file; otherwise (stopped, or started when it may have been running) it is unknown."""
+        self.applied = self.written if reloaded else None
+        if reloaded: self.restarts += 1
+xray_manager = XrayManager()
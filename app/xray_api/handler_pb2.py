@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: app/xray_api/handler.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'app/xray_api/handler.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1a\x61pp/xray_api/handler.proto\x12\x19xray.app.proxyman.command\"+\n\x0cTypedMessage\x12\x0c\n\x04type\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x0c\"^\n\x04User\x12\r\n\x05level\x18\x01 \x01(\r\x12\r\n\x05\x65mail\x18\x02 \x01(\t\x12\x38\n\x07\x61\x63\x63ount\x18\x03 \x01(\x0b\x32\'.xray.app.proxyman.command.TypedMessage\"<\n\x0cVlessAccount\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04\x66low\x18\x02 \x01(\t\x12\x12\n\nencryption\x18\x03 \x01(\t\"A\n\x10\x41\x64\x64UserOperation\x12-\n\x04user\x18\x01 \x01(\x0b\x32\x1f.xray.app.proxyman.command.User\"$\n\x13RemoveUserOperation\x12\r\n\x05\x65mail\x18\x01 \x01(\t\"^\n\x13\x41lterInboundRequest\x12\x0b\n\x03tag\x18\x01 \x01(\t\x12:\n\toperation\x18\x02 \x01(\x0b\x32\'.xray.app.proxyman.command.TypedMessage\"\x16\n\x14\x41lterInboundResponse2\x83\x01\n\x0eHandlerService\x12q\n\x0c\x41lterInbound\x12..xray.app.proxyman.command.AlterInboundRequest\x1a/.xray.app.proxyman.command.AlterInboundResponse\"\x00\x42(Z&xray.website/core/app/proxyman/commandb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'app.xray_api.handler_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  _globals['DESCRIPTOR']._loaded_options = None
+  _globals['DESCRIPTOR']._serialized_options = b'Z&xray.website/core/app/proxyman/command'
+  _globals['_TYPEDMESSAGE']._serialized_start=57
+  _globals['_TYPEDMESSAGE']._serialized_end=100
+  _globals['_USER']._serialized_start=102
+  _globals['_USER']._serialized_end=196
+  _globals['_VLESSACCOUNT']._serialized_start=198
+  _globals['_VLESSACCOUNT']._serialized_end=258
+  _globals['_ADDUSEROPERATION']._serialized_start=260
+  _globals['_ADDUSEROPERATION']._serialized_end=325
+  _globals['_REMOVEUSEROPERATION']._serialized_start=327
+  _globals['_REMOVEUSEROPERATION']._serialized_end=363
+  _globals['_ALTERINBOUNDREQUEST']._serialized_start=365
+  _globals['_ALTERINBOUNDREQUEST']._serialized_end=459
+  _globals['_ALTERINBOUNDRESPONSE']._serialized_start=461
+  _globals['_ALTERINBOUNDRESPONSE']._serialized_end=483
+  _globals['_HANDLERSERVICE']._serialized_start=486
+  _globals['_HANDLERSERVICE']._serialized_end=617
+# @@protoc_insertion_point(module_scope)
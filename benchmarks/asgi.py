@@ -0,0 +1,94 @@
+# benchmarks/asgi.py
+"""Minimal in-process ASGI driver: no sockets and no HTTP client library, so
+the numbers measure the panel itself rather than the transport."""
+import asyncio, contextlib
+from urllib.parse import urlencode
+
+
+class ASGIResponse:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self):
+        self.status = 0
+        self.headers = {}
+        self.body = bytearray()
+
+    def header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+
+class ASGIDriver:
+    def __init__(self, app):
+        self.app = app
+        self.cookies = {}
+
+    async def request(self, method, path, headers=None, body=b"", form=None):
+        path, _, query = path.partition("?")
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if form is not None:
+            body = urlencode(form).encode()
+            headers["content-type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        headers.setdefault("host", "bench.local")
+        headers["content-length"] = str(len(body))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "",
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+            "client": ("127.0.0.1", 50000), "server": ("bench.local", 80),
+        }
+        sent = False
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        response = ASGIResponse()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response.status = message["status"]
+                for k, v in message.get("headers", []):
+                    k, v = k.decode().lower(), v.decode()
+                    if k == "set-cookie":
+                        name, _, rest = v.partition("=")
+                        self.cookies[name] = rest.split(";", 1)[0]
+                    response.headers[k] = v
+            elif message["type"] == "http.response.body":
+                response.body += message.get("body", b"")
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            disconnected.set()
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup/shutdown handlers around the block."""
+    to_app, from_app = asyncio.Queue(), asyncio.Queue()
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, to_app.get, from_app.put))
+    await to_app.put({"type": "lifespan.startup"})
+    message = await from_app.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"lifespan startup failed: {message}")
+    try:
+        yield
+    finally:
+        await to_app.put({"type": "lifespan.shutdown"})
+        await from_app.get()
+        await task
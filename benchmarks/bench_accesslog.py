@@ -0,0 +1,100 @@
+# benchmarks/bench_accesslog.py
+"""Access-log parser and tailer throughput against synthetic Xray logs.
+
+    python -m benchmarks.bench_accesslog --lines 500000 --users 50000
+
+"parse" feeds one in-memory buffer to AccessLogMonitor.feed; "tail" appends
+the same lines to a file in chunks, rotating it halfway, and polls through
+LogTailer as the panel does. Both must keep up with --target lines/s and
+count every accepted line exactly once.
+"""
+import argparse, json, os, random, sys, tempfile, time
+
+from app.accesslog import AccessLogMonitor
+
+FORMATS = (
+    "{ts} {ip}:{port} accepted tcp:www.example.com:443 [inbound-443 -> direct] email: {email}\n",
+    "{ts}.{us:06d} from tcp:{ip}:{port} accepted tcp:api.example.com:443 [inbound-443 >> direct] email: {email}\n",
+    "{ts}.{us:06d} from {ip}:{port} accepted udp:1.1.1.1:53 [inbound-8443 >> direct] email: {email}\n",
+)
+NOISE = (
+    "{ts} {ip}:{port} rejected  proxy/vless/encoding: invalid request user id\n",
+    "{ts}.{us:06d} from {ip}:{port} accepted tcp:www.example.com:443 [api >> api]\n",
+)
+
+
+def generate(lines, users, ips_per_user, seed):
+    """Synthetic log lines; returns (bytes, accepted_count)."""
+    rng = random.Random(seed)
+    start = time.time() - 60
+    out, accepted = [], 0
+    for i in range(lines):
+        ts = time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(start + i * 60 / lines))
+        user = rng.randrange(users)
+        n = rng.randrange(ips_per_user)
+        ip = f"[2001:db8::{user:x}:{n:x}]" if user % 5 == 0 else f"10.{user >> 8 & 255}.{user & 255}.{n + 1}"
+        if rng.random() < 0.05:
+            template = rng.choice(NOISE)
+        else:
+            template = rng.choice(FORMATS)
+            accepted += 1
+        out.append(template.format(ts=ts, us=rng.randrange(10 ** 6), ip=ip, port=rng.randrange(1024, 65535), email=f"user{user}"))
+    return "".join(out).encode(), accepted
+
+
+def bench_parse(data, accepted):
+    monitor = AccessLogMonitor(path=os.devnull)
+    t0 = time.perf_counter()
+    matched = monitor.feed(data)
+    elapsed = time.perf_counter() - t0
+    lines = data.count(b"\n")
+    return {"lines_per_s": round(lines / elapsed), "seconds": round(elapsed, 3), "matched": matched,
+            "users_tracked": len(monitor.last_seen), "ok": matched == accepted}
+
+
+def bench_tail(data, accepted, chunks, workdir):
+    path = os.path.join(workdir, "access.log")
+    open(path, "wb").close()
+    monitor = AccessLogMonitor(path=path)
+    monitor.poll()  # open the (empty) file
+    lines = data.splitlines(keepends=True)
+    step = -(-len(lines) // chunks)
+    matched = 0
+    t0 = time.perf_counter()
+    for n, i in enumerate(range(0, len(lines), step)):
+        if n == chunks // 2:
+            os.rename(path, path + ".1")  # logrotate-style: the writer keeps the old file briefly
+            with open(path + ".1", "ab") as f: f.write(b"".join(lines[i:i + step // 2]))
+            with open(path, "ab") as f: f.write(b"".join(lines[i + step // 2:i + step]))
+        else:
+            with open(path, "ab") as f: f.write(b"".join(lines[i:i + step]))
+        matched += monitor.poll()
+    matched += monitor.poll()
+    elapsed = time.perf_counter() - t0
+    monitor.tailer.close()
+    return {"lines_per_s": round(len(lines) / elapsed), "seconds": round(elapsed, 3), "matched": matched,
+            "ok": matched == accepted}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--ips-per-user", type=int, default=3)
+    parser.add_argument("--chunks", type=int, default=50, help="writes (and polls) in the tail benchmark")
+    parser.add_argument("--target", type=int, default=50000, help="required lines/s")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    data, accepted = generate(args.lines, args.users, args.ips_per_user, args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = {"parse": bench_parse(data, accepted), "tail": bench_tail(data, accepted, args.chunks, workdir)}
+    ok = all(r["ok"] and r["lines_per_s"] >= args.target for r in results.values())
+    json.dump({"benchmark": "accesslog", "lines": args.lines, "accepted": accepted, "target_lines_per_s": args.target,
+               "results": results, "ok": ok}, sys.stdout, indent=2)
+    print()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
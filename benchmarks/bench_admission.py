@@ -0,0 +1,153 @@
+# benchmarks/bench_admission.py
+"""Load test: /sub latency while admins hammer heavy endpoints, with and without admission control.
+
+    python -m benchmarks.bench_admission --subscriptions 5000 --seconds 8
+
+--pollers VPN apps poll /sub in a loop (--poll-interval apart) while --admins
+workers repeatedly fetch the full client list of an inbound and update
+subscriptions, all in one process and event loop like the panel. Each mode
+runs in its own process (VUI_ADMISSION=1 / 0; main binds its middleware on
+import). Reported: /sub p50/p99/max, admin requests completed and shed (503),
+and the admission gates' counters. Keep --admins under 15 for the "off" run:
+past the connection pool's size, unadmitted requests stall the event loop on
+pool checkouts (30s timeouts), which admission control also prevents.
+"""
+import argparse, asyncio, contextlib, importlib, json, os, random, subprocess, sys, tempfile, time
+
+VPN_UA = {"user-agent": "v2rayNG/1.8.5"}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else None
+
+
+async def load(app, subs, args):
+    from benchmarks.asgi import ASGIDriver, lifespan
+    from benchmarks.dataset import ADMIN_PASSWORD, ADMIN_USERNAME
+
+    rng = random.Random(args.seed)
+    driver = ASGIDriver(app)
+    sub_latencies, sub_errors = [], 0
+    admin = {"completed": 0, "shed": 0, "latencies": []}
+    stop = asyncio.Event()
+
+    async def poller():
+        nonlocal sub_errors
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            r = await driver.get(f"/sub/{rng.choice(subs)}", headers=VPN_UA)
+            if r.status == 200: sub_latencies.append(time.perf_counter() - t0)
+            else: sub_errors += 1
+            await asyncio.sleep(args.poll_interval)
+
+    async def admin_worker(n):
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            if n % 4 == 3:
+                sub_id = rng.randint(1, len(subs))
+                r = await driver.request("PUT", f"/api/v1/subscriptions/{sub_id}", headers={"content-type": "application/json"},
+                                         body=json.dumps({"total_mb": rng.randint(1, 100) * 1024}).encode())
+            else:
+                r = await driver.get(f"/api/v1/inbounds/{rng.randint(1, 3)}/stats")
+            if r.status == 503:
+                admin["shed"] += 1
+                await asyncio.sleep(min(float(r.header("retry-after", 1)), 0.2))
+            else:
+                admin["completed"] += 1
+                admin["latencies"].append(time.perf_counter() - t0)
+
+    async with lifespan(app):
+        await driver.post("/login", form={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+        await driver.get(f"/sub/{subs[0]}", headers=VPN_UA)  # load the read model
+        tasks = [asyncio.create_task(poller()) for _ in range(args.pollers)]
+        await asyncio.sleep(1)
+        idle = list(sub_latencies)
+        sub_latencies.clear()
+        tasks += [asyncio.create_task(admin_worker(n)) for n in range(args.admins)]
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+        from app.admission import admission
+        gates = admission.info()
+
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "sub_idle": {"p50_ms": ms(percentile(idle, 50)), "p99_ms": ms(percentile(idle, 99))},
+        "sub_under_load": {"requests": len(sub_latencies), "errors": sub_errors, "p50_ms": ms(percentile(sub_latencies, 50)),
+                           "p99_ms": ms(percentile(sub_latencies, 99)), "max_ms": ms(max(sub_latencies, default=None))},
+        "admin": {"completed": admin["completed"], "shed": admin["shed"], "p50_ms": ms(percentile(admin["latencies"], 50)),
+                  "p99_ms": ms(percentile(admin["latencies"], 99))},
+        "gates": gates,
+    }
+
+
+def child(args):
+    workdir = os.environ["BENCH_WORKDIR"]
+    db_path = os.path.join(workdir, "panel.db")
+    from app import xray
+    from benchmarks.fake_xray import FakeXray, serve
+    fake = FakeXray(users=args.subscriptions * 2)
+    server, address = serve(fake)
+    xray.XRAY_API_ADDRESS = address
+    xray.xray_manager.config_path = os.path.join(workdir, "config.json")
+    subs = json.load(open(os.path.join(workdir, "subs.json")))
+    with contextlib.redirect_stdout(sys.stderr):
+        main = importlib.import_module("main")
+        # Start Xray on the panel's config, so admin updates apply through the HandlerService.
+        with main.SessionLocal() as db: xray.xray_manager.generate_config(db)
+        fake.load_config(xray.xray_manager.config_path)
+        xray.xray_manager.restarted(True)
+        result = asyncio.run(load(main.app, subs, args))
+    server.stop(0)
+    json.dump(result, sys.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=5000)
+    parser.add_argument("--pollers", type=int, default=50)
+    parser.add_argument("--poll-interval", type=float, default=0.02)
+    parser.add_argument("--admins", type=int, default=12)
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "panel.db")
+        os.environ["VUI_DATABASE_URL"] = f"sqlite:///{db_path}"
+        from app import models
+        from benchmarks.dataset import open_session, populate
+        with contextlib.redirect_stdout(sys.stderr):
+            db = open_session(db_path)
+            populate(db, 3, args.subscriptions, 2, args.seed)
+            subs = [r for (r,) in db.query(models.Subscription.remark).filter(models.Subscription.enabled == True)]
+            db.get_bind().dispose()
+        json.dump(subs, open(os.path.join(workdir, "subs.json"), "w"))
+        seed_copy = db_path + ".seed"
+        os.replace(db_path, seed_copy)
+        for mode in ("off", "on"):
+            with open(seed_copy, "rb") as src, open(db_path, "wb") as dst: dst.write(src.read())
+            env = dict(os.environ, BENCH_WORKDIR=workdir, VUI_ADMISSION="1" if mode == "on" else "0",
+                       VUI_COLLECT_INTERVAL="0", VUI_SYSSTATS_INTERVAL="0", VUI_ACCESS_LOG_INTERVAL="0",
+                       VUI_BACKUP_INTERVAL="0", VUI_READMODEL_CHECK_INTERVAL="0", VUI_NOTIFY_FILE=os.devnull)
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_admission", "--child"] + (argv or sys.argv[1:]),
+                                 env=env, capture_output=True, text=True, timeout=args.seconds + 120)
+            if out.returncode:
+                sys.stderr.write(out.stderr[-2000:])
+                return 1
+            results[f"admission_{mode}"] = json.loads(out.stdout)
+    off, on = results["admission_off"]["sub_under_load"], results["admission_on"]["sub_under_load"]
+    json.dump({"benchmark": "admission", "subscriptions": args.subscriptions, "pollers": args.pollers, "admins": args.admins,
+               "results": results, "sub_p99_improvement": round(off["p99_ms"] / on["p99_ms"], 1) if on["p99_ms"] else None},
+              sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
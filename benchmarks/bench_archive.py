@@ -0,0 +1,134 @@
+# benchmarks/bench_archive.py
+"""Archival: hot-path timings before and after stale subscriptions are archived.
+
+    python -m benchmarks.bench_archive --subscriptions 50000 --stale 0.6
+
+--stale of the subscriptions are made archivable, half disabled and half
+expired, both longer ago than VUI_ARCHIVE_AFTER_DAYS. The paths that scan every
+user are timed before and after archive_stale: a read model load (startup and
+reloads), generate_config, the /api/v1/subscriptions listing, an inbound's
+client stats and a subscription search. The archive itself runs while a writer
+thread commits one-row traffic updates, as in bench_backup, so "max_write_ms"
+shows how long a batch holds the write lock. Then --restores subscriptions are
+restored one at a time; afterwards the read model must still match the
+database and nothing restored may be due for archiving again.
+"""
+import argparse, contextlib, json, os, random, sqlite3, statistics, sys, tempfile, time
+
+from sqlalchemy import text
+
+from app import archive, crud, search, xray
+from app.readmodel import ReadModel, read_model
+from app.search import create_search_index
+from benchmarks.bench_backup import with_writer
+from benchmarks.dataset import open_session, populate
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return round(statistics.median(times) * 1000, 2)
+
+
+def list_subscriptions():
+    # What GET /api/v1/subscriptions serializes.
+    fields = ("id", "remark", "total_gb", "expiry_time", "sub_token", "enabled")
+    return json.dumps([{f: getattr(sub, f) for f in fields} for sub in read_model.subscription_list()])
+
+
+def hot_paths(db, manager, repeat):
+    counts = {t: db.execute(text(f"SELECT count(*) FROM {t}")).scalar()
+              for t in ("subscriptions", "clients", "subscriptions_archive", "clients_archive")}
+    return {
+        "rows": counts,
+        "readmodel_load_ms": median_ms(lambda: ReadModel(interval=0).load(db), repeat),
+        "generate_config_ms": median_ms(lambda: manager.generate_config(db), repeat),
+        "config_kb": round(os.path.getsize(manager.config_path) / 1024),
+        "list_subscriptions_ms": median_ms(list_subscriptions, repeat),
+        "client_stats_ms": median_ms(lambda: crud.get_client_stats_rows(db, 1), repeat),
+        "search_ms": median_ms(lambda: search.search_subscriptions(db, "sub1", limit=50), repeat),
+    }
+
+
+def make_stale(path, subscriptions, fraction, seed):
+    rng = random.Random(seed)
+    ids = rng.sample(range(1, subscriptions + 1), int(subscriptions * fraction))
+    old = int(time.time() - (archive.ARCHIVE_AFTER_DAYS + 30) * 24 * 60 * 60)
+    disabled, expired = ids[::2], ids[1::2]
+    conn = sqlite3.connect(path)
+    conn.executemany("UPDATE subscriptions SET enabled = 0 WHERE id = ?", [(i,) for i in disabled])
+    # The triggers started these clocks just now; pretend they were disabled long ago.
+    conn.executemany("UPDATE subscription_inactive SET since = ? WHERE subscription_id = ?", [(old, i) for i in disabled])
+    conn.executemany("UPDATE subscriptions SET enabled = 1, expiry_time = ? WHERE id = ?", [(old, i) for i in expired])
+    # Some expired ones were disabled only now (as the collector does when a quota runs out):
+    # their age still counts from the expiry.
+    conn.executemany("UPDATE subscriptions SET enabled = 0 WHERE id = ?", [(i,) for i in expired[::3]])
+    conn.commit()
+    conn.close()
+    return len(ids)
+
+
+def run(args, workdir):
+    path = os.path.join(workdir, "panel.db")
+    db = open_session(path)
+    engine = db.get_bind()
+    create_search_index(engine)
+    archive.create_archive_triggers(engine)
+    populate(db, inbounds=3, subscriptions=args.subscriptions, clients_per_subscription=args.clients, seed=args.seed)
+    stale = make_stale(path, args.subscriptions, args.stale, args.seed)
+
+    manager = xray.XrayManager()
+    manager.config_path = os.path.join(workdir, "config.json")
+    read_model.ensure(db)
+    before = hot_paths(db, manager, args.repeat)
+
+    total_clients = args.subscriptions * args.clients
+    report, writes = with_writer(path, total_clients, args.write_every, lambda: archive.archive_stale(db))
+    after = hot_paths(db, manager, args.repeat)
+
+    rng = random.Random(args.seed)
+    restore_ms = []
+    for row in rng.sample(archive.list_archived(db, limit=10 ** 9), min(args.restores, report["subscriptions"])):
+        t0 = time.perf_counter()
+        archive.restore_archived(db, archive.find_archived(db, row.id))
+        restore_ms.append((time.perf_counter() - t0) * 1000)
+    due_again = archive.archive_stale(db, dry_run=True)["subscriptions"]
+    fresh = ReadModel(interval=0).load(db)
+    consistent = set(fresh.subscriptions) == set(read_model.subscriptions) and set(fresh.clients) == set(read_model.clients)
+    engine.dispose()
+    db.close()
+
+    speedup = {k: round(before[k] / after[k], 2) for k in before if k.endswith("_ms") and after[k]}
+    return {
+        "stale": stale, "before": before, "after": after, "speedup": speedup,
+        "archive": dict(report, subscriptions_per_second=round(report["subscriptions"] / report["seconds"]) if report["seconds"] else None,
+                        **writes),
+        "restore": {"count": len(restore_ms), "p50_ms": round(statistics.median(restore_ms), 2) if restore_ms else None,
+                    "max_ms": round(max(restore_ms, default=0), 2), "due_again": due_again},
+        "consistent": consistent,
+        "ok": report["subscriptions"] == stale and consistent and due_again == 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=2, help="clients per subscription")
+    parser.add_argument("--stale", type=float, default=0.6, help="share of subscriptions made archivable")
+    parser.add_argument("--restores", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--write-every", type=float, default=0.05, help="seconds between writer commits")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        result = run(args, workdir)
+    json.dump({"benchmark": "archive", "subscriptions": args.subscriptions, "results": result}, sys.stdout, indent=2)
+    print()
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# benchmarks/bench_backup.py
+"""Online backup: how long writers wait while a snapshot is taken.
+
+    python -m benchmarks.bench_backup --clients 100000
+
+A writer thread commits a one-row traffic update every --write-every seconds
+(its own connection, like the collector) while create_snapshot runs, first in
+PAGES_PER_STEP steps and then as a single step (pages=-1: the whole copy under
+one read lock), then with the database switched to WAL. "max_write_ms" is the
+slowest commit seen during each backup; "idle_max_write_ms" is the same writer
+with no backup running. A write between steps restarts a stepped copy, so a
+busy writer ("restarts" > MAX_RESTARTS) pushes it to the single-step fallback.
+The snapshot is then restored over a copy of the database and its rows compared.
+"""
+import argparse, contextlib, gzip, json, os, random, shutil, sqlite3, statistics, sys, tempfile, threading, time
+
+from app import backup
+from benchmarks.dataset import open_session, populate
+
+
+class Writer(threading.Thread):
+    def __init__(self, path, clients, every):
+        super().__init__(daemon=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.clients, self.every = clients, every
+        self.latencies, self.stop = [], threading.Event()
+
+    def run(self):
+        rng = random.Random(1)
+        while not self.stop.is_set():
+            t0 = time.perf_counter()
+            self.conn.execute("UPDATE clients SET down_traffic = down_traffic + 1 WHERE id = ?", (rng.randint(1, self.clients),))
+            self.conn.commit()
+            self.latencies.append((time.perf_counter() - t0) * 1000)
+            time.sleep(self.every)
+        self.conn.close()
+
+
+def with_writer(path, clients, every, fn):
+    writer = Writer(path, clients, every)
+    writer.start()
+    time.sleep(0.2)
+    writer.latencies.clear()
+    try:
+        result = fn()
+    finally:
+        writer.stop.set()
+        writer.join()
+    lat = writer.latencies or [0]
+    return result, {"writes": len(writer.latencies), "max_write_ms": round(max(lat), 1),
+                    "p50_write_ms": round(statistics.median(lat), 2)}
+
+
+def counts(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {t: conn.execute(f"SELECT count(*), ifnull(sum(rowid), 0) FROM {t}").fetchone()
+                for t in ("subscriptions", "clients", "inbounds")}
+    finally:
+        conn.close()
+
+
+def run(args, workdir):
+    path = os.path.join(workdir, "panel.db")
+    db = open_session(path)
+    populate(db, inbounds=3, subscriptions=args.clients // 2, clients_per_subscription=2, seed=args.seed)
+    db.get_bind().dispose()
+    db.close()
+    snapshots = os.path.join(workdir, "backups")
+
+    _, idle = with_writer(path, args.clients, args.write_every, lambda: time.sleep(1))
+    modes = {}
+    for name, pages in (("stepped", backup.PAGES_PER_STEP), ("single_step", -1), ("wal", backup.PAGES_PER_STEP)):
+        if name == "wal":
+            conn = sqlite3.connect(path)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.close()
+        info, writes = with_writer(path, args.clients, args.write_every,
+                                   lambda: backup.create_snapshot(snapshots, source_path=path, pages=pages))
+        modes[name] = dict(writes, seconds=info["seconds"], copy_seconds=info["copy_seconds"],
+                           pages_per_step=info["pages_per_step"], restarts=info["restarts"])
+    latest = backup.list_snapshots(snapshots)[0]
+    size = os.path.getsize(latest)
+
+    # Restore over a copy: the snapshot's rows must come back.
+    target = os.path.join(workdir, "restored.db")
+    shutil.copy(path, target)
+    expected = counts(latest_raw(latest, workdir))
+    t0 = time.perf_counter()
+    backup.restore_snapshot(latest, target_path=target)
+    restore_s = time.perf_counter() - t0
+    restored = counts(target)
+
+    return {
+        "clients": args.clients, "db_mb": round(os.path.getsize(path) / 2 ** 20, 1),
+        "snapshot_mb": round(size / 2 ** 20, 2), "idle_max_write_ms": idle["max_write_ms"], "backup": modes,
+        "restore_seconds": round(restore_s, 3), "restored_rows_match": restored == expected,
+        "ok": restored == expected,
+    }
+
+
+def latest_raw(snapshot, workdir):
+    raw = os.path.join(workdir, "expected.db")
+    with gzip.open(snapshot, "rb") as src, open(raw, "wb") as out: shutil.copyfileobj(src, out)
+    return raw
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--write-every", type=float, default=0.05, help="seconds between writer commits")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        result = run(args, workdir)
+    json.dump({"benchmark": "backup", "results": result}, sys.stdout, indent=2)
+    print()
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
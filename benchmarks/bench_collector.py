@@ -0,0 +1,153 @@
+# benchmarks/bench_collector.py
+"""Collector throughput, accounting correctness and apply latency against FakeXray.
+
+    python -m benchmarks.bench_collector --users 1000 10000 50000
+
+Each size gets a fresh SQLite file seeded with one client per subscription;
+Xray only learns about the enabled ones through the generated config.
+Halfway through the rounds --provision subscriptions are disabled and as many
+clients added, and apply_config hands the change to the fake's HandlerService
+as it would to Xray's: "provision" checks that the running users match the
+new config without a restart. Accounting checks both the per-client totals
+and the per-inbound counters against the fake's ground truth. Results are
+printed as JSON.
+"""
+import argparse, contextlib, json, os, statistics, sys, tempfile, time
+
+from app import crud, models, xray
+from app.collector import TrafficCollector
+from app.readmodel import read_model
+from benchmarks.dataset import open_session, populate
+from benchmarks.fake_xray import FakeXray, serve
+
+CLIENTS_PER_INBOUND = 5000
+
+
+def collect(collector, db):
+    # One collector tick, split into the Xray fetch and the DB apply.
+    t0 = time.perf_counter()
+    counters = xray.query_xray_stats("", reset=True)
+    t1 = time.perf_counter()
+    stats = collector.apply(db, counters) if counters is not None else None
+    t2 = time.perf_counter()
+    return stats, t1 - t0, t2 - t1
+
+
+def provision(db, manager, fake, count):
+    """Disable `count` enabled subscriptions, add `count` clients, apply through the API."""
+    enabled = [s.id for s in db.query(models.Subscription.id).filter(models.Subscription.enabled == True).limit(count)]
+    inbound_ids = [i for (i,) in db.query(models.Inbound.id)]
+    restarts = fake.restarts
+    t0 = time.perf_counter()
+    for sub_id in enabled: crud.update_subscription(db, sub_id, {"enabled": False})
+    crud.bulk_create_clients(db, [{"remark": f"new{n}", "subscription_remark": f"new-sub{n}",
+                                   "inbound_id": inbound_ids[n % len(inbound_ids)]} for n in range(count)])
+    t1 = time.perf_counter()
+    manager.generate_config(db)
+    t2 = time.perf_counter()
+    result = manager.apply_config()
+    t3 = time.perf_counter()
+    with open(manager.config_path) as f: config = json.load(f)
+    expected = {c["email"] for inbound in config["inbounds"] for c in inbound.get("settings", {}).get("clients") or []}
+    return {
+        "disabled": len(enabled), "added": count, "result": result,
+        "db_ms": round((t1 - t0) * 1000, 2), "generate_config_ms": round((t2 - t1) * 1000, 2),
+        "api_apply_ms": round((t3 - t2) * 1000, 2), "user_ops": fake.user_ops,
+        "ok": set(fake.users) == expected and fake.restarts == restarts and manager.api_applies == 1,
+    }
+
+
+def run(users, rounds, latency_ms, failure_rate, provision_count, workdir):
+    db = open_session(os.path.join(workdir, f"bench-{users}.db"))
+    populate(db, inbounds=-(-users // CLIENTS_PER_INBOUND), subscriptions=users)
+    usage = models.Client.up_traffic + models.Client.down_traffic
+    initial = dict(db.query(models.Client.remark, usage).all())
+
+    fake = FakeXray(latency_ms=latency_ms, failure_rate=failure_rate)
+    server, address = serve(fake)
+    xray.XRAY_API_ADDRESS = address
+
+    # Apply latency: render config.json from the DB and "restart" Xray with it.
+    manager = xray.XrayManager(config_path=os.path.join(workdir, f"config-{users}.json"))
+    t0 = time.perf_counter()
+    manager.generate_config(db)
+    t1 = time.perf_counter()
+    loaded = fake.load_config(manager.config_path)
+    t2 = time.perf_counter()
+    manager.restarted(True)
+
+    collector = TrafficCollector(interval=0)
+    fetch_times, apply_times, empty_rounds = [], [], 0
+    provisioned = None
+    for n in range(rounds):
+        if n == rounds // 2:
+            # Removing a user drops its unread counters in Xray too, so the panel's
+            # collector has read them by now; here that is one clean tick first.
+            fake.failure_rate = 0
+            collect(collector, db)
+            provisioned = provision(db, manager, fake, min(provision_count, users // 10))
+            fake.failure_rate = failure_rate
+        fake.advance()
+        stats, fetch, apply = collect(collector, db)
+        if not stats: empty_rounds += 1
+        fetch_times.append(fetch)
+        apply_times.append(apply)
+
+    # Drain whatever failed rounds left behind, then reconcile with the ground truth.
+    fake.failure_rate = 0
+    collect(collector, db)
+    stored = dict(db.query(models.Client.remark, usage).all())
+    recorded = {email: stored[email] - initial.get(email, 0) for email in stored}
+    mismatched = sum(1 for email, (up, down) in fake.totals.items() if recorded.get(email, 0) != up + down)
+    expected = sum(up + down for up, down in fake.totals.values())
+    inbound_bytes = sum(r.up + r.down for r in crud.get_traffic_counters(db, "inbound"))
+    # What GET /api/v1/inbounds reads: the read model's inbounds plus their traffic counter rows.
+    listing_start = time.perf_counter()
+    counters = {row.tag: row for row in crud.get_traffic_counters(db, "inbound")}
+    listing = [(ib, counters.get(xray.inbound_tag(ib.port))) for ib in read_model.ensure(db).inbound_list()]
+    listing_ms = (time.perf_counter() - listing_start) * 1000
+
+    server.stop(0)
+    db.get_bind().dispose()
+    db.close()
+
+    round_times = [f + a for f, a in zip(fetch_times, apply_times)]
+    return {
+        "users": users,
+        "rounds": rounds,
+        "apply": {"generate_config_ms": round((t1 - t0) * 1000, 2), "load_ms": round((t2 - t1) * 1000, 2), "loaded_users": loaded},
+        "collector": {
+            "round_ms_p50": round(statistics.median(round_times) * 1000, 2),
+            "round_ms_max": round(max(round_times) * 1000, 2),
+            "fetch_ms_p50": round(statistics.median(fetch_times) * 1000, 2),
+            "db_apply_ms_p50": round(statistics.median(apply_times) * 1000, 2),
+            "users_per_s": round(users / statistics.median(round_times)),
+            "failed_rounds": empty_rounds,
+        },
+        "provision": provisioned,
+        "inbound_listing": {"inbounds": len(listing), "ms": round(listing_ms, 2)},
+        "accounting": {"expected_bytes": expected, "recorded_bytes": sum(recorded.values()), "inbound_counter_bytes": inbound_bytes,
+                       "mismatched_users": mismatched,
+                       "ok": mismatched == 0 and expected == sum(recorded.values()) == inbound_bytes},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collector benchmark against the fake Xray API")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--provision", type=int, default=500, help="subscriptions disabled and clients added mid-run (at most a tenth of --users)")
+    args = parser.parse_args(argv)
+
+    # The panel reports Xray errors with print(); keep stdout for the JSON report.
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        results = [run(n, args.rounds, args.latency_ms, args.failure_rate, args.provision, workdir) for n in args.users]
+    json.dump({"benchmark": "collector", "results": results}, sys.stdout, indent=2)
+    print()
+    return 0 if all(r["accounting"]["ok"] and (r["provision"] or {"ok": True})["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
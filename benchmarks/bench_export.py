@@ -0,0 +1,79 @@
+# benchmarks/bench_export.py
+"""Usage export: throughput and peak memory at growing row counts.
+
+    python -m benchmarks.bench_export --clients 10000 100000
+
+For each size, every scope/format combination is streamed to /dev/null (time,
+rows/s, output size) and then again under tracemalloc for its peak. "buffered"
+is the same rows fetched and encoded in one go, as a listing endpoint does.
+Flat streaming means peak_kb stays about the same while rows grow tenfold.
+"""
+import argparse, contextlib, json, os, sys, tempfile, time, tracemalloc
+
+from app import export
+from benchmarks.dataset import open_session, populate
+
+COMBINATIONS = (("subscriptions", "csv", False), ("clients", "csv", False), ("clients", "jsonl", False), ("clients", "csv", True))
+
+
+def stream(db, scope, fmt, compress):
+    usage = export.UsageExport(db, scope, fmt, compress)
+    size = 0
+    with open(os.devnull, "wb") as out:
+        for chunk in usage:
+            size += len(chunk)
+            out.write(chunk)
+    return usage.rows, size
+
+
+def buffered(db, scope):
+    q, key = export.export_query(scope)
+    rows = [dict(r._mapping) for r in db.execute(q.order_by(key))]
+    body = json.dumps(rows).encode()
+    db.rollback()
+    return len(rows), len(body)
+
+
+def peak_kb(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(peak / 1024)
+
+
+def run_size(clients, workdir, seed):
+    db = open_session(os.path.join(workdir, f"export-{clients}.db"))
+    populate(db, inbounds=3, subscriptions=clients // 2, clients_per_subscription=2, seed=seed)
+    result = {"clients": clients, "subscriptions": clients // 2, "streams": []}
+    for scope, fmt, compress in COMBINATIONS:
+        t0 = time.perf_counter()
+        rows, size = stream(db, scope, fmt, compress)
+        elapsed = time.perf_counter() - t0
+        result["streams"].append({
+            "scope": scope, "format": fmt + (".gz" if compress else ""), "rows": rows,
+            "seconds": round(elapsed, 3), "rows_per_s": round(rows / elapsed), "mb": round(size / 2 ** 20, 2),
+            "peak_kb": peak_kb(lambda: stream(db, scope, fmt, compress)),
+        })
+    result["buffered_clients_json_peak_kb"] = peak_kb(lambda: buffered(db, "clients"))
+    db.get_bind().dispose()
+    db.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        results = [run_size(n, workdir, args.seed) for n in args.clients]
+    peaks = [max(s["peak_kb"] for s in r["streams"]) for r in results]
+    json.dump({"benchmark": "export", "results": results,
+               "streaming_peak_growth": round(peaks[-1] / peaks[0], 2) if peaks[0] else None}, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# benchmarks/bench_http.py
+"""Throughput and latency of the panel's HTTP endpoints, driven in-process.
+
+    python -m benchmarks.bench_http --subscriptions 2000 --clients 2 --output new.json
+    python -m benchmarks.bench_http --compare old.json new.json
+
+The app runs against a seeded temporary database and the fake Xray API, so
+two runs with the same arguments are directly comparable across versions.
+"""
+import argparse, asyncio, contextlib, importlib, json, os, platform, random, statistics, subprocess, sys, tempfile, time
+
+# app.database binds its engine on import, so nothing from app/ (or
+# benchmarks.dataset) is imported at module level here; run() sets
+# VUI_DATABASE_URL first.
+
+VPN_UA = {"user-agent": "v2rayNG/1.8.5"}
+BROWSER_UA = {"user-agent": "Mozilla/5.0 (Linux; Android 14) Chrome/126.0"}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def measure(make_request, requests, concurrency):
+    latencies, errors = [], 0
+    queue = list(range(requests))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            i = queue.pop()
+            t0 = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - t0)
+            if response.status >= 400: errors += 1
+
+    for _ in range(2): await make_request(0)  # warm caches and lazy imports
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests, "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_endpoints(app, enabled_subs, args):
+    from benchmarks.asgi import ASGIDriver, lifespan
+    from benchmarks.dataset import ADMIN_PASSWORD, ADMIN_USERNAME
+
+    rng = random.Random(args.seed)
+    driver = ASGIDriver(app)
+    login_form = {"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD}
+    endpoints = {
+        "login": (lambda i: driver.post("/login", form=login_form), args.login_requests),
+        "sub_client": (lambda i: driver.get(f"/sub/{rng.choice(enabled_subs)}", headers=VPN_UA), args.requests),
+        "sub_page": (lambda i: driver.get(f"/sub/{rng.choice(enabled_subs)}", headers=BROWSER_UA), args.requests),
+        "inbound_stats": (lambda i: driver.get("/api/v1/inbounds/1/stats"), args.requests),
+        "subscriptions": (lambda i: driver.get("/api/v1/subscriptions"), args.requests),
+        "system_stats": (lambda i: driver.get("/api/v1/system/stats"), args.system_requests),
+    }
+    results = {}
+    async with lifespan(app):
+        await driver.post("/login", form=login_form)
+        for name, (make_request, requests) in endpoints.items():
+            if args.only and name not in args.only: continue
+            results[name] = await measure(make_request, requests, args.concurrency)
+    return results
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "panel.db")
+        os.environ["VUI_DATABASE_URL"] = f"sqlite:///{db_path}"
+        from app import models, xray
+        from benchmarks.dataset import open_session, populate
+        from benchmarks.fake_xray import FakeXray, serve
+
+        db = open_session(db_path)
+        dataset = populate(db, args.inbounds, args.subscriptions, args.clients, args.seed)
+        enabled_subs = [r for (r,) in db.query(models.Subscription.remark).filter(models.Subscription.enabled == True)]
+        db.get_bind().dispose()
+        db.close()
+
+        fake = FakeXray(users=args.subscriptions * args.clients)
+        server, address = serve(fake)
+        xray.XRAY_API_ADDRESS = address
+        xray.xray_manager.config_path = os.path.join(workdir, "config.json")
+
+        # The panel logs with print(); keep stdout for the JSON report.
+        with contextlib.redirect_stdout(sys.stderr):
+            main = importlib.import_module("main")
+            results = asyncio.run(run_endpoints(main.app, enabled_subs, args))
+        server.stop(0)
+
+    return {
+        "benchmark": "http",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "dataset": dict(dataset, clients_per_subscription=args.clients, seed=args.seed),
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f: old = json.load(f)
+    with open(new_path) as f: new = json.load(f)
+    report = {}
+    for name, cur in new["results"].items():
+        prev = old["results"].get(name)
+        if not prev: continue
+        report[name] = {key: {"old": prev[key], "new": cur[key], "change_pct": round((cur[key] - prev[key]) / prev[key] * 100, 1) if prev[key] else None}
+                        for key in ("throughput_rps", "p50_ms", "p99_ms")}
+    return {"benchmark": "http-compare", "old": old.get("revision"), "new": new.get("revision"), "results": report}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="In-process HTTP benchmark for the panel")
+    parser.add_argument("--inbounds", type=int, default=3)
+    parser.add_argument("--subscriptions", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=1, help="clients per subscription")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--login-requests", type=int, default=20)
+    parser.add_argument("--system-requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="+", help="endpoint names to run")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved reports and exit")
+    args = parser.parse_args(argv)
+
+    report = compare(*args.compare) if args.compare else run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bench_import.py
+"""Importer throughput from synthetic 3x-ui and Marzban databases.
+
+    python -m benchmarks.bench_import --users 20000
+
+The 3x-ui source has two vless inbounds and a vmess one (skipped); each user
+has a client on both vless inbounds, grouped by subId. The Marzban source has
+one VLESS proxy per user. "per_row" times the same users created one at a time
+through crud.create_subscription/create_client, as the API does, on --per-row
+of them. The imported UUIDs and traffic must match the source.
+"""
+import argparse, contextlib, json, os, random, sqlite3, sys, tempfile, time, uuid
+
+from sqlalchemy import select
+
+from app import crud, models
+from app.importer import Importer, open_source
+from benchmarks.dataset import GB, open_session
+
+
+def make_xui(path, users, rng):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE inbounds (id INTEGER PRIMARY KEY, user_id INTEGER, up INTEGER, down INTEGER, total INTEGER, remark TEXT,"
+                 " enable INTEGER, expiry_time INTEGER, listen TEXT, port INTEGER, protocol TEXT, settings TEXT,"
+                 " stream_settings TEXT, tag TEXT, sniffing TEXT)")
+    conn.execute("CREATE TABLE client_traffics (id INTEGER PRIMARY KEY, inbound_id INTEGER, enable INTEGER, email TEXT,"
+                 " up INTEGER, down INTEGER, expiry_time INTEGER, total INTEGER, reset INTEGER)")
+    expected = {}
+    for ib, (port, protocol) in enumerate(((20000, "vless"), (20001, "vless"), (20002, "vmess")), start=1):
+        clients, traffic = [], []
+        for n in range(users):
+            email, cid = f"u{n}-in{ib}", str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            up, down = rng.randrange(GB), rng.randrange(10 * GB)
+            clients.append({"id": cid, "email": email, "enable": True, "totalGB": 50 * GB, "expiryTime": 0, "subId": f"sub-u{n}"})
+            traffic.append((ib, 1, email, up, down, 0, 0, 0))
+            if protocol == "vless": expected[cid] = (email, up, down)
+        conn.execute("INSERT INTO inbounds VALUES (?, 1, 0, 0, 0, ?, 1, 0, '', ?, ?, ?, ?, ?, ?)",
+                     (ib, f"in{ib}", port, protocol, json.dumps({"clients": clients}),
+                      '{"network": "tcp", "security": "none"}', f"inbound-{port}", "{}"))
+        conn.executemany("INSERT INTO client_traffics (inbound_id, enable, email, up, down, expiry_time, total, reset)"
+                         " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", traffic)
+    conn.commit()
+    conn.close()
+    return expected
+
+
+def make_marzban(path, users, rng):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, status TEXT, used_traffic INTEGER, data_limit INTEGER, expire INTEGER)")
+    conn.execute("CREATE TABLE proxies (id INTEGER PRIMARY KEY, user_id INTEGER, type TEXT, settings TEXT)")
+    expected = {}
+    for n in range(users):
+        cid, used = str(uuid.UUID(int=rng.getrandbits(128), version=4)), rng.randrange(10 * GB)
+        conn.execute("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)", (n + 1, f"m{n}", rng.choice(("active", "disabled")), used, 20 * GB, 0))
+        conn.execute("INSERT INTO proxies (user_id, type, settings) VALUES (?, 'VLESS', ?)", (n + 1, json.dumps({"id": cid, "flow": ""})))
+        expected[cid] = (f"m{n}", 0, used)
+    conn.commit()
+    conn.close()
+    return expected
+
+
+def verify(db, expected):
+    c = models.Client
+    found = {row.uuid: (row.remark, row.up_traffic, row.down_traffic) for row in db.execute(select(c.uuid, c.remark, c.up_traffic, c.down_traffic))}
+    return sum(1 for cid, values in expected.items() if found.get(cid) != values)
+
+
+def import_into(db, source, inbound_id=None):
+    kind, events = open_source(source)
+    stats = Importer(db, inbound_id=inbound_id).run(events)
+    return dict(stats, source=kind, clients_per_s=round(stats["read"] / stats["seconds"]))
+
+
+def run(args, workdir):
+    rng = random.Random(args.seed)
+    xui_path, marzban_path = os.path.join(workdir, "x-ui.db"), os.path.join(workdir, "marzban.db")
+    xui_expected = make_xui(xui_path, args.users, rng)
+    marzban_expected = make_marzban(marzban_path, args.users, rng)
+
+    db = open_session(os.path.join(workdir, "panel.db"))
+    xui = import_into(db, xui_path)
+    xui["mismatched"] = verify(db, xui_expected)
+    marzban = import_into(db, marzban_path, inbound_id=1)
+    marzban["mismatched"] = verify(db, marzban_expected)
+    again = import_into(db, xui_path)  # re-running skips everything
+    db.get_bind().dispose()
+    db.close()
+
+    db = open_session(os.path.join(workdir, "per-row.db"))
+    inbound = crud.create_inbound(db, {"remark": "in", "port": 1, "protocol": "vless"})
+    t0 = time.perf_counter()
+    for n in range(args.per_row):
+        sub = crud.create_subscription(db, f"s{n}", total_gb=50)
+        crud.create_client(db, inbound.id, sub.id, f"c{n}")
+    per_row = args.per_row / (time.perf_counter() - t0)
+    db.get_bind().dispose()
+    db.close()
+
+    return {
+        "users": args.users, "3x-ui": xui, "marzban": marzban,
+        "reimport": {"clients_created": again["clients_created"], "clients_skipped": again["clients_skipped"]},
+        "per_row": {"clients": args.per_row, "clients_per_s": round(per_row)},
+        "speedup": round(xui["clients_per_s"] / per_row, 1),
+        "ok": xui["mismatched"] == 0 and marzban["mismatched"] == 0 and again["clients_created"] == 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--per-row", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        result = run(args, workdir)
+    json.dump({"benchmark": "import", "results": result}, sys.stdout, indent=2)
+    print()
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
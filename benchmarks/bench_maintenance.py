@@ -0,0 +1,112 @@
+# benchmarks/bench_maintenance.py
+"""Database maintenance: space reclaimed and how long writers wait while it runs.
+
+    python -m benchmarks.bench_maintenance --clients 100000
+
+The database is seeded, switched to auto_vacuum=INCREMENTAL (convert(): a
+full VACUUM), and then the newer half of its clients is deleted, which frees
+whole pages. Copies of that database then reclaim the free pages in three ways while a writer thread
+commits one-row traffic updates, as in bench_backup:
+- "stepped": run_pass, VACUUM_PAGES_PER_STEP pages per transaction;
+- "one_step": every free page in a single incremental_vacuum;
+- "full_vacuum": a plain VACUUM.
+"max_write_ms" is the slowest commit seen during each run. The WAL part grows a
+WAL with a bulk update and runs a pass twice: once with the writer running (a
+PASSIVE checkpoint) and once quiet (TRUNCATE).
+"""
+import argparse, contextlib, json, os, shutil, sqlite3, sys, tempfile, time
+
+from app import maintenance
+from benchmarks.bench_backup import with_writer
+from benchmarks.dataset import open_session, populate
+
+
+def mb(n):
+    return round(n / 2 ** 20, 1)
+
+
+def reclaim(path, name, clients, every):
+    def work():
+        conn = maintenance._connect(path)
+        try:
+            if name == "stepped":
+                return maintenance.run_pass(path, vacuum_pages=10 ** 9)["vacuumed_pages"]
+            if name == "one_step":
+                return maintenance.incremental_vacuum(conn, 10 ** 9, step=10 ** 9)
+            pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute("VACUUM")
+            return pages
+        finally:
+            conn.close()
+    t0 = time.perf_counter()
+    freed, writes = with_writer(path, clients, every, work)
+    return dict(writes, seconds=round(time.perf_counter() - t0, 3), freed_pages=freed, file_mb=mb(os.path.getsize(path)))
+
+
+def run(args, workdir):
+    path = os.path.join(workdir, "panel.db")
+    db = open_session(path)
+    populate(db, inbounds=3, subscriptions=args.clients // 2, clients_per_subscription=2, seed=args.seed)
+    db.get_bind().dispose()
+    db.close()
+
+    t0 = time.perf_counter()
+    maintenance.convert(path)
+    convert_s = time.perf_counter() - t0
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM clients WHERE id > ?", (args.clients // 2,))
+    conn.commit()
+    churned = maintenance.metrics(conn, path, fragmentation=True)
+    conn.close()
+
+    runs = {}
+    for name in ("stepped", "one_step", "full_vacuum"):
+        copy = os.path.join(workdir, f"{name}.db")
+        shutil.copy(path, copy)
+        runs[name] = reclaim(copy, name, args.clients, args.write_every)
+
+    # Statistics: ANALYZE fills sqlite_stat1 for the planner.
+    conn = sqlite3.connect(os.path.join(workdir, "stepped.db"))
+    stat_rows = conn.execute("SELECT count(*) FROM sqlite_stat1").fetchone()[0]
+    conn.close()
+
+    # WAL: grow it, then checkpoint under load and when quiet.
+    wal_path = os.path.join(workdir, "stepped.db")
+    conn = sqlite3.connect(wal_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    for _ in range(20):
+        conn.execute("UPDATE clients SET up_traffic = up_traffic + 1")
+        conn.commit()
+        if os.path.getsize(wal_path + "-wal") > 2 * maintenance.WAL_TRUNCATE_BYTES: break
+    wal_grown = os.path.getsize(wal_path + "-wal")
+    busy, busy_writes = with_writer(wal_path, args.clients, args.write_every, lambda: maintenance.run_pass(wal_path, full_analyze=False))
+    quiet = maintenance.run_pass(wal_path, full_analyze=False)
+    conn.close()
+
+    return {
+        "clients": args.clients, "convert_seconds": round(convert_s, 3),
+        "after_churn": {"file_mb": mb(churned["file_bytes"]), "free_percent": churned["free_percent"],
+                        "unused_percent": churned["unused_percent"], "freelist_pages": churned["freelist_pages"]},
+        "reclaim": runs, "stat1_rows": stat_rows,
+        "wal": {"grown_mb": mb(wal_grown), "under_load": dict(busy["checkpoint"], **busy_writes),
+                "quiet": dict(quiet["checkpoint"], wal_mb_after=mb(quiet["after"]["wal_bytes"]))},
+        "ok": runs["stepped"]["freed_pages"] > 0 and stat_rows > 0 and quiet["checkpoint"]["mode"] == "TRUNCATE",
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--write-every", type=float, default=0.05, help="seconds between writer commits")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        result = run(args, workdir)
+    json.dump({"benchmark": "maintenance", "results": result}, sys.stdout, indent=2)
+    print()
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# benchmarks/bench_readmodel.py
+"""Read model: memory footprint, load time and read paths against the database.
+
+    python -m benchmarks.bench_readmodel --subscriptions 50000 --lookups 2000
+
+"memory_mb" is what tracemalloc sees allocated by ReadModel.load (records,
+indexes, parsed stream settings). "sub" times the data lookups behind
+/sub/{remark} and "generate_config" the Xray config build, each done from the
+model and the way they used to query the database. After a round of writes
+through crud (so through the hooks), check() must report no differences.
+"""
+import argparse, json, os, random, statistics, sys, tempfile, time, tracemalloc
+
+from app import crud, models, xray
+from app.links import build_share_link
+from app.readmodel import ReadModel, read_model
+from benchmarks.dataset import GB, open_session, populate
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def sub_from_db(db, remark):
+    # What /sub did before: ORM subscription, summed usage, lazy clients and inbounds, stream settings parsed per link.
+    sub = crud.get_subscription_by_remark(db, remark)
+    used = crud.get_total_usage_for_subscription(db, sub.id)
+    links = [build_share_link(c.inbound, c.uuid, c.remark, "bench.example.com") for c in sub.clients]
+    db.expunge_all()
+    return used, links
+
+
+def sub_from_model(model, remark):
+    sub = model.subscriptions_by_remark[remark]
+    used = model.usage(sub)
+    links = [build_share_link(ib, c.uuid, c.remark, "bench.example.com", ib.stream)
+             for c in model.clients_of_subscription(sub) for ib in (model.inbounds[c.inbound_id],)]
+    return used, links
+
+
+def config_from_db(db):
+    # The per-inbound client query generate_config ran before, with a lazy subscription load per client.
+    inbounds = []
+    for inbound in crud.get_inbounds(db):
+        if not inbound.enabled: continue
+        clients = [{"id": c.uuid, "email": c.remark, "level": 0}
+                   for c in db.query(models.Client).filter(models.Client.inbound_id == inbound.id) if c.subscription.enabled]
+        inbounds.append({"port": inbound.port, "settings": {"clients": clients}, "streamSettings": json.loads(inbound.stream_settings)})
+    db.expunge_all()
+    return inbounds
+
+
+def run(args, workdir):
+    db = open_session(os.path.join(workdir, "panel.db"))
+    counts = populate(db, inbounds=args.inbounds, subscriptions=args.subscriptions,
+                      clients_per_subscription=args.clients, seed=args.seed)
+
+    # Memory: a separate instance, so nothing else in the process is counted.
+    probe = ReadModel(interval=0)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    probe.load(db)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    memory = after - before
+    del probe
+
+    load_times = timed(lambda: read_model.load(db), 3)
+    model = read_model
+
+    rng = random.Random(args.seed)
+    remarks = [f"sub{rng.randrange(args.subscriptions)}" for _ in range(args.lookups)]
+    t0 = time.perf_counter()
+    db_results = [sub_from_db(db, r) for r in remarks]
+    sub_db = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    model_results = [sub_from_model(model, r) for r in remarks]
+    sub_model = time.perf_counter() - t0
+
+    manager = xray.XrayManager()
+    manager.config_path = os.path.join(workdir, "config.json")
+    config_db = timed(lambda: config_from_db(db), args.repeat)
+    config_model = timed(lambda: manager.generate_config(db), args.repeat)
+
+    # Writes through crud; the hooks must keep the model identical to the database.
+    t0 = time.perf_counter()
+    users = {f"user{i}": {"up": 1, "down": rng.randint(1, GB)} for i in rng.sample(range(counts["clients"]), counts["clients"] // 10)}
+    crud.update_clients_traffic(db, users)
+    traffic_ms = (time.perf_counter() - t0) * 1000
+    sub = crud.create_subscription(db, "bench-new", total_gb=5)
+    crud.create_client(db, inbound_id=1, subscription_id=sub.id, remark="bench-new-client")
+    crud.update_subscription(db, 2, {"enabled": False})
+    crud.reset_traffic_for_subscription(db, 3)
+    crud.delete_client(db, 4)
+    crud.update_inbound(db, 2, {"enabled": False})
+    crud.update_settings(db, {"domain_name": "changed.example.com"})
+    t0 = time.perf_counter()
+    problems = model.check(db)
+    check_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    stale = model.refresh_if_stale(db)
+    fingerprint_ms = (time.perf_counter() - t0) * 1000
+    db.get_bind().dispose()
+    db.close()
+
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "dataset": counts,
+        "memory_mb": round(memory / 2 ** 20, 2), "load_peak_mb": round(peak / 2 ** 20, 2),
+        "bytes_per_client": round(memory / counts["clients"]),
+        "load_ms_p50": ms(statistics.median(load_times)),
+        "sub": {"lookups": args.lookups, "db_us": round(sub_db / args.lookups * 1e6, 1),
+                "model_us": round(sub_model / args.lookups * 1e6, 1), "speedup": round(sub_db / sub_model, 1),
+                "same_result": db_results == model_results},
+        "generate_config": {"db_ms_p50": ms(statistics.median(config_db)), "model_ms_p50": ms(statistics.median(config_model))},
+        "hooks": {"traffic_update_ms": round(traffic_ms, 2), "traffic_clients": len(users)},
+        "consistency": {"check_ms": round(check_ms, 2), "differences": problems[:10], "reloaded": stale,
+                        "fingerprint_ms": round(fingerprint_ms, 2), "version": model.version},
+        "ok": not problems and not stale and db_results == model_results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=1, help="clients per subscription")
+    parser.add_argument("--inbounds", type=int, default=3)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run(args, workdir)
+    json.dump({"benchmark": "readmodel", "results": result}, sys.stdout, indent=2)
+    print()
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# benchmarks/bench_render.py
+"""Subscription renderers: per-format cost per /sub request, cold and cached.
+
+    python -m benchmarks.bench_render --subscriptions 2000 --clients 6
+
+"cold_us" renders with an empty cache (proxies parsed from the read model,
+then the format), "cached_us" is a cache hit plus the per-request finish()
+(base64's usage line and encoding). "legacy_base64_us" is what /sub did before
+the registry: share links rebuilt and encoded on every request. Outputs are
+checked: base64 against the legacy links, Clash with PyYAML when installed,
+sing-box as JSON. "after_change" is the first request after a config change
+(every format invalidated together).
+"""
+import argparse, base64, contextlib, json, os, random, statistics, sys, tempfile, time
+
+from app import crud, renderers
+from app.links import build_share_link
+from app.readmodel import ReadModel
+from benchmarks.dataset import open_session, populate
+
+ADDRESS = "bench.example.com"
+
+
+def per_request_us(fn, subs):
+    times = []
+    for sub in subs:
+        t0 = time.perf_counter()
+        fn(sub)
+        times.append(time.perf_counter() - t0)
+    return round(statistics.median(times) * 1e6, 1)
+
+
+def legacy_base64(model, sub):
+    used = model.usage(sub)
+    links = [renderers.info_link(sub, used)]
+    for c in model.clients_of_subscription(sub):
+        inbound = model.inbounds.get(c.inbound_id)
+        if inbound: links.append(build_share_link(inbound, c.uuid, c.remark, ADDRESS, inbound.stream))
+    return base64.b64encode("\n".join(links).encode("utf-8"))
+
+
+def check_output(name, body, proxies):
+    if name == "base64":
+        return True
+    if name == "sing-box":
+        return len(json.loads(body)["outbounds"]) == proxies + 2
+    try:
+        import yaml
+    except ImportError:
+        return None  # not checked
+    return len(yaml.safe_load(body)["proxies"]) == proxies
+
+
+def run(args, workdir):
+    db = open_session(os.path.join(workdir, "panel.db"))
+    populate(db, inbounds=3, subscriptions=args.subscriptions, clients_per_subscription=args.clients, seed=args.seed)
+    model = ReadModel().load(db)
+    rng = random.Random(args.seed)
+    subs = rng.sample(model.subscription_list(), min(args.requests, args.subscriptions))
+    address = lambda: ADDRESS
+
+    results = {}
+    for name, renderer in renderers.RENDERERS.items():
+        cache = renderers.RenderCache()
+        request = lambda sub: renderer.finish(cache.render(model, sub, renderer, address), sub, model.usage(sub))
+        cold = per_request_us(request, subs)
+        cached = per_request_us(request, subs)
+        body = cache.render(model, subs[0], renderer, address)
+        results[name] = {"cold_us": cold, "cached_us": cached, "speedup": round(cold / cached, 1),
+                         "bytes": len(renderer.finish(body, subs[0], 0)),
+                         "valid": check_output(name, body, len(model.clients_of_subscription(subs[0])))}
+    legacy = per_request_us(lambda sub: legacy_base64(model, sub), subs)
+
+    # Same output as before for base64 clients.
+    cache = renderers.RenderCache()
+    b64 = renderers.RENDERERS["base64"]
+    same = all(b64.finish(cache.render(model, s, b64, address), s, model.usage(s)) == legacy_base64(model, s) for s in subs)
+
+    # One config change invalidates every format of every subscription.
+    for name, renderer in renderers.RENDERERS.items(): cache.render(model, subs[0], renderer, address)
+    inbound = model.inbound_list()[0]
+    model.bind = db.get_bind()  # let the hooks apply to this database
+    crud.update_inbound(db, inbound.id, {"remark": inbound.remark + "-renamed"})
+    model.refresh_inbounds(db, [inbound.id])
+    hits = cache.hits
+    after = {name: per_request_us(lambda sub: cache.render(model, sub, renderer, address), subs[:1])
+             for name, renderer in renderers.RENDERERS.items()}
+    misses_only = cache.hits == hits
+    renamed = "-renamed" in cache.render(model, subs[0], renderers.RENDERERS["clash"], address).decode()
+    db.get_bind().dispose()
+    db.close()
+
+    return {
+        "subscriptions": args.subscriptions, "clients_per_subscription": args.clients, "formats": results,
+        "legacy_base64_us": legacy, "base64_matches_legacy": same,
+        "after_change": {"cold_us": after, "all_missed": misses_only, "renamed": renamed},
+        "ok": same and renamed and misses_only and all(r["valid"] is not False for r in results.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=6, help="clients per subscription")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        result = run(args, workdir)
+    json.dump({"benchmark": "render", "results": result}, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# benchmarks/bench_replica.py
+"""Replica mode: /sub latency and errors while snapshots are swapped in, and how stale it runs.
+
+    python -m benchmarks.bench_replica --subscriptions 20000 --swaps 5
+
+The panel database is seeded once. A child process runs main.py with
+VUI_REPLICA=1 and a database URL that doesn't exist. --pollers VPN apps poll
+/sub in that process while a thread plays the panel: every --ship-every seconds
+it changes inbound 1's port in the seeded database and ships a snapshot, as
+SnapshotShipper does. Reported: /sub p50/p99 before the first swap and while
+swapping, errors, the replica's load time per snapshot, and staleness (time
+from a snapshot being shipped to /sub serving the new port). The panel thread
+shares the replica's process here, so its snapshot work is in the "swapping"
+latencies too.
+"""
+import argparse, asyncio, base64, contextlib, importlib, json, os, random, re, sqlite3, statistics, subprocess, sys, tempfile, time
+
+VPN_UA = {"user-agent": "v2rayNG/1.8.5"}
+PORT = re.compile(rb"@[^:/]+:(\d+)\?")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else None
+
+
+async def load(app, subs, args, source, ship_dir):
+    from app import backup
+    from app.replica import SHIP_KEEP, replica
+    from benchmarks.asgi import ASGIDriver, lifespan
+
+    rng = random.Random(args.seed)
+    driver = ASGIDriver(app)
+    phase = {"name": "idle"}
+    latencies, errors = {"idle": [], "swapping": []}, {"idle": 0, "swapping": 0}
+    shipped, seen = {}, {}
+    stop = asyncio.Event()
+
+    def ship():
+        conn = sqlite3.connect(source)
+        for i in range(args.swaps):
+            time.sleep(args.ship_every)
+            port = 30000 + i
+            conn.execute("UPDATE inbounds SET port = ? WHERE id = 1", (port,))
+            conn.commit()
+            backup.create_snapshot(ship_dir, source_path=source)
+            backup.prune(ship_dir, SHIP_KEEP)
+            shipped[port] = time.time()
+            phase["name"] = "swapping"
+        conn.close()
+        time.sleep(args.ship_every)
+
+    async def poller():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            r = await driver.get(f"/sub/{rng.choice(subs)}", headers=VPN_UA)
+            name = phase["name"]
+            if r.status != 200:
+                errors[name] += 1
+            else:
+                latencies[name].append(time.perf_counter() - t0)
+                for port in PORT.findall(base64.b64decode(r.body)):
+                    if int(port) in shipped: seen.setdefault(int(port), time.time())
+            await asyncio.sleep(args.poll_interval)
+
+    async with lifespan(app):
+        model = replica.model
+        tasks = [asyncio.create_task(poller()) for _ in range(args.pollers)]
+        swaps = replica.swaps
+        await asyncio.to_thread(ship)
+        stop.set()
+        await asyncio.gather(*tasks)
+        info = replica.info()
+
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    stale = [seen[p] - shipped[p] for p in shipped if p in seen]
+    return {
+        "initial_subscriptions": len(model.subscriptions) if model else 0,
+        "sub": {name: {"requests": len(v), "errors": errors[name], "p50_ms": ms(percentile(v, 50)), "p99_ms": ms(percentile(v, 99))}
+                for name, v in latencies.items()},
+        "swaps": info["swaps"] - swaps, "last_load_ms": info["load_ms"],
+        "staleness_ms": {"served": len(stale), "shipped": len(shipped), "p50": ms(statistics.median(stale)) if stale else None,
+                         "max": ms(max(stale, default=None))},
+    }
+
+
+def child(args):
+    workdir = os.environ["BENCH_WORKDIR"]
+    subs = json.load(open(os.path.join(workdir, "subs.json")))
+    with contextlib.redirect_stdout(sys.stderr):
+        main = importlib.import_module("main")
+        result = asyncio.run(load(main.app, subs, args, os.path.join(workdir, "panel.db"), os.environ["VUI_REPLICA_DIR"]))
+    result["database_untouched"] = not os.path.exists(os.path.join(workdir, "absent.db"))
+    json.dump(result, sys.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=20000)
+    parser.add_argument("--pollers", type=int, default=20)
+    parser.add_argument("--poll-interval", type=float, default=0.01)
+    parser.add_argument("--swaps", type=int, default=5)
+    parser.add_argument("--ship-every", type=float, default=1.5, help="seconds between shipped snapshots (at least 1)")
+    parser.add_argument("--replica-poll", type=float, default=0.5, help="VUI_REPLICA_POLL_INTERVAL for the replica")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "panel.db")
+        from app import backup, models
+        from benchmarks.dataset import open_session, populate
+        with contextlib.redirect_stdout(sys.stderr):
+            db = open_session(db_path)
+            populate(db, 3, args.subscriptions, 2, args.seed)
+            # Subscriptions with a client on inbound 1, whose port the panel thread changes.
+            subs = sorted({r for (r,) in db.query(models.Subscription.remark).join(models.Client)
+                           .filter(models.Client.inbound_id == 1, models.Subscription.enabled == True)})
+            db.get_bind().dispose()
+        json.dump(subs, open(os.path.join(workdir, "subs.json"), "w"))
+        ship_dir = os.path.join(workdir, "replica")
+        snapshot = backup.create_snapshot(ship_dir, source_path=db_path)
+        env = dict(os.environ, BENCH_WORKDIR=workdir, VUI_REPLICA="1", VUI_REPLICA_DIR=ship_dir,
+                   VUI_REPLICA_POLL_INTERVAL=str(args.replica_poll), VUI_DATABASE_URL=f"sqlite:///{workdir}/absent.db",
+                   VUI_REPLICA_ADDRESS="replica.example.com")
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_replica", "--child"] + (argv or sys.argv[1:]),
+                             env=env, capture_output=True, text=True, timeout=args.swaps * args.ship_every + 300)
+        if out.returncode:
+            sys.stderr.write(out.stderr[-2000:])
+            return 1
+        result = json.loads(out.stdout)
+    swapping = result["sub"]["swapping"]
+    result.update(snapshot_mb=round(snapshot["bytes"] / 2 ** 20, 2), db_mb=round(snapshot["db_bytes"] / 2 ** 20, 1))
+    ok = (result["database_untouched"] and swapping["errors"] == 0 and result["swaps"] == args.swaps
+          and result["staleness_ms"]["served"] == args.swaps)
+    json.dump({"benchmark": "replica", "subscriptions": args.subscriptions, "results": result, "ok": ok}, sys.stdout, indent=2)
+    print()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# benchmarks/bench_search.py
+"""Subscription search at 100k subscriptions: FTS5/indexed filters vs LIKE scans.
+
+    python -m benchmarks.bench_search --subscriptions 100000
+
+"index_build_ms" backfills the FTS table and subscription_usage on an
+existing database. Each query is timed through search_subscriptions (first
+page of 50 plus the total count) and, for text queries, against the LIKE
+fallback; both must return the same ids. "sorted_walks" pages through a
+filter by remark, expiry and usage in both orders and must see every match
+exactly once. "download_all_ms" is the old way:
+every subscription encoded as JSON for the browser to filter. The trigger
+cost on the collector's write path is the same traffic update with and
+without the search triggers.
+"""
+import argparse, contextlib, json, os, random, statistics, sys, tempfile, time
+
+from sqlalchemy import text
+
+from app import crud, search
+from app.readmodel import read_model
+from benchmarks.dataset import GB, open_session, populate
+
+QUERIES = {
+    "exact remark": {"query": "sub4242"},
+    "substring": {"query": "b424"},
+    "client remark": {"query": "user77777"},
+    "no match": {"query": "zzzz"},
+    "enabled": {"enabled": True},
+    "expiring in 7 days": {"expiring_days": 7},
+    "over 75% usage": {"min_usage": 75},
+    "text + enabled + usage": {"query": "sub9", "enabled": True, "min_usage": 50},
+}
+
+
+def timed(fn, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000, result
+
+
+def run(args, workdir):
+    db = open_session(os.path.join(workdir, "panel.db"))
+    populate(db, inbounds=3, subscriptions=args.subscriptions, seed=args.seed)
+    t0 = time.perf_counter()
+    search.create_search_index(db.get_bind())
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    queries = {}
+    for name, filters in QUERIES.items():
+        ms, (rows, total) = timed(lambda: search.search_subscriptions(db, limit=50, **filters), args.repeat)
+        entry = {"ms": round(ms, 2), "total": total}
+        if "query" in filters:
+            search.fts_available = False
+            like_ms, (like_rows, like_total) = timed(lambda: search.search_subscriptions(db, limit=50, **filters), args.repeat)
+            search.fts_available = True
+            entry.update(like_ms=round(like_ms, 2), same_result=[r.id for r in rows] == [r.id for r in like_rows] and total == like_total)
+        queries[name] = entry
+
+    # Walk every enabled subscription in pages, as the UI would when scrolling.
+    t0 = time.perf_counter()
+    after, pages, seen = None, 0, 0
+    while True:
+        rows, _ = search.search_subscriptions(db, enabled=True, after=after, limit=500, count=after is None)
+        if not rows: break
+        pages, seen, after = pages + 1, seen + len(rows), (rows[-1].sort_key, rows[-1].id)
+    keyset_ms = (time.perf_counter() - t0) * 1000
+    sorted_walks = {f"{sort} {'desc' if descending else 'asc'}": walk_sorted(db, sort, descending)
+                    for sort in ("remark", "expiry", "usage") for descending in (False, True)}
+
+    # The full listing the search replaces: GET /api/v1/subscriptions, from the read model.
+    fields = ("id", "remark", "total_gb", "expiry_time", "sub_token", "enabled")
+    download_ms, _ = timed(lambda: json.dumps([{f: getattr(s, f) for f in fields} for s in read_model.ensure(db).subscription_list()]), 3)
+
+    # Trigger cost on the collector's write path.
+    rng = random.Random(args.seed)
+    users = lambda: {f"user{i}": {"up": 1, "down": rng.randint(1, GB)} for i in rng.sample(range(args.subscriptions), args.active)}
+    with_triggers, _ = timed(lambda: crud.update_clients_traffic(db, users()), 3)
+    problems = usage_mismatches(db)
+    db.execute(text("DROP TRIGGER search_usage_client_traffic"))
+    db.commit()
+    without_triggers, _ = timed(lambda: crud.update_clients_traffic(db, users()), 3)
+    db.get_bind().dispose()
+    db.close()
+
+    return {
+        "subscriptions": args.subscriptions, "index_build_ms": round(build_ms, 1), "queries": queries,
+        "keyset_walk": {"pages": pages, "rows": seen, "ms": round(keyset_ms, 1)},
+        "sorted_walks": sorted_walks,
+        "download_all_ms": round(download_ms, 1),
+        "traffic_update": {"clients": args.active, "with_triggers_ms": round(with_triggers, 1),
+                           "without_triggers_ms": round(without_triggers, 1)},
+        "usage_mismatches": problems,
+        "ok": problems == 0 and all(q.get("same_result", True) for q in queries.values())
+              and all(w["ok"] for w in sorted_walks.values()),
+    }
+
+
+def walk_sorted(db, sort, descending, page=997):
+    # Page through matches of a filter by a non-id sort (many ties on usage and expiry):
+    # every match exactly once, in the order of a single unpaginated query.
+    filters = {"query": "sub1"}
+    expected = [r.id for r in search.search_subscriptions(db, limit=10 ** 9, sort=sort, descending=descending, **filters)[0]]
+    ids, after = [], None
+    while True:
+        rows, _ = search.search_subscriptions(db, after=after, limit=page, count=False, sort=sort, descending=descending, **filters)
+        if not rows: break
+        ids += [r.id for r in rows]
+        after = (rows[-1].sort_key, rows[-1].id)
+    return {"rows": len(ids), "duplicates": len(ids) - len(set(ids)), "missing": len(set(expected) - set(ids)),
+            "ok": ids == expected}
+
+
+def usage_mismatches(db):
+    # subscription_usage against a fresh sum over clients.
+    return db.execute(text("""
+        SELECT count(*) FROM subscription_usage u JOIN (
+            SELECT subscription_id, sum(up_traffic + down_traffic) AS used FROM clients GROUP BY subscription_id
+        ) c ON c.subscription_id = u.subscription_id WHERE c.used != u.used""")).scalar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=100000)
+    parser.add_argument("--active", type=int, default=10000, help="clients per traffic update")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        result = run(args, workdir)
+    json.dump({"benchmark": "search", "results": result}, sys.stdout, indent=2)
+    print()
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
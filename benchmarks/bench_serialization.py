@@ -0,0 +1,97 @@
+# benchmarks/bench_serialization.py
+"""Encode time and bytes on the wire: FastAPI's default path vs FastJSONResponse.
+
+    python -m benchmarks.bench_serialization --rows 1000 10000
+
+"default" is what a route returning ORM objects costs (ORM load, jsonable_encoder,
+JSONResponse); "fast" is the read model (or Core rows) + explicit schema + FastJSONResponse.
+Wire sizes are reported uncompressed, gzip and brotli as sent by
+CompressionMiddleware.
+"""
+import argparse, json, os, statistics, sys, tempfile, time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import crud
+from app.readmodel import read_model
+from app.compression import _BrotliCompressor, _GzipCompressor, brotli
+from app.responses import FastJSONResponse, orjson
+from benchmarks.dataset import open_session, populate
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return result, round(statistics.median(samples) * 1000, 3)
+
+
+def wire_sizes(body):
+    sizes = {"identity": len(body), "gzip": len(_GzipCompressor(6).compress(body, final=True))}
+    if brotli is not None:
+        sizes["br"] = len(_BrotliCompressor(4).compress(body, final=True))
+    return sizes
+
+
+def client_stats_rows(db, inbound_id):
+    rows = crud.get_client_stats_rows(db, inbound_id)
+    return [{
+        "id": r.id, "remark": r.remark, "uuid": r.uuid, "enabled": r.enabled, "total_gb": r.total_gb,
+        "expiry_time": r.expiry_time, "sub_remark": r.sub_remark, "up_traffic": r.up_traffic,
+        "down_traffic": r.down_traffic, "used_traffic_bytes": r.used_traffic_bytes, "online": False,
+        "config_link_ip": f"vless://{r.uuid}@203.0.113.7:10000?type=tcp&security=none#in-0-{r.remark}",
+        "config_link_domain": f"vless://{r.uuid}@bench.example.com:10000?type=tcp&security=none#in-0-{r.remark}",
+    } for r in rows]
+
+
+def run(rows, repeat, workdir):
+    db = open_session(os.path.join(workdir, f"ser-{rows}.db"))
+    populate(db, inbounds=1, subscriptions=rows)
+    results = {"rows": rows}
+
+    def default_subscriptions():
+        db.expunge_all()
+        return JSONResponse(jsonable_encoder(crud.get_subscriptions(db))).body
+
+    fields = ("id", "remark", "total_gb", "expiry_time", "sub_token", "enabled")
+    read_model.ensure(db)
+
+    def fast_subscriptions():
+        # As GET /api/v1/subscriptions serves it.
+        return FastJSONResponse([{f: getattr(sub, f) for f in fields} for sub in read_model.subscription_list()]).body
+
+    stats = client_stats_rows(db, 1)
+    endpoints = {
+        "subscriptions": (default_subscriptions, fast_subscriptions),
+        "client_stats": (lambda: JSONResponse(jsonable_encoder(stats)).body, lambda: FastJSONResponse(stats).body),
+    }
+    for name, (default, fast) in endpoints.items():
+        default_body, default_ms = timed(default, repeat)
+        fast_body, fast_ms = timed(fast, repeat)
+        assert json.loads(default_body) == json.loads(fast_body), name
+        results[name] = {
+            "default_ms": default_ms, "fast_ms": fast_ms, "speedup": round(default_ms / fast_ms, 2),
+            "bytes": wire_sizes(fast_body),
+        }
+    db.get_bind().dispose()
+    db.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run(n, args.repeat, workdir) for n in args.rows]
+    report = {"benchmark": "serialization", "orjson": orjson is not None, "brotli": brotli is not None, "results": results}
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_startup.py
+"""Cold-start time of the panel server and the CLI, measured in fresh processes.
+
+    python -m benchmarks.bench_startup --runs 5
+
+server_first_sub_ms is the time from spawning `python main.py` until
+/sub/<remark> answers 200, i.e. what users see after `systemctl restart v-ui`.
+"""
+import argparse, http.client, json, os, socket, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_command(args, env, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(args, cwd=ROOT, env=env, check=True, capture_output=True)
+        samples.append(time.perf_counter() - t0)
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def time_server(env, runs, timeout=60):
+    samples = []
+    for _ in range(runs):
+        port = free_port()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=dict(env, VUI_PORT=str(port)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if time.perf_counter() - t0 > timeout:
+                    raise RuntimeError("server did not come up")
+                try:
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+                    conn.request("GET", "/sub/sub0", headers={"User-Agent": "v2rayNG/1.8.5"})
+                    if conn.getresponse().status == 200: break
+                except OSError:
+                    time.sleep(0.005)
+            samples.append(time.perf_counter() - t0)
+        finally:
+            proc.terminate()
+            proc.wait()
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--subscriptions", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "panel.db")
+        env = dict(os.environ, VUI_DATABASE_URL=f"sqlite:///{db_path}", VUI_XRAY_API="127.0.0.1:9")
+        subprocess.run([sys.executable, "-m", "benchmarks.dataset", "--db", db_path, "--subscriptions", str(args.subscriptions)],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+        results = {
+            "python_baseline_ms": time_command([sys.executable, "-c", "pass"], env, args.runs),
+            "import_main_ms": time_command([sys.executable, "-c", "import main"], env, args.runs),
+            "server_first_sub_ms": time_server(env, args.runs),
+            "cli_version_ms": time_command([sys.executable, "cli.py", "version"], env, args.runs),
+            "cli_help_ms": time_command([sys.executable, "cli.py", "--help"], env, args.runs),
+        }
+    json.dump({"benchmark": "startup", "runs": args.runs, "results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
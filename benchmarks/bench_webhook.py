@@ -0,0 +1,114 @@
+# benchmarks/bench_webhook.py
+"""External traffic webhook: enqueue cost, delivery throughput and loss-free retries.
+
+    python -m benchmarks.bench_webhook --users 50000 --ticks 30
+
+Each tick's random per-user deltas go through TrafficWebhook.record into the
+outbox, as the collector does. The receiver is down for the first
+--outage-s seconds and then rejects --failure-rate of requests. Delivery
+runs until the outbox is empty, and the receiver's totals must match the
+deltas exactly: nothing lost and nothing double-counted.
+"""
+import argparse, asyncio, contextlib, json, os, random, statistics, sys, tempfile, time
+
+# app.database binds its engine on import; run() sets VUI_DATABASE_URL first.
+
+
+async def deliver_all(webhook, receiver, outage_s):
+    started = time.perf_counter()
+    receiver.down = outage_s > 0
+    loop = asyncio.get_running_loop()
+    if outage_s: loop.call_later(outage_s, setattr, receiver, "down", False)
+    rounds = 0
+    while True:
+        delivered = await webhook.deliver_once()
+        rounds += 1
+        if not delivered:
+            if not await asyncio.to_thread(webhook_queued): break
+            await asyncio.sleep(0.05)
+    await webhook.client.aclose()
+    return time.perf_counter() - started, rounds
+
+
+def webhook_queued():
+    from app import crud
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try: return crud.count_traffic_outbox(db)
+    finally: db.close()
+
+
+def run(args, workdir):
+    os.environ["VUI_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'panel.db')}"
+    from app import crud
+    from app.database import SessionLocal, create_db_and_tables
+    from app.webhook import TrafficWebhook
+    from benchmarks.webhook_receiver import Receiver, serve
+
+    create_db_and_tables()
+    receiver = Receiver(failure_rate=args.failure_rate, latency_ms=args.latency_ms, seed=args.seed)
+    server, url = serve(receiver)
+    db = SessionLocal()
+    crud.get_settings(db)
+    crud.update_settings(db, {"external_traffic_enabled": True, "external_traffic_uri": url})
+
+    # Short backoff so the benchmark measures throughput rather than waiting out retries.
+    webhook = TrafficWebhook(concurrency=args.concurrency, backoff_base=0.05, backoff_max=0.5)
+    rng = random.Random(args.seed)
+    expected, record_times = {}, []
+    for tick in range(args.ticks):
+        users = {}
+        for i in rng.sample(range(args.users), int(args.users * args.active)):
+            up, down = rng.randrange(1, 10 ** 6), rng.randrange(1, 10 ** 7)
+            users[f"user{i}"] = {"up": up, "down": down}
+            total = expected.setdefault(f"user{i}", [0, 0])
+            total[0] += up
+            total[1] += down
+        t0 = time.perf_counter()
+        webhook.record(db, users)
+        record_times.append(time.perf_counter() - t0)
+    queued = crud.count_traffic_outbox(db)
+    db.close()
+
+    elapsed, rounds = asyncio.run(deliver_all(webhook, receiver, args.outage_s))
+    server.shutdown()
+    mismatched = sum(1 for email, total in expected.items() if receiver.totals.get(email) != total)
+    entries = args.ticks * int(args.users * args.active)
+    return {
+        "users": args.users, "ticks": args.ticks, "active_fraction": args.active,
+        "record_ms_p50": round(statistics.median(record_times) * 1000, 2),
+        "queued_batches": queued,
+        "delivery": {
+            "seconds": round(elapsed, 3), "rounds": rounds,
+            # Throughput once the receiver is back up.
+            "user_deltas_per_s": round(entries / max(elapsed - args.outage_s, 1e-3)),
+            "requests": receiver.requests, "rejected": receiver.rejected, "duplicates_ignored": receiver.duplicates,
+            "mb_sent": round(receiver.bytes / 2 ** 20, 2),
+            "bytes_per_user_delta": round(receiver.accepted_bytes / entries, 1),
+        },
+        "accounting": {"users": len(expected), "mismatched_users": mismatched,
+                       "ok": mismatched == 0 and len(receiver.totals) == len(expected)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--ticks", type=int, default=30)
+    parser.add_argument("--active", type=float, default=0.3, help="fraction of users with traffic per tick")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--outage-s", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        result = run(args, workdir)
+    json.dump({"benchmark": "webhook", "results": result}, sys.stdout, indent=2)
+    print()
+    return 0 if result["accounting"]["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# benchmarks/dataset.py
+"""Seeded dataset generator for the panel database.
+
+    python -m benchmarks.dataset --db ./panel.db --inbounds 5 --subscriptions 2000 --clients 2
+
+Rows go through app.models with bulk inserts, so a 100k-client database takes
+seconds. The same seed always produces the same rows (UUIDs and tokens
+included), which keeps benchmark runs comparable. Subscriptions are named
+sub{n} and clients user{n}, numbered from 0.
+"""
+import argparse, random, sys, time, uuid
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models, security
+from app.database import Base
+
+ADMIN_USERNAME = "bench"
+ADMIN_PASSWORD = "bench"
+GB = 1024 ** 3
+CHUNK = 20000
+
+
+def _chunks(rows, size=CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def populate(db: Session, inbounds=3, subscriptions=1000, clients_per_subscription=1, seed=1, now=None):
+    """Insert a synthetic dataset into an empty database and return row counts."""
+    rng = random.Random(seed)
+    now = int(now or time.time())
+
+    db.execute(insert(models.Inbound), [
+        {"id": i + 1, "remark": f"in-{i}", "enabled": True, "port": 10000 + i, "protocol": "vless", "settings": "{}",
+         "stream_settings": ('{"network": "ws", "security": "none", "wsSettings": {"path": "/ws"}}' if i % 2
+                             else '{"network": "tcp", "security": "none"}'),
+         "sniffing_settings": "{}"}
+        for i in range(inbounds)
+    ])
+
+    subs, clients = [], []
+    for n in range(subscriptions):
+        total_gb = rng.choice((0, 10, 50, 100))
+        expiry_time = rng.choice((0, now + rng.randint(1, 90) * 86400))
+        subs.append({"id": n + 1, "remark": f"sub{n}", "total_gb": total_gb, "expiry_time": expiry_time,
+                     "sub_token": "%032x" % rng.getrandbits(128), "enabled": rng.random() >= 0.1})
+        # Keep usage under the quota so benchmarks never trip the auto-disable path.
+        budget = int(total_gb * GB * 0.8) if total_gb else 5 * GB
+        for _ in range(clients_per_subscription):
+            c = len(clients)
+            down = rng.randint(0, budget // clients_per_subscription)
+            clients.append({"id": c + 1, "inbound_id": c % inbounds + 1, "subscription_id": n + 1,
+                            "uuid": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                            "remark": f"user{c}", "up_traffic": down // 8, "down_traffic": down - down // 8})
+
+    for chunk in _chunks(subs): db.execute(insert(models.Subscription), chunk)
+    for chunk in _chunks(clients): db.execute(insert(models.Client), chunk)
+    if not db.query(models.User).filter(models.User.username == ADMIN_USERNAME).first():
+        db.add(models.User(username=ADMIN_USERNAME, hashed_password=security.get_password_hash(ADMIN_PASSWORD)))
+    if not db.query(models.Settings).filter(models.Settings.id == 1).first():
+        db.add(models.Settings(id=1, domain_name="bench.example.com"))
+    db.commit()
+    return {"inbounds": inbounds, "subscriptions": len(subs), "clients": len(clients)}
+
+
+def open_session(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False)()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Populate a panel database with synthetic data")
+    parser.add_argument("--db", default="./panel.db")
+    parser.add_argument("--inbounds", type=int, default=3)
+    parser.add_argument("--subscriptions", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=1, help="clients per subscription")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db = open_session(args.db)
+    if db.query(models.Client).first():
+        sys.exit(f"{args.db} already has clients; use an empty database.")
+    t0 = time.perf_counter()
+    counts = populate(db, args.inbounds, args.subscriptions, args.clients, args.seed)
+    print(f"Inserted {counts} in {time.perf_counter() - t0:.2f}s (admin login: {ADMIN_USERNAME}/{ADMIN_PASSWORD})")
@@ -0,0 +1,232 @@
+# benchmarks/fake_xray.py
+"""In-process stand-in for the Xray API used by the benchmarks.
+
+It implements the StatsService from app/xray_api/stats.proto with Xray's
+counter semantics (substring pattern match, reset-on-read, NOT_FOUND for
+unknown counters) on top of a population of simulated users. Traffic only
+moves when advance() is called, so runs are reproducible for a given seed.
+
+Xray has no RPC for applying a whole config - the panel writes config.json
+and restarts the service - so load_config() behaves like a restart with the
+generated file. User-only changes go through the HandlerService, which is
+implemented for the AlterInbound add/remove user operations the panel sends:
+an added user starts at zero, a removed one takes its unread counters with it,
+and neither touches anyone else's.
+
+Standalone:  python -m benchmarks.fake_xray --users 10000 --port 62789
+"""
+import argparse, json, random, threading, time
+from concurrent import futures
+
+import grpc
+
+from app.xray_api import handler_pb2, handler_pb2_grpc, stats_pb2, stats_pb2_grpc
+
+PATTERNS = ("steady", "bursty", "idle")
+
+
+class SimulatedUser:
+    __slots__ = ("email", "inbound_tag", "pattern", "rate_up", "rate_down")
+
+    def __init__(self, email, inbound_tag, pattern, rate_up, rate_down):
+        self.email = email
+        self.inbound_tag = inbound_tag
+        self.pattern = pattern
+        self.rate_up = rate_up
+        self.rate_down = rate_down
+
+
+class FakeXray(stats_pb2_grpc.StatsServiceServicer, handler_pb2_grpc.HandlerServiceServicer):
+    def __init__(self, users=0, pattern="mixed", latency_ms=0.0, failure_rate=0.0, seed=1, inbound_tag="inbound-443"):
+        self.pattern = pattern
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.users = {}
+        self.inbounds = {inbound_tag}
+        self.counters = {}
+        self.totals = {}
+        self.calls = 0
+        self.failures = 0
+        self.restarts = 0
+        self.user_ops = 0
+        self.started_at = time.time()
+        self.set_users([f"user{i}" for i in range(users)], inbound_tag)
+
+    # --- Population ---
+    def _make_user(self, email, inbound_tag):
+        pattern = self.pattern
+        if pattern == "mixed":
+            pattern = self.rng.choices(PATTERNS, weights=(6, 3, 1))[0]
+        rate_down = self.rng.randint(1, 512) * 1024
+        return SimulatedUser(email, inbound_tag, pattern, rate_down // 8, rate_down)
+
+    def set_users(self, emails, inbound_tag="inbound-443"):
+        with self.lock:
+            self.users = {email: self._make_user(email, inbound_tag) for email in emails}
+            self.inbounds = {inbound_tag}
+            self._restart()
+
+    def load_config(self, config):
+        """Behave like `systemctl restart xray` with the given config (path or dict)."""
+        if isinstance(config, str):
+            with open(config) as f: config = json.load(f)
+        users, inbounds = {}, set()
+        for inbound in config.get("inbounds", []):
+            inbounds.add(inbound.get("tag"))
+            for client in inbound.get("settings", {}).get("clients", []):
+                email = client.get("email")
+                if email:
+                    user = self.users.get(email)
+                    if user is None: user = self._make_user(email, inbound["tag"])
+                    user.inbound_tag = inbound["tag"]
+                    users[email] = user
+        with self.lock:
+            self.users, self.inbounds = users, inbounds
+            self._restart()
+        return len(users)
+
+    def _restart(self):
+        # A restart drops every counter that has not been read yet, exactly like Xray.
+        self.counters = {}
+        for email, user in self.users.items(): self._add_counters(user)
+        self.counters["outbound>>>direct>>>traffic>>>uplink"] = 0
+        self.counters["outbound>>>direct>>>traffic>>>downlink"] = 0
+        self.started_at = time.time()
+        self.restarts += 1
+
+    def _add_counters(self, user):
+        self.counters[f"user>>>{user.email}>>>traffic>>>uplink"] = 0
+        self.counters[f"user>>>{user.email}>>>traffic>>>downlink"] = 0
+        self.counters.setdefault(f"inbound>>>{user.inbound_tag}>>>traffic>>>uplink", 0)
+        self.counters.setdefault(f"inbound>>>{user.inbound_tag}>>>traffic>>>downlink", 0)
+
+    # --- Traffic generation ---
+    def advance(self, ticks=1):
+        """Generate `ticks` intervals of traffic and return the bytes produced."""
+        produced = 0
+        rng = self.rng
+        with self.lock:
+            counters, totals = self.counters, self.totals
+            for _ in range(ticks):
+                for email, user in self.users.items():
+                    if user.pattern == "steady":
+                        up, down = user.rate_up, user.rate_down
+                    elif user.pattern == "bursty":
+                        if rng.random() >= 0.2: continue
+                        up, down = user.rate_up * 10, user.rate_down * 10
+                    else:
+                        if rng.random() >= 0.01: continue
+                        up, down = 1024, 4096
+                    counters[f"user>>>{email}>>>traffic>>>uplink"] += up
+                    counters[f"user>>>{email}>>>traffic>>>downlink"] += down
+                    counters[f"inbound>>>{user.inbound_tag}>>>traffic>>>uplink"] += up
+                    counters[f"inbound>>>{user.inbound_tag}>>>traffic>>>downlink"] += down
+                    counters["outbound>>>direct>>>traffic>>>uplink"] += up
+                    counters["outbound>>>direct>>>traffic>>>downlink"] += down
+                    total = totals.get(email)
+                    if total is None: total = totals[email] = [0, 0]
+                    total[0] += up
+                    total[1] += down
+                    produced += up + down
+        return produced
+
+    # --- StatsService ---
+    def _simulate_network(self, context):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms * self.rng.uniform(0.5, 1.5) / 1000)
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            self.failures += 1
+            context.abort(grpc.StatusCode.UNAVAILABLE, "injected failure")
+
+    def GetStats(self, request, context):
+        self._simulate_network(context)
+        with self.lock:
+            if request.name not in self.counters:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"{request.name} not found.")
+            value = self.counters[request.name]
+            if request.reset: self.counters[request.name] = 0
+        return stats_pb2.GetStatsResponse(stat=stats_pb2.Stat(name=request.name, value=value))
+
+    def QueryStats(self, request, context):
+        self._simulate_network(context)
+        pattern = request.pattern
+        with self.lock:
+            matched = [(name, value) for name, value in self.counters.items() if pattern in name]
+            if request.reset:
+                for name, _ in matched: self.counters[name] = 0
+        return stats_pb2.QueryStatsResponse(stat=[stats_pb2.Stat(name=n, value=v) for n, v in matched])
+
+    def GetSysStats(self, request, context):
+        self._simulate_network(context)
+        users = len(self.users)
+        alloc = 8 * 1024 * 1024 + users * 2048
+        return stats_pb2.SysStatsResponse(
+            NumGoroutine=20 + users // 10, NumGC=self.calls, Alloc=alloc, TotalAlloc=alloc * (1 + self.calls),
+            Sys=alloc * 2, Mallocs=users * 10, Frees=users * 9, LiveObjects=users,
+            PausedTotalNs=self.calls * 50_000, Uptime=int(time.time() - self.started_at),
+        )
+
+
+    # --- HandlerService ---
+    def AlterInbound(self, request, context):
+        self._simulate_network(context)
+        operation = request.operation
+        with self.lock:
+            if request.tag not in self.inbounds:
+                context.abort(grpc.StatusCode.UNKNOWN, f"handler not found: {request.tag}")
+            if operation.type.endswith(".AddUserOperation"):
+                user = handler_pb2.AddUserOperation.FromString(operation.value).user
+                if user.email in self.users:
+                    context.abort(grpc.StatusCode.UNKNOWN, f"User {user.email} already exists.")
+                self.users[user.email] = added = self._make_user(user.email, request.tag)
+                self._add_counters(added)
+            elif operation.type.endswith(".RemoveUserOperation"):
+                email = handler_pb2.RemoveUserOperation.FromString(operation.value).email
+                if self.users.get(email) is None or self.users[email].inbound_tag != request.tag:
+                    context.abort(grpc.StatusCode.UNKNOWN, f"User {email} not found.")
+                del self.users[email]
+                # Xray unregisters the user's counters; whatever was not read is lost.
+                self.counters.pop(f"user>>>{email}>>>traffic>>>uplink", None)
+                self.counters.pop(f"user>>>{email}>>>traffic>>>downlink", None)
+            else:
+                context.abort(grpc.StatusCode.UNIMPLEMENTED, f"unsupported operation: {operation.type}")
+            self.user_ops += 1
+        return handler_pb2.AlterInboundResponse()
+
+
+def serve(fake: FakeXray, address="127.0.0.1:0", workers=8):
+    """Start a gRPC server for `fake`; returns (server, "host:port")."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers),
+                         options=[("grpc.max_send_message_length", 256 * 1024 * 1024)])
+    stats_pb2_grpc.add_StatsServiceServicer_to_server(fake, server)
+    handler_pb2_grpc.add_HandlerServiceServicer_to_server(fake, server)
+    port = server.add_insecure_port(address)
+    server.start()
+    return server, f"{address.rsplit(':', 1)[0]}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--config", help="Xray config.json to take users from instead of --users")
+    parser.add_argument("--pattern", default="mixed", choices=("mixed",) + PATTERNS)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--tick", type=float, default=1.0, help="seconds between traffic ticks")
+    parser.add_argument("--port", type=int, default=62789)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    fake = FakeXray(args.users, args.pattern, args.latency_ms, args.failure_rate, args.seed)
+    if args.config: fake.load_config(args.config)
+    server, address = serve(fake, f"127.0.0.1:{args.port}")
+    print(f"Fake Xray API listening on {address} with {len(fake.users)} users")
+    try:
+        while True:
+            time.sleep(args.tick)
+            fake.advance()
+    except KeyboardInterrupt:
+        server.stop(0)
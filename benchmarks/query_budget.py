@@ -0,0 +1,115 @@
+# benchmarks/query_budget.py
+"""Per-route SQL query budgets against a seeded dataset.
+
+    python -m benchmarks.query_budget --sizes 200 2000
+
+Each size runs in its own process (the panel binds its database at import):
+the dataset is seeded, every route in ROUTES is called once to warm up and
+once under querytrack.track(), and the statement counts are compared. A route
+fails when it runs more statements than its budget, when its count grows with
+the dataset (a query per row), or when one statement shape repeats
+REPEAT_THRESHOLD times. Exit status 1 on any failure, so it can gate CI.
+"""
+import argparse, asyncio, contextlib, json, os, subprocess, sys, tempfile
+
+# name -> (method, path, body, budget). Budgets are today's counts; lower them as routes improve.
+ROUTES = {
+    "sub (app)": ("GET", "/sub/sub1", None, 0),
+    "sub (browser)": ("GET", "/sub/sub1", None, 0),
+    "list subscriptions": ("GET", "/api/v1/subscriptions", None, 1),
+    "search subscriptions": ("GET", "/api/v1/subscriptions/search?q=sub1&limit=50", None, 3),
+    "list inbounds": ("GET", "/api/v1/inbounds", None, 2),
+    "client stats": ("GET", "/api/v1/inbounds/1/stats", None, 3),
+    "client stats page": ("GET", "/api/v1/inbounds/1/stats?limit=100&fields=compact", None, 4),
+    "client links": ("GET", "/api/v1/clients/1/links", None, 1),
+    "traffic history": ("GET", "/api/v1/traffic/history", None, 2),
+    "panel settings": ("GET", "/api/v1/panel/settings", None, 2),
+    "notifications": ("GET", "/api/v1/notifications", None, 1),
+    "export clients": ("GET", "/api/v1/export/clients", None, 12),
+    "create subscription": ("POST", "/api/v1/subscriptions", {"remark": "budget-{n}", "total_mb": 1024, "expiry_days": 30}, 4),
+    # 4 of these are generate_config's read model staleness check (3 fingerprints and the settings row).
+    "add client": ("POST", "/api/v1/inbounds/1/clients", {"remark": "budget-client-{n}", "subscription_remark": "sub2"}, 9),
+}
+# Routes that read in fixed-size pages (export.PAGE_ROWS rows per statement): their count grows with the data by design.
+PAGED = {"export clients"}
+UA = {"sub (app)": "v2rayNG/1.8.5", "sub (browser)": "Mozilla/5.0"}
+
+
+async def measure(size, seed):
+    from benchmarks.asgi import ASGIDriver, lifespan
+    from benchmarks.dataset import ADMIN_PASSWORD, ADMIN_USERNAME, open_session, populate
+    db = open_session(os.environ["VUI_DATABASE_URL"][len("sqlite:///"):])
+    populate(db, inbounds=3, subscriptions=size, clients_per_subscription=2, seed=seed)
+    db.get_bind().dispose()
+
+    import main
+    from app import querytrack
+    from app.database import SessionLocal
+    querytrack.install(main.engine)
+    driver = ASGIDriver(main.app)
+    results = {}
+    async with lifespan(main.app):
+        session = SessionLocal()
+        main.read_model.ensure(session)  # don't count the model's first load against a route
+        session.close()
+        await driver.post("/login", form={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+        for run in ("warmup", "measured"):
+            for name, (method, path, body, _) in ROUTES.items():
+                headers = {"user-agent": UA.get(name, "query-budget")}
+                payload = b""
+                if body is not None:
+                    headers["content-type"] = "application/json"
+                    payload = json.dumps({k: v.format(n=run) if isinstance(v, str) else v for k, v in body.items()}).encode()
+                with querytrack.track(name) as stats:
+                    response = await driver.request(method, path, headers=headers, body=payload)
+                if run == "measured":
+                    results[name] = dict(stats.summary(threshold=1), status=response.status)
+    return results
+
+
+def child(args):
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(measure(args.child, args.seed))
+    json.dump(results, sys.stdout)
+
+
+def run_size(size, seed, workdir):
+    env = dict(os.environ, VUI_DATABASE_URL=f"sqlite:///{workdir}/budget-{size}.db", VUI_COLLECT_INTERVAL="0",
+               VUI_SYSSTATS_INTERVAL="0", VUI_ACCESS_LOG_INTERVAL="0", VUI_BACKUP_INTERVAL="0",
+               VUI_READMODEL_CHECK_INTERVAL="0", VUI_NOTIFY_FILE=os.devnull)
+    out = subprocess.run([sys.executable, "-m", "benchmarks.query_budget", "--child", str(size), "--seed", str(seed)],
+                         env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 2000], help="subscriptions per run (2 clients each)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    from app.querytrack import REPEAT_THRESHOLD
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = {size: run_size(size, args.seed, workdir) for size in args.sizes}
+    small, large = runs[min(args.sizes)], runs[max(args.sizes)]
+    report, failures = {}, []
+    for name, (_, _, _, budget) in ROUTES.items():
+        counts = {size: runs[size][name]["queries"] for size in args.sizes}
+        repeated = [r for r in large[name]["repeated"] if r["count"] >= REPEAT_THRESHOLD]
+        problems = []
+        if max(counts.values()) > budget: problems.append(f"{max(counts.values())} queries > budget {budget}")
+        if name not in PAGED and large[name]["queries"] > small[name]["queries"]: problems.append("query count grows with the dataset")
+        if repeated: problems.append(f"{repeated[0]['count']}x {repeated[0]['statement'][:80]}")
+        if large[name]["status"] >= 400: problems.append(f"HTTP {large[name]['status']}")
+        report[name] = {"budget": budget, "queries": counts, "ms": large[name]["ms"], "problems": problems}
+        failures.extend(f"{name}: {p}" for p in problems)
+    json.dump({"benchmark": "query_budget", "sizes": args.sizes, "routes": report, "failures": failures}, sys.stdout, indent=2)
+    print()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# benchmarks/webhook_receiver.py
+"""Stand-in for the billing system that receives the external traffic webhook.
+
+    python -m benchmarks.webhook_receiver --port 8088 --failure-rate 0.1
+
+It applies each batch id once (retries of an already-applied batch are counted
+as duplicates and ignored), keeps per-user totals for reconciliation, and can
+inject failures, latency or a full outage.
+"""
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Receiver:
+    def __init__(self, failure_rate=0.0, latency_ms=0.0, seed=1):
+        self.failure_rate = failure_rate
+        self.latency_ms = latency_ms
+        self.down = False
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.totals = {}  # email -> [up, down]
+        self.requests = self.rejected = self.duplicates = self.bytes = self.accepted_bytes = 0
+
+    def handle(self, body: bytes):
+        """Returns the HTTP status to answer with."""
+        if self.latency_ms: time.sleep(self.latency_ms / 1000)
+        with self.lock:
+            self.requests += 1
+            self.bytes += len(body)
+            if self.down or (self.failure_rate and self.rng.random() < self.failure_rate):
+                self.rejected += 1
+                return 503
+            self.accepted_bytes += len(body)
+            payload = json.loads(body)
+            for batch in payload["batches"]:
+                if batch["id"] in self.seen:
+                    self.duplicates += 1
+                    continue
+                self.seen.add(batch["id"])
+                for email, (up, down) in batch["users"].items():
+                    total = self.totals.get(email)
+                    if total is None: total = self.totals[email] = [0, 0]
+                    total[0] += up
+                    total[1] += down
+        return 200
+
+
+def serve(receiver: Receiver, host="127.0.0.1", port=0):
+    """Start the receiver in a background thread; returns (server, url)."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like a real receiver behind a proxy
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            status = receiver.handle(body)
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/traffic"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    receiver = Receiver(args.failure_rate, args.latency_ms)
+    server, url = serve(receiver, port=args.port)
+    print(f"Traffic webhook receiver listening on {url}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"requests={receiver.requests} rejected={receiver.rejected} duplicates={receiver.duplicates} users={len(receiver.totals)}")
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,12 +1,10 @@
 # cli.py
 import typer
-from sqlalchemy.orm import Session
-import os
-from app.database import SessionLocal, create_db_and_tables
-from app import crud, models
+import os, sys, csv, json
+from pathlib import Path
 
-# Ensure tables are created before running any command
-create_db_and_tables()
+# SQLAlchemy and the app modules are imported inside the commands that need
+# them, so quick commands like `version` do not pay for loading them.
 
 app = typer.Typer(
     help="ابزار مدیریت پنل V-UI",
@@ -14,6 +12,16 @@ app = typer.Typer(
     no_args_is_help=True
 )
 
+NO_DB_COMMANDS = {"version", "change-port", "restore"}
+
+@app.callback()
+def main(ctx: typer.Context):
+    # Ensure tables are created before running any command that touches the database
+    if ctx.invoked_subcommand not in NO_DB_COMMANDS:
+        from app import models
+        from app.database import create_db_and_tables
+        create_db_and_tables()
+
 @app.command()
 def version():
     """نمایش نسخه پنل مدیریتی."""
@@ -25,7 +33,9 @@ def set_admin(
     password: str = typer.Argument(..., help="رمز عبور جدید برای ادمین")
 ):
     """ایجاد یا به‌روزرسانی کاربر ادمین."""
-    db: Session = SessionLocal()
+    from app import crud
+    from app.database import SessionLocal
+    db = SessionLocal()
     user = crud.get_user_by_username(db, username)
     if user:
         crud.update_user_password(db, username, password)
@@ -56,5 +66,239 @@ def change_port(
         print("❌ فایل سرویس پنل یافت نشد. آیا پنل به درستی نصب شده است؟")
         raise typer.Exit(code=1)
 
+@app.command()
+def bulk_create(
+    file: Path = typer.Argument(..., exists=True, dir_okay=False, help="فایل CSV یا JSON کلاینت‌ها"),
+    inbound_id: int = typer.Option(None, help="اینباند پیش‌فرض برای ردیف‌هایی که inbound_id ندارند"),
+    apply: bool = typer.Option(True, help="اعمال تنظیمات Xray پس از ساخت کلاینت‌ها")
+):
+    """ساخت گروهی کلاینت‌ها و اشتراک‌ها در یک تراکنش."""
+    from app import bulk, crud
+    from app.database import SessionLocal
+    from app.links import get_server_public_ip
+    from app.xray import xray_manager
+
+    text = file.read_text(encoding="utf-8-sig")
+    try:
+        if file.suffix.lower() == ".json":
+            rows = json.loads(text)
+            if isinstance(rows, dict): rows = rows.get("clients", [])
+        else:
+            rows = bulk.parse_csv(text, default_inbound_id=inbound_id)
+        entries = bulk.validate_entries(rows, default_inbound_id=inbound_id)
+    except ValueError as e:
+        print(f"❌ خطا در خواندن فایل: {e}", file=sys.stderr)
+        raise typer.Exit(code=1)
+
+    db = SessionLocal()
+    try:
+        created = crud.bulk_create_clients(db, entries)
+    except crud.BulkCreateError as e:
+        for error in e.args[0]: print(f"❌ {error}", file=sys.stderr)
+        db.close()
+        raise typer.Exit(code=1)
+
+    if apply and xray_manager.generate_config(db):
+        xray_manager.apply_config()
+
+    writer = csv.DictWriter(sys.stdout, fieldnames=bulk.OUTPUT_FIELDS)
+    writer.writeheader()
+    writer.writerows(bulk.iter_records(db, created, crud.get_settings(db), get_server_public_ip()))
+    db.close()
+    print(f"✅ {len(created)} کلاینت با موفقیت ساخته شد.", file=sys.stderr)
+
+@app.command()
+def export(
+    scope: str = typer.Argument("subscriptions", help="subscriptions (یک ردیف برای هر اشتراک) یا clients"),
+    output: Path = typer.Option(None, "--output", "-o", dir_okay=False, help="فایل خروجی؛ بدون آن در stdout نوشته می‌شود"),
+    format: str = typer.Option(None, "--format", help="csv یا jsonl؛ پیش‌فرض از پسوند فایل خروجی"),
+    gzip: bool = typer.Option(None, "--gzip/--no-gzip", help="فشرده‌سازی gzip؛ پیش‌فرض برای فایل‌های .gz"),
+):
+    """خروجی مصرف اشتراک‌ها یا کلاینت‌ها به صورت CSV یا JSONL."""
+    from app import export as usage_export
+    from app.database import SessionLocal
+
+    suffixes = [s.lower() for s in output.suffixes] if output else []
+    if gzip is None: gzip = ".gz" in suffixes
+    if format is None: format = "jsonl" if ".jsonl" in suffixes else "csv"
+    db = SessionLocal()
+    try:
+        usage = usage_export.UsageExport(db, scope, format, compress=gzip)
+    except ValueError as e:
+        db.close()
+        print(f"❌ {e}", file=sys.stderr)
+        raise typer.Exit(code=1)
+    out = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        for chunk in usage: out.write(chunk)
+    finally:
+        if output: out.close()
+        db.close()
+    print(f"✅ {usage.rows} ردیف خروجی گرفته شد.", file=sys.stderr)
+
+@app.command("import")
+def import_users(
+    source: Path = typer.Argument(..., exists=True, dir_okay=False, help="دیتابیس SQLite یا خروجی JSON پنل 3x-ui یا Marzban"),
+    inbound_id: int = typer.Option(None, help="همه کلاینت‌ها به این اینباند اضافه شوند (برای Marzban الزامی است)"),
+    chunk: int = typer.Option(5000, min=1, help="تعداد کلاینت در هر تراکنش"),
+    apply: bool = typer.Option(True, help="اعمال تنظیمات Xray پس از پایان انتقال"),
+):
+    """انتقال کاربران از پنل 3x-ui یا Marzban با حفظ UUID و ترافیک مصرفی."""
+    from app import crud, importer
+    from app.database import SessionLocal
+    from app.xray import xray_manager
+
+    try:
+        kind, events = importer.open_source(str(source))
+    except (ValueError, OSError) as e:
+        print(f"❌ خطا در خواندن منبع: {e}", file=sys.stderr)
+        raise typer.Exit(code=1)
+    db = SessionLocal()
+    if inbound_id is not None and not crud.get_inbound_by_id(db, inbound_id):
+        print(f"❌ اینباند {inbound_id} یافت نشد.", file=sys.stderr)
+        db.close()
+        raise typer.Exit(code=1)
+    if kind == "marzban" and inbound_id is None:
+        print("❌ اینباندهای Marzban در دیتابیس آن نیستند؛ اینباند مقصد را با --inbound-id مشخص کنید.", file=sys.stderr)
+        db.close()
+        raise typer.Exit(code=1)
+
+    print(f"⏳ انتقال از {kind}...", file=sys.stderr)
+    progress = lambda stats: print(f"   {stats['clients_created']} کلاینت ساخته شد ({stats['read']} خوانده شده)", file=sys.stderr)
+    job = importer.Importer(db, inbound_id=inbound_id, chunk=chunk, progress=progress)
+    stats = job.run(events)
+
+    # One Xray reconfiguration for the whole import.
+    if apply and stats["clients_created"] and xray_manager.generate_config(db):
+        xray_manager.apply_config()
+    db.close()
+
+    for remark, reason in job.skipped[:20]: print(f"⚠️ {remark}: {reason}", file=sys.stderr)
+    if len(job.skipped) > 20: print(f"⚠️ ... و {len(job.skipped) - 20} مورد دیگر", file=sys.stderr)
+    rate = stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"✅ {stats['clients_created']} کلاینت و {stats['subscriptions_created']} اشتراک ساخته شد؛ "
+          f"{stats['clients_skipped']} کلاینت رد شد، {stats['inbounds_created']} اینباند جدید. "
+          f"({stats['seconds']} ثانیه، {rate:.0f} کاربر در ثانیه)", file=sys.stderr)
+
+@app.command()
+def backup(
+    directory: Path = typer.Option(None, "--dir", file_okay=False, help="پوشه نسخه‌های پشتیبان (پیش‌فرض VUI_BACKUP_DIR)"),
+    keep: int = typer.Option(None, min=1, help="تعداد نسخه‌هایی که نگه داشته می‌شوند (پیش‌فرض VUI_BACKUP_KEEP)"),
+):
+    """گرفتن نسخه پشتیبان فشرده از دیتابیس بدون توقف پنل."""
+    from app import backup as backups
+
+    directory = str(directory) if directory else backups.BACKUP_DIR
+    try:
+        info = backups.create_snapshot(directory)
+    except (backups.BackupError, OSError) as e:
+        print(f"❌ پشتیبان‌گیری ناموفق بود: {e}", file=sys.stderr)
+        raise typer.Exit(code=1)
+    removed = backups.prune(directory, keep or backups.BACKUP_KEEP)
+    print(f"✅ {info['path']} ({info['bytes'] / 2**20:.1f} MB، {info['seconds']} ثانیه)")
+    print(f"   sha256: {info['sha256']}")
+    if removed: print(f"🗑️ {len(removed)} نسخه قدیمی حذف شد.")
+
+@app.command()
+def restore(
+    snapshot: Path = typer.Argument(None, dir_okay=False, help="فایل نسخه پشتیبان؛ بدون آن جدیدترین نسخه"),
+    directory: Path = typer.Option(None, "--dir", file_okay=False, help="پوشه نسخه‌های پشتیبان (پیش‌فرض VUI_BACKUP_DIR)"),
+    yes: bool = typer.Option(False, "--yes", "-y", help="بدون پرسش تأیید"),
+):
+    """بازگردانی دیتابیس از نسخه پشتیبان (پنل باید متوقف باشد)."""
+    from app import backup as backups
+
+    if snapshot is None:
+        snapshots = backups.list_snapshots(str(directory) if directory else None)
+        if not snapshots:
+            print("❌ هیچ نسخه پشتیبانی یافت نشد.", file=sys.stderr)
+            raise typer.Exit(code=1)
+        snapshot = Path(snapshots[0])
+    if not snapshot.exists():
+        print(f"❌ فایل {snapshot} یافت نشد.", file=sys.stderr)
+        raise typer.Exit(code=1)
+    if not yes and not typer.confirm(f"دیتابیس فعلی با {snapshot.name} جایگزین شود؟"):
+        raise typer.Exit(code=1)
+    try:
+        previous = backups.restore_snapshot(str(snapshot))
+    except (backups.BackupError, OSError) as e:
+        print(f"❌ بازگردانی انجام نشد: {e}", file=sys.stderr)
+        raise typer.Exit(code=1)
+    print(f"✅ دیتابیس از {snapshot.name} بازگردانی شد.")
+    if previous: print(f"   دیتابیس قبلی: {previous}")
+
+@app.command()
+def maintenance(
+    convert: bool = typer.Option(False, "--convert", help="فعال‌سازی auto_vacuum تدریجی با VACUUM کامل (پنل باید متوقف باشد)"),
+):
+    """اجرای نگهداری دیتابیس (ANALYZE، vacuum تدریجی، checkpoint) و نمایش وضعیت فایل."""
+    import sqlite3
+    from app import maintenance as upkeep
+
+    try:
+        if convert:
+            if upkeep.convert(): print("✅ دیتابیس به auto_vacuum=INCREMENTAL تبدیل شد.")
+            else: print("ℹ️ auto_vacuum از قبل INCREMENTAL است.")
+        report = upkeep.run_pass(fragmentation=True)
+    except (upkeep.MaintenanceError, OSError, sqlite3.Error) as e:
+        print(f"❌ نگهداری دیتابیس ناموفق بود: {e}", file=sys.stderr)
+        raise typer.Exit(code=1)
+    before, after = report["before"], report["after"]
+    print(f"✅ انجام شد ({report['seconds']} ثانیه، ANALYZE: {report['analyze_seconds']} ثانیه)")
+    print(f"   حجم فایل: {before['file_bytes'] / 2**20:.1f} MB → {after['file_bytes'] / 2**20:.1f} MB")
+    print(f"   صفحات آزاد: {before['freelist_pages']} → {after['freelist_pages']} ({after['free_percent']}%)")
+    if after["unused_percent"] is not None: print(f"   فضای خالی درون صفحات: {before['unused_percent']}% → {after['unused_percent']}%")
+    print(f"   auto_vacuum: {after['auto_vacuum']}، journal_mode: {after['journal_mode']}")
+    if report["checkpoint"]: print(f"   checkpoint: {report['checkpoint']['mode']}، {report['checkpoint']['checkpointed']} صفحه")
+    if after["auto_vacuum"] != "incremental" and after["freelist_pages"]:
+        print("ℹ️ برای آزادسازی صفحات خالی، پنل را متوقف و دستور را با --convert اجرا کنید.")
+
+@app.command()
+def archive(
+    days: float = typer.Option(None, min=0, help="روزهای غیرفعال یا منقضی بودن پیش از بایگانی (پیش‌فرض VUI_ARCHIVE_AFTER_DAYS)"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="فقط شمارش اشتراک‌هایی که بایگانی می‌شوند"),
+):
+    """انتقال اشتراک‌های قدیمی غیرفعال یا منقضی و کلاینت‌هایشان به بایگانی."""
+    from app.archive import archiver
+
+    try:
+        report = archiver.archive(days, dry_run)
+    except Exception as e:
+        print(f"❌ بایگانی ناموفق بود: {e}", file=sys.stderr)
+        raise typer.Exit(code=1)
+    if dry_run:
+        print(f"ℹ️ {report['subscriptions']} اشتراک بایگانی خواهد شد.")
+    else:
+        print(f"✅ {report['subscriptions']} اشتراک و {report['clients']} کلاینت بایگانی شد "
+              f"({report['batches']} دسته، {report['seconds']} ثانیه).")
+
+@app.command()
+def unarchive(
+    remark: str = typer.Argument(..., help="نام اشتراک بایگانی‌شده"),
+    apply: bool = typer.Option(True, help="اعمال تنظیمات Xray پس از بازگردانی"),
+):
+    """بازگردانی یک اشتراک بایگانی‌شده و کلاینت‌هایش."""
+    from app import archive as archives
+    from app.database import SessionLocal
+    from app.xray import xray_manager
+
+    db = SessionLocal()
+    archived = archives.find_archived(db, remark=remark)
+    if not archived:
+        print(f"❌ اشتراک بایگانی‌شده «{remark}» یافت نشد.", file=sys.stderr)
+        db.close()
+        raise typer.Exit(code=1)
+    try:
+        restored = archives.restore_archived(db, archived)
+    except archives.ArchiveError as e:
+        for error in e.args[0]: print(f"❌ {error}", file=sys.stderr)
+        db.close()
+        raise typer.Exit(code=1)
+    clients = len(restored.clients)
+    if apply and xray_manager.generate_config(db):
+        xray_manager.apply_config()
+    db.close()
+    print(f"✅ اشتراک «{remark}» با {clients} کلاینت بازگردانی شد.")
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
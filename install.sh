@@ -20,7 +20,7 @@ print_info() { echo -e "${BLUE}$1${NC}"; }
 install_dependencies() {
     print_info "Updating system and installing dependencies..."
     apt-get update
-    apt-get install -y python3 python3-pip python3-venv git curl socat
+    apt-get install -y python3 python3-pip python3-venv git curl socat logrotate cron
     print_success "Dependencies installed."
 }
 
@@ -113,6 +113,34 @@ EOF
     print_success "Service file created."
 }
 
+create_logrotate() {
+    print_info "Creating logrotate rule for the Xray access log..."
+
+    # Xray keeps its log file open and can't be told to reopen it, so truncate in
+    # place; the panel's log tailer notices the truncation and starts over.
+    cat > /etc/logrotate.d/${SERVICE_NAME}-xray <<EOF
+/var/log/xray/access.log {
+    daily
+    maxsize 100M
+    rotate 3
+    compress
+    delaycompress
+    missingok
+    notifempty
+    copytruncate
+}
+EOF
+
+    # logrotate itself runs daily; check hourly so maxsize bounds the file on busy nodes.
+    cat > /etc/cron.hourly/${SERVICE_NAME}-logrotate <<EOF
+#!/bin/sh
+/usr/sbin/logrotate /etc/logrotate.d/${SERVICE_NAME}-xray
+EOF
+    chmod +x /etc/cron.hourly/${SERVICE_NAME}-logrotate
+
+    print_success "Logrotate rule created."
+}
+
 create_management_script() {
     print_info "Creating management script 'v-ui'..."
     
@@ -207,6 +235,7 @@ uninstall_panel() {
         systemctl daemon-reload
         rm -rf /root/v-ui
         rm /usr/local/bin/v-ui
+        rm -f /etc/logrotate.d/v-ui-xray /etc/cron.hourly/v-ui-logrotate
         echo "Panel uninstalled."
     fi
      read -p "Press [Enter] to exit..."
@@ -285,6 +314,7 @@ main() {
     setup_python_env
     get_user_config
     create_service
+    create_logrotate
     create_management_script
     start_services
     display_final_info
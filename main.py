@@ -1,9 +1,9 @@
 # main.py
-import uvicorn, psutil, datetime, time, subprocess, socket, os, sys, threading, json, uuid, grpc, secrets, base64
-from fastapi import FastAPI, Request, Depends, Form, HTTPException, Body, Response, status, Header
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+import asyncio, datetime, time, subprocess, socket, os, sys, threading, json, uuid, secrets, base64
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from fastapi import FastAPI, Request, Depends, Form, HTTPException, Body, Response, status, Header, Query
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.orm import Session
 from pathlib import Path
@@ -11,16 +11,75 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 from urllib.parse import quote # THIS IS THE FIX
 
-from app import crud, models, security
-from app.database import SessionLocal, create_db_and_tables
-from app.xray_api import stats_pb2, stats_pb2_grpc
+from app import archive, bulk, crud, export, models, querytrack, renderers, search, security
+from app.accesslog import access_monitor
+from app.admission import ADMISSION_ENABLED, AdmissionMiddleware, admission
+from app.archive import archiver
+from app.backup import backups
+from app.maintenance import maintenance
+from app.database import SessionLocal, create_db_and_tables, engine, hold_panel_lock
+from app.assets import AssetPipeline
+from app.collector import collector
+from app.compression import CompressionMiddleware
+from app.health import sampler
+from app.jobs import runner, JobError, JobConflict, JobQueueFull
+from app.webhook import traffic_webhook
+from app.notifications import notifier
+from app.readmodel import read_model
+from app.renderers import subscription_cache
+from app.replica import REPLICA_ADDRESS, REPLICA_MODE, ReplicaOnlyMiddleware, replica, shipper
+from app.links import build_share_link, get_server_public_ip
+from app.responses import FastJSONResponse
+from app.xray import xray_manager, inbound_tag, get_xray_status, get_xray_version
 
-create_db_and_tables()
-app = FastAPI()
 BASE_DIR = Path(__file__).resolve().parent
-app.mount("/static", StaticFiles(directory=str(Path(BASE_DIR, 'static'))), name="static")
-
-templates = Jinja2Templates(directory=str(Path(BASE_DIR, "templates")))
+assets = AssetPipeline(Path(BASE_DIR, 'static'), Path(BASE_DIR, 'templates'))
+
+# Heavy subsystems (grpc, psutil, jinja2, asset compression) load on first use
+# so a restarted panel starts answering /sub as early as possible.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if REPLICA_MODE:
+        # No database of its own: only /sub, from the newest shipped snapshot.
+        threading.Thread(target=assets.ensure_built, daemon=True).start()
+        await asyncio.to_thread(replica.refresh)
+        task = asyncio.create_task(replica.run())
+        yield
+        task.cancel()
+        return
+    hold_panel_lock()
+    create_db_and_tables()
+    runner.recover()
+    threading.Thread(target=assets.ensure_built, daemon=True).start()
+    threading.Thread(target=read_model.preload, daemon=True).start()
+    tasks = [asyncio.create_task(job.run())
+             for job in (collector, sampler, access_monitor, traffic_webhook, notifier, read_model, backups, maintenance,
+                         shipper, archiver)
+             if job.interval > 0]
+    yield
+    for task in tasks: task.cancel()
+    runner.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+if querytrack.TRACKING:
+    querytrack.install(engine)
+    app.add_middleware(querytrack.QueryTrackingMiddleware)
+if REPLICA_MODE:
+    app.add_middleware(ReplicaOnlyMiddleware)
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)  # outermost: shed requests cost nothing downstream
+
+@lru_cache(maxsize=None)
+def get_templates():
+    from fastapi.templating import Jinja2Templates
+    templates = Jinja2Templates(directory=str(Path(BASE_DIR, "templates")))
+    templates.env.globals["static_url"] = assets.url
+    return templates
+
+@app.get("/static/{name:path}", include_in_schema=False)
+async def static_file(request: Request, name: str):
+    return assets.static_response(request, name)
 
 # --- Error Logging ---
 @app.exception_handler(RequestValidationError)
@@ -47,67 +106,12 @@ async def require_auth(user: models.User = Depends(get_current_user)):
     
 
 # --- Global variables for network speed calculation ---
-last_net_io = psutil.net_io_counters()
+last_net_io = None  # set on the first /api/v1/system/stats call
 last_time = time.time()
 # ----------------------------------------------------
 
 
 
-# --- Xray API Client ---
-# --- Other Helper Functions ---
-def get_xray_stats(emails: List[str]):
-    try:
-        channel = grpc.insecure_channel('127.0.0.1:62789')
-        stub = stats_pb2_grpc.StatsServiceStub(channel)
-        traffic_data = {}
-        req = stats_pb2.QueryStatsRequest(pattern="user>>>", reset=True)
-        res = stub.QueryStats(req)
-        for stat in res.stat:
-            parts = stat.name.split('>>>')
-            if len(parts) == 4 and parts[0] == 'user':
-                email, direction = parts[1], parts[3]
-                if email not in traffic_data:
-                    traffic_data[email] = {'up': 0, 'down': 0}
-                if direction == 'uplink':
-                    traffic_data[email]['up'] += stat.value
-                elif direction == 'downlink':
-                    traffic_data[email]['down'] += stat.value
-        return traffic_data
-    except Exception as e:
-        print(f"Could not connect to Xray API: {e}")
-        return {}
-
-def get_server_public_ip():
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception as e:
-        print(f"Could not determine server IP: {e}")
-    return "127.0.0.1"
-
-# --- Helper functions for system interaction ---
-def run_shell_command(command):
-    try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {e.stderr.strip()}")
-        return None
-
-def get_xray_status():
-    status = run_shell_command("systemctl is-active xray.service")
-    return status if status else "unknown"
-
-def get_xray_version():
-    output = run_shell_command("/usr/local/bin/xray --version")
-    if output:
-        return output.splitlines()[0]
-    return "Not Found"
-
-
 class CreateSubscription(BaseModel):
     remark: str
     total_mb: int = Field(0, ge=0)
@@ -128,64 +132,29 @@ async def handle_subscription_request(
     request: Request, 
     remark: str, 
     db: Session = Depends(get_db), 
-    user_agent: Optional[str] = Header(None)
+    user_agent: Optional[str] = Header(None),
+    format: Optional[str] = None
 ):
-    sub = crud.get_subscription_by_remark(db, remark)
+    # The output format follows the app's User-Agent; ?format=base64|clash|sing-box overrides it.
+    model = replica.model if REPLICA_MODE else read_model.ensure(db)
+    if model is None:
+        raise HTTPException(status_code=503, detail="No subscription snapshot loaded yet.", headers={"Retry-After": "5"})
+    sub = model.subscriptions_by_remark.get(remark)
     if not sub or not sub.enabled:
         raise HTTPException(status_code=404, detail="Subscription not found or has been disabled.")
 
-    vpn_clients_ua = ["v2rayng", "nekoray", "shadowrocket", "clash", "hiddify", "sing-box", "v2box"]
-    is_vpn_client = any(keyword in user_agent.lower() for keyword in vpn_clients_ua) if user_agent else False
+    try:
+        renderer = renderers.pick(user_agent, format)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown format; expected one of: {', '.join(renderers.RENDERERS)}")
 
-    total_usage_bytes = crud.get_total_usage_for_subscription(db, sub.id)
+    total_usage_bytes = model.usage(sub)
 
-    if is_vpn_client:
-        settings = crud.get_settings(db)
-        address = settings.domain_name or get_server_public_ip()
-        
-        # --- Create the Fake Info Config ---
-        gb_total = sub.total_gb
-        gb_used = total_usage_bytes / (1024**3)
-        gb_left = gb_total - gb_used
-        
-        days_left_str = "∞"
-        if sub.expiry_time > 0:
-            days_left = (sub.expiry_time - time.time()) / (24 * 60 * 60)
-            if days_left > 0:
-                days_left_str = f"{int(days_left)} روز"
-            else:
-                days_left_str = "0 روز"
-
-        total_str = f"{gb_total:.2f}GB" if gb_total > 0 else "∞"
-        left_str = f"{gb_left:.2f}GB" if gb_total > 0 else "∞"
-        
-        fake_config_remark = f" ⏳ {days_left_str} | 🔋 {left_str} "
-        fake_config = f"vless://00000000-0000-0000-0000-000000000000@127.0.0.1:1080?type=tcp#{quote(fake_config_remark)}"
-        
-        all_configs = [fake_config]
-        # ---------------------------------
-
-        for client in sub.clients:
-            inbound = client.inbound
-            stream_settings = json.loads(inbound.stream_settings)
-            network = stream_settings.get("network", "tcp")
-            config_name = f"{inbound.remark}-{client.remark}"
-            link = f"{inbound.protocol}://{client.uuid}@{address}:{inbound.port}"
-            params = {"type": network, "security": stream_settings.get("security", "none")}
-            if network == "ws":
-                ws_opts = stream_settings.get("wsSettings", {})
-                params["path"] = ws_opts.get("path", "/")
-                params["host"] = ws_opts.get("headers", {}).get("Host", address)
-            elif network == "grpc":
-                grpc_opts = stream_settings.get("grpcSettings", {})
-                params["serviceName"] = grpc_opts.get("serviceName", "")
-            query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-            full_link = f"{link}?{query_string}#{quote(config_name)}"
-            all_configs.append(full_link)
-        
-        encoded_configs = base64.b64encode("\n".join(all_configs).encode("utf-8")).decode("utf-8")
-        
-        response = Response(content=encoded_configs, media_type="text/plain")
+    if renderer:
+        settings = model.settings
+        address = lambda: (settings and settings.domain_name) or REPLICA_ADDRESS or get_server_public_ip()
+        body = subscription_cache.render(model, sub, renderer, address)
+        response = Response(content=renderer.finish(body, sub, total_usage_bytes), media_type=renderer.media_type)
         response.headers["Profile-Title"] = sub.remark
         user_info = (
             f"upload={total_usage_bytes}; "
@@ -210,13 +179,46 @@ async def handle_subscription_request(
             "expiry_text": datetime.datetime.fromtimestamp(sub.expiry_time).strftime('%Y-%m-%d') if sub.expiry_time > 0 else "Never",
             "sub_link": str(request.url)
         }
-        return templates.TemplateResponse("subscription.html", context)
+        return get_templates().TemplateResponse(request, "subscription.html", context)
+
+@app.get("/replica/status")
+async def replica_status():
+    # Health check for load balancers in front of replicas: 503 until a snapshot is loaded.
+    if not REPLICA_MODE: raise HTTPException(status_code=404, detail="Not a replica.")
+    info = replica.info()
+    return JSONResponse(info, status_code=200 if info["loaded"] else 503)
 
 
 # --- NEW: Subscription API Endpoints ---
 @app.get("/api/v1/subscriptions", dependencies=[Depends(require_auth)])
 async def read_subscriptions(db: Session = Depends(get_db)):
-    return crud.get_subscriptions(db)
+    fields = ("id", "remark", "total_gb", "expiry_time", "sub_token", "enabled")
+    return FastJSONResponse([{f: getattr(sub, f) for f in fields} for sub in read_model.ensure(db).subscription_list()])
+
+@app.get("/api/v1/subscriptions/search", dependencies=[Depends(require_auth)])
+async def search_subscriptions(
+    db: Session = Depends(get_db),
+    q: Optional[str] = None,
+    enabled: Optional[bool] = None,
+    expiring_days: Optional[int] = Query(None, ge=0, le=3650),
+    min_usage: Optional[float] = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: str = Query("id", pattern="^(id|remark|expiry|usage)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+):
+    # `q` matches subscription and client remarks; min_usage is a percent of the quota.
+    # The next page is requested by passing back the X-Next-Cursor header as `cursor`
+    # with the same filters and sort.
+    after = decode_cursor(cursor) if cursor else None
+    # Counting every match costs as much as the page itself, so only the first page does it.
+    rows, total = search.search_subscriptions(db, q, enabled, expiring_days, min_usage, after, limit + 1,
+                                              count=cursor is None, sort=sort, descending=(order == "desc"))
+    headers = {"X-Total-Count": str(total)} if total is not None else {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].sort_key, rows[-1].id)
+    return FastJSONResponse([{k: v for k, v in row._mapping.items() if k != "sort_key"} for row in rows], headers=headers)
 
 @app.post("/api/v1/subscriptions", dependencies=[Depends(require_auth)])
 async def create_subscription_endpoint(sub_data: CreateSubscription, db: Session = Depends(get_db)):
@@ -258,13 +260,39 @@ async def add_client_to_subscription_endpoint(sub_id: int, client_data: AddClien
         xray_manager.apply_config()
         
     return new_client
+
+# --- Archive ---
+@app.get("/api/v1/archive", dependencies=[Depends(require_auth)])
+async def read_archive(db: Session = Depends(get_db), q: Optional[str] = None,
+                       after: Optional[int] = None, limit: int = Query(50, ge=1, le=1000)):
+    # Newest first; the next page is requested with after=<last id>.
+    return FastJSONResponse([dict(row._mapping) for row in archive.list_archived(db, q, after, limit)])
+
+@app.post("/api/v1/archive/run", dependencies=[Depends(require_auth)])
+async def run_archive(days: Optional[float] = Query(None, ge=0), dry_run: bool = False):
+    # Batches commit one at a time on the archiver's own session, off the event loop.
+    return await asyncio.to_thread(archiver.archive, days, dry_run)
+
+@app.post("/api/v1/archive/{archive_id}/restore", dependencies=[Depends(require_auth)])
+async def restore_archive(archive_id: int, db: Session = Depends(get_db)):
+    archived = archive.find_archived(db, archive_id)
+    if not archived:
+        raise HTTPException(status_code=404, detail="Archived subscription not found.")
+    try:
+        restored = archive.restore_archived(db, archived)
+    except archive.ArchiveError as e:
+        raise HTTPException(status_code=409, detail=e.args[0])
+
+    if xray_manager.generate_config(db):
+        xray_manager.apply_config()
+    return restored
    
 # --- Page and Auth Routes ---
 @app.get("/", response_class=HTMLResponse)
-async def read_root(user: models.User = Depends(get_current_user)):
+async def read_root(request: Request, user: models.User = Depends(get_current_user)):
     if user:
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-    return FileResponse(str(Path(BASE_DIR, 'templates', 'login.html')))
+    return assets.shell_response(request, 'login.html')
 
 @app.post("/login")
 async def login(response: Response, db: Session = Depends(get_db), username: str = Form(...), password: str = Form(...)):
@@ -297,71 +325,24 @@ async def logout(response: Response, db: Session = Depends(get_db), user: models
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
 @app.get("/dashboard", response_class=HTMLResponse)
-async def get_dashboard(user: models.User = Depends(require_auth)):
-    return FileResponse(str(Path(BASE_DIR, 'templates', 'dashboard.html')))
+async def get_dashboard(request: Request, user: models.User = Depends(require_auth)):
+    return assets.shell_response(request, 'dashboard.html')
 
 @app.get("/panel-settings", response_class=HTMLResponse)
-async def get_panel_settings_page(user: models.User = Depends(require_auth)):
-    return FileResponse(str(Path(BASE_DIR, 'templates', 'panel_settings.html')))
+async def get_panel_settings_page(request: Request, user: models.User = Depends(require_auth)):
+    return assets.shell_response(request, 'panel_settings.html')
 
 @app.get("/inbounds", response_class=HTMLResponse)
-async def get_inbounds_page(user: models.User = Depends(require_auth)):
-    return FileResponse(str(Path(BASE_DIR, 'templates', 'inbounds.html')))
+async def get_inbounds_page(request: Request, user: models.User = Depends(require_auth)):
+    return assets.shell_response(request, 'inbounds.html')
 
 @app.get("/inbounds/{inbound_id}", response_class=HTMLResponse)
-async def get_clients_page(inbound_id: int):
-    return FileResponse(str(Path(BASE_DIR, 'templates', 'clients.html')))
+async def get_clients_page(request: Request, inbound_id: int):
+    return assets.shell_response(request, 'clients.html')
 
 class DomainInfo(BaseModel):
     domain_name: str
         
-# --- XRAY CONFIG MANAGER ---   
-class XrayManager:
-    def __init__(self, config_path="/usr/local/etc/xray/config.json"):
-        self.config_path = config_path
-
-    def generate_config(self, db: Session):
-        config = { "log": { "loglevel": "warning" } }
-        config.update({
-            "api": { "tag": "api", "services": ["StatsService"] },
-            "stats": {},
-            "policy": {
-                "levels": { "0": { "statsUserUplink": True, "statsUserDownlink": True } },
-                "system": { "statsInboundUplink": True, "statsInboundDownlink": True }
-            },
-            "inbounds": [{ "tag": "api", "listen": "127.0.0.1", "port": 62789, "protocol": "dokodemo-door", "settings": { "address": "127.0.0.1" } }],
-            "outbounds": [{ "protocol": "freedom", "tag": "direct" }, { "protocol": "blackhole", "tag": "api" }],
-            "routing": { "domainStrategy": "AsIs", "rules": [ { "type": "field", "inboundTag": ["api"], "outboundTag": "api" } ] }
-        })
-
-        all_inbounds = crud.get_inbounds(db)
-        for inbound in all_inbounds:
-            if not inbound.enabled: continue
-            clients_for_this_inbound = crud.get_clients_for_inbound(db, inbound.id)
-            
-            xray_clients = [{"id": c.uuid, "email": c.remark, "level": 0} for c in clients_for_this_inbound if c.subscription.enabled]
-            
-            if not xray_clients: continue
-            stream_settings = json.loads(inbound.stream_settings)
-            xray_inbound = {
-                "port": inbound.port, "listen": "0.0.0.0", "protocol": inbound.protocol,
-                "settings": { "clients": xray_clients, "decryption": "none" },
-                "streamSettings": stream_settings, "tag": f"inbound-{inbound.port}"
-            }
-            config["inbounds"].append(xray_inbound)
-        
-        try:
-            with open(self.config_path, 'w') as f: json.dump(config, f, indent=4)
-            return True
-        except Exception as e:
-            print(f"FATAL: Error writing Xray config: {e}")
-            return False
-
-    def apply_config(self):
-        return run_shell_command("sudo systemctl restart xray.service")
-xray_manager = XrayManager()
-
-
 # --- Pydantic Models for API Validation ---
 class StreamSettings(BaseModel):
     network: str = "tcp"
@@ -394,10 +375,19 @@ class UpdateClient(BaseModel):
 # --- INBOUND APIs (FIXED) ---
 @app.get("/api/v1/inbounds", dependencies=[Depends(require_auth)])
 async def read_inbounds(db: Session = Depends(get_db)):
-    inbounds = crud.get_inbounds(db)
-    for ib in inbounds:
-        ib.client_count = len(ib.clients)
-    return inbounds
+    rates = collector.rates["inbound"]
+    counters = {row.tag: row for row in crud.get_traffic_counters(db, "inbound")}
+    response_data = []
+    for ib in read_model.ensure(db).inbound_list():
+        tag = inbound_tag(ib.port)
+        counter, rate = counters.get(tag), rates.get(tag)
+        item = {"id": ib.id, "remark": ib.remark, "enabled": ib.enabled, "port": ib.port, "protocol": ib.protocol,
+                "settings": ib.settings, "stream_settings": ib.stream_settings, "sniffing_settings": ib.sniffing_settings,
+                "client_count": len(ib.client_ids),
+                "up_traffic": counter.up if counter else 0, "down_traffic": counter.down if counter else 0}
+        item["up_speed"], item["down_speed"] = (rate['up'], rate['down']) if rate else (0, 0)
+        response_data.append(item)
+    return FastJSONResponse(response_data)
 
 @app.post("/api/v1/inbounds", dependencies=[Depends(require_auth)])
 async def add_inbound(inbound_data: CreateInbound, db: Session = Depends(get_db)):
@@ -430,91 +420,134 @@ async def remove_inbound(inbound_id: int, db: Session = Depends(get_db)):
     raise HTTPException(status_code=404, detail="Inbound not found.")
 
 # --- CLIENT APIs ---
-@app.get("/api/v1/inbounds/{inbound_id}/stats", dependencies=[Depends(require_auth)])
-async def update_and_get_stats(inbound_id: int, db: Session = Depends(get_db)):
-    clients = crud.get_clients_for_inbound(db, inbound_id)
-    if not clients: return []
+CLIENT_STATS_FIELDS = ("id", "remark", "uuid", "enabled", "total_gb", "expiry_time", "sub_remark", "up_traffic", "down_traffic",
+                       "used_traffic_bytes", "online", "last_seen", "ip_count", "config_link_ip", "config_link_domain")
+# Enough to draw a table row; links are left out because they are the bulk of each row.
+COMPACT_CLIENT_STATS_FIELDS = ("id", "remark", "enabled", "total_gb", "expiry_time", "sub_remark", "used_traffic_bytes", "online", "ip_count")
 
-    client_remarks = [c.remark for c in clients]
-    live_stats = get_xray_stats(client_remarks)
-    
-    if live_stats:
-        crud.update_clients_traffic(db, live_stats)
-
-    needs_reload = False
-    now = int(time.time())
-
-    for client in clients:
-        if client.subscription.enabled:
-            total_usage_bytes = crud.get_total_usage_for_subscription(db, client.subscription_id)
-            limit_bytes = client.subscription.total_gb * 1024 * 1024 * 1024
-            if (limit_bytes > 0 and total_usage_bytes >= limit_bytes) or \
-               (client.subscription.expiry_time > 0 and now >= client.subscription.expiry_time):
-                crud.update_subscription(db, client.subscription_id, {"enabled": False})
-                needs_reload = True
-    
-    if needs_reload:
-        db.commit() # Commit the session to reflect disabled status before generating config
+# Online clients as of the latest first-page request (see update_and_get_stats):
+# seen in Xray's access log recently, or moved traffic in a recent poll.
+online_remarks = set()
+
+def encode_cursor(sort_key, row_id):
+    return base64.urlsafe_b64encode(json.dumps([sort_key, row_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return sort_key, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def refresh_inbound_stats(db: Session, inbound_id: int):
+    # With the background collector running its counters are at most one interval
+    # old; polling here as well would only wait on its lock.
+    if collector.interval <= 0: collector.collect(db)
+    to_disable = crud.get_subscriptions_to_disable(db, inbound_id, int(time.time()))
+    if to_disable:
+        crud.disable_subscriptions(db, to_disable)
         if xray_manager.generate_config(db):
             xray_manager.apply_config()
-    
-    updated_clients = crud.get_clients_for_inbound(db, inbound_id)
-    inbound = crud.get_inbound_by_id(db, inbound_id)
+
+@app.get("/api/v1/inbounds/{inbound_id}/stats", dependencies=[Depends(require_auth)])
+async def update_and_get_stats(
+    inbound_id: int,
+    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    sort: str = Query("id", pattern="^(id|usage|expiry|online)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fields: Optional[str] = None,
+):
+    # Without `limit` every client is returned, as before. With it, the next page is
+    # requested by passing back the X-Next-Cursor header as `cursor`. `fields` is a
+    # comma-separated subset of CLIENT_STATS_FIELDS, or "compact".
+    model = read_model.ensure(db)
+    inbound = model.inbounds.get(inbound_id)
     if not inbound: return []
 
-    settings = crud.get_settings(db)
-    domain_address = settings.domain_name if settings.domain_name else None
-    ip_address = get_server_public_ip()
-
-    # Pre-calculate total usage for each subscription to avoid repeated DB calls
-    subscription_usages = {}
-    for client in updated_clients:
-        if client.subscription_id not in subscription_usages:
-            total_usage = crud.get_total_usage_for_subscription(db, client.subscription_id)
-            subscription_usages[client.subscription_id] = total_usage
-
-    def generate_link(address, client_uuid, client_remark, inbound_remark):
-        if not address: return ""
-        stream_settings = json.loads(inbound.stream_settings)
-        network = stream_settings.get("network", "tcp")
-        config_name = f"{inbound_remark}-{client_remark}"
-        link = f"{inbound.protocol}://{client_uuid}@{address}:{inbound.port}"
-        params = {"type": network, "security": stream_settings.get("security", "none")}
-        if network == "ws":
-            ws_opts = stream_settings.get("wsSettings", {})
-            params["path"] = ws_opts.get("path", "/")
-            params["host"] = ws_opts.get("headers", {}).get("Host", address)
-        elif network == "grpc":
-            grpc_opts = stream_settings.get("grpcSettings", {})
-            params["serviceName"] = grpc_opts.get("serviceName", "")
-        query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-        return f"{link}?{query_string}#{quote(config_name)}"
+    if fields == "compact":
+        selected = COMPACT_CLIENT_STATS_FIELDS
+    elif fields:
+        selected = tuple(f for f in fields.split(",") if f in CLIENT_STATS_FIELDS)
+    else:
+        selected = CLIENT_STATS_FIELDS
+
+    global online_remarks
+    # Only the first page refreshes; later pages reuse its online snapshot so the
+    # keyset order stays stable while the client walks the pages.
+    if cursor is None:
+        # The Xray poll and apply block for up to their gRPC timeouts: off the event loop.
+        await asyncio.to_thread(refresh_inbound_stats, db, inbound_id)
+        online_remarks = access_monitor.online() | collector.online()
+
+    rows = crud.get_client_stats_rows(
+        db, inbound_id, search=search, sort=sort, descending=(order == "desc"),
+        after=decode_cursor(cursor) if cursor else None,
+        limit=limit + 1 if limit else None,
+        online_remarks=online_remarks if sort == "online" else (),
+    )
+    headers = {}
+    if limit:
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].sort_key, rows[-1].id)
+        headers["X-Total-Count"] = str(crud.count_client_stats_rows(db, inbound_id, search))
+
+    ip_counts = access_monitor.ip_counts() if "ip_count" in selected else {}
+    want_links = "config_link_ip" in selected or "config_link_domain" in selected
+    if want_links:
+        settings = model.settings
+        domain_address = settings.domain_name if settings and settings.domain_name else None
+        ip_address = get_server_public_ip()
+        stream_settings = inbound.stream
 
     response_data = []
-    for client in updated_clients:
-        client_stats = live_stats.get(client.remark, {'up': 0, 'down': 0})
-        
-        # *** THIS IS THE MAIN CHANGE ***
-        # Use the pre-calculated total subscription usage for the progress bar
-        total_subscription_usage = subscription_usages.get(client.subscription_id, 0)
-        
-        response_data.append({
-            "id": client.id,
-            "remark": client.remark,
-            "uuid": client.uuid,
-            "enabled": client.subscription.enabled,
-            "total_gb": client.subscription.total_gb,
-            "expiry_time": client.subscription.expiry_time,
-            "sub_remark": client.subscription.remark,
-            "up_traffic": client.up_traffic,
-            "down_traffic": client.down_traffic,
-            "used_traffic_bytes": total_subscription_usage, # Use total usage here
-            "online": (client_stats['up'] > 0 or client_stats['down'] > 0),
-            "config_link_ip": generate_link(ip_address, client.uuid, client.remark, inbound.remark),
-            "config_link_domain": generate_link(domain_address, client.uuid, client.remark, inbound.remark)
-        })
-        
-    return response_data
+    for row in rows:
+        item = {
+            "id": row.id,
+            "remark": row.remark,
+            "uuid": row.uuid,
+            "enabled": row.enabled,
+            "total_gb": row.total_gb,
+            "expiry_time": row.expiry_time,
+            "sub_remark": row.sub_remark,
+            "up_traffic": row.up_traffic,
+            "down_traffic": row.down_traffic,
+            "used_traffic_bytes": row.used_traffic_bytes, # Total usage of the whole subscription
+            "online": row.remark in online_remarks,
+            "last_seen": access_monitor.last_seen.get(row.remark),
+            "ip_count": ip_counts.get(row.remark, 0),
+        }
+        if want_links:
+            item["config_link_ip"] = build_share_link(inbound, row.uuid, row.remark, ip_address, stream_settings)
+            item["config_link_domain"] = build_share_link(inbound, row.uuid, row.remark, domain_address, stream_settings)
+        response_data.append({k: item[k] for k in selected})
+
+    return FastJSONResponse(response_data, headers=headers)
+
+@app.get("/api/v1/clients/{client_id}/links", dependencies=[Depends(require_auth)])
+async def get_client_links(client_id: int, db: Session = Depends(get_db)):
+    # Share links for one client, fetched when the admin opens its QR code or copies
+    # its link, so the stats poll can leave them out (fields=compact).
+    model = read_model.ensure(db)
+    client = model.clients.get(client_id)
+    inbound = model.inbounds.get(client.inbound_id) if client else None
+    if not inbound: raise HTTPException(status_code=404, detail="Client not found.")
+    settings = model.settings
+    domain_address = settings.domain_name if settings and settings.domain_name else None
+    return {
+        "config_link_ip": build_share_link(inbound, client.uuid, client.remark, get_server_public_ip(), inbound.stream),
+        "config_link_domain": build_share_link(inbound, client.uuid, client.remark, domain_address, inbound.stream),
+    }
+
+@app.get("/api/v1/clients/ips", dependencies=[Depends(require_auth)])
+async def read_client_ips(limit: int = Query(1, ge=0)):
+    # Clients connecting from more than `limit` distinct addresses within the access-log window.
+    over = access_monitor.over_limit(limit)
+    return FastJSONResponse(sorted(({"remark": email, "ip_count": len(ips), "ips": ips} for email, ips in over.items()),
+                                   key=lambda item: -item["ip_count"]))
 
 @app.post("/api/v1/inbounds/{inbound_id}/clients", dependencies=[Depends(require_auth)])
 async def add_client_to_inbound(inbound_id: int, client_data: CreateClient, db: Session = Depends(get_db)):
@@ -532,15 +565,55 @@ async def add_client_to_inbound(inbound_id: int, client_data: CreateClient, db:
         xray_manager.apply_config()
     return new_client
 
+@app.post("/api/v1/clients/bulk", dependencies=[Depends(require_auth)])
+async def bulk_create_clients(request: Request, db: Session = Depends(get_db)):
+    # Accepts a JSON list (or {"clients": [...]}) of bulk.BulkClient, or a text/csv body.
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            rows = bulk.parse_csv(body.decode("utf-8-sig"))
+        else:
+            rows = json.loads(body)
+            if isinstance(rows, dict): rows = rows.get("clients", [])
+        entries = bulk.validate_entries(rows)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not entries:
+        raise HTTPException(status_code=400, detail="No clients given.")
+
+    try:
+        created = crud.bulk_create_clients(db, entries)
+    except crud.BulkCreateError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+
+    if xray_manager.generate_config(db):
+        xray_manager.apply_config()
+
+    records = bulk.iter_records(db, created, read_model.ensure(db).settings, get_server_public_ip())
+    return StreamingResponse((json.dumps(r, ensure_ascii=False) + "\n" for r in records), media_type="application/x-ndjson")
+
+@app.get("/api/v1/export/{scope}", dependencies=[Depends(require_auth)])
+async def export_usage(scope: str, format: str = Query("csv", pattern="^(csv|jsonl)$"), gzip: bool = False):
+    # Streams one row per subscription or client; the export opens its own session
+    # because the body is produced after this handler (and its dependencies) return.
+    if scope not in export.SCOPES:
+        raise HTTPException(status_code=404, detail="Unknown export.")
+    db = SessionLocal()
+    usage = export.UsageExport(db, scope, format, compress=gzip)
+
+    def chunks():
+        try: yield from usage
+        finally: db.close()
+
+    filename = usage.filename(datetime.datetime.now().strftime("%Y%m%d-%H%M"))
+    return StreamingResponse(chunks(), media_type=usage.media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 @app.delete("/api/v1/clients/{client_id}", dependencies=[Depends(require_auth)])
 async def remove_client(client_id: int, db: Session = Depends(get_db)):
-    db_client = crud.get_client_by_id(db, client_id)
-    if not db_client:
+    if not crud.delete_client(db, client_id):
         raise HTTPException(status_code=404, detail="Client not found.")
     
-    db.delete(db_client)
-    db.commit()
-    
     if xray_manager.generate_config(db):
         xray_manager.apply_config()
         
@@ -577,8 +650,11 @@ async def update_client_data(client_id: int, client_data: UpdateClient, db: Sess
 
 # --- System & Panel API Routes (Unchanged) ---
 @app.get("/api/v1/system/stats", dependencies=[Depends(require_auth)])
-async def get_system_stats():
+async def get_system_stats(db: Session = Depends(get_db)):
     global last_net_io, last_time
+    import psutil
+    if last_net_io is None:
+        last_net_io = psutil.net_io_counters()
     cpu_percent = psutil.cpu_percent(interval=0.1)
     cpu_count = psutil.cpu_count(logical=True)
     mem = psutil.virtual_memory()
@@ -619,6 +695,12 @@ async def get_system_stats():
             elif snicaddr.family == socket.AF_INET6 and not snicaddr.address.startswith("::1") and not snicaddr.address.startswith("fe80"):
                 ipv6_addrs.append(snicaddr.address)
 
+    # Per-inbound/outbound totals from the collector's counters, with its latest rates.
+    traffic = {"inbound": {}, "outbound": {}}
+    for row in crud.get_traffic_counters(db):
+        rate = collector.rates.get(row.kind, {}).get(row.tag, {'up': 0, 'down': 0})
+        traffic.setdefault(row.kind, {})[row.tag] = {"up": row.up, "down": row.down, "up_speed": rate['up'], "down_speed": rate['down']}
+
     return {
         "cpu": {"percent": cpu_percent, "count": cpu_count},
         "ram": {"percent": mem_percent, "used": mem_used_gb, "total": mem_total_gb},
@@ -629,14 +711,44 @@ async def get_system_stats():
         "speed": {"upload": upload_speed, "download": download_speed},
         "connections": {"tcp": tcp_count, "udp": udp_count},
         "xray": {"status": xray_status, "version": xray_version},
-        "ip_addresses": {"ipv4": sorted(list(set(ipv4_addrs))), "ipv6": sorted(list(set(ipv6_addrs)))}
+        "ip_addresses": {"ipv4": sorted(list(set(ipv4_addrs))), "ipv6": sorted(list(set(ipv6_addrs)))},
+        "traffic": traffic,
+        "xray_runtime": sampler.summary(),
+        "read_model": read_model.info(),
+        "backup": backups.info(),
+        "maintenance": maintenance.info(),
+        "archive": archiver.info(),
+        "replica_shipping": shipper.info() if shipper.interval > 0 else None,
+        "subscription_cache": subscription_cache.info(),
+        "admission": admission.info(),
+        "queries": querytrack.route_totals.summary() if querytrack.TRACKING else None,
     }
 
+@app.get("/api/v1/traffic/history", dependencies=[Depends(require_auth)])
+async def read_traffic_history(
+    db: Session = Depends(get_db),
+    kind: str = Query("inbound", pattern="^(inbound|outbound)$"),
+    tag: Optional[str] = None,
+    hours: int = Query(24, ge=1, le=24 * 7),
+):
+    # Without `tag` the buckets are summed over all tags of the kind, i.e. the whole node.
+    since = int(time.time()) - hours * 3600
+    rows = crud.get_traffic_history(db, kind, tag, since)
+    return FastJSONResponse([{"bucket": r.bucket, "up": r.up, "down": r.down} for r in rows])
+
 @app.get("/api/v1/panel/settings", dependencies=[Depends(require_auth)])
 async def read_settings(db: Session = Depends(get_db)):
     settings = crud.get_settings(db)
     return settings
 
+@app.get("/api/v1/panel/traffic-webhook", dependencies=[Depends(require_auth)])
+async def read_traffic_webhook_status(db: Session = Depends(get_db)):
+    return dict(traffic_webhook.stats, enabled=traffic_webhook.target(db) is not None, queued=crud.count_traffic_outbox(db))
+
+@app.get("/api/v1/notifications", dependencies=[Depends(require_auth)])
+async def read_notifications():
+    return {"recent": list(reversed(notifier.recent)), "pending": len(notifier.pending), "suppressed": notifier.suppressed}
+
 @app.post("/api/v1/panel/settings", dependencies=[Depends(require_auth)])
 async def write_settings(settings_data: dict = Body(...), db: Session = Depends(get_db)):
     updated_settings = crud.update_settings(db, settings_data)
@@ -644,25 +756,74 @@ async def write_settings(settings_data: dict = Body(...), db: Session = Depends(
         raise HTTPException(status_code=404, detail="Settings not found.")
     return {"status": "success", "message": "Settings saved successfully."}
 
+# --- Background jobs: these return a job id at once; poll /api/v1/jobs/{id} ---
+def submit_job(kind: str, fn, *args, key: str = None):
+    try:
+        job_id, created = runner.submit(kind, fn, *args, key=key)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=f"Another operation of this type is in progress ({e.args[1]}).",
+                            headers={"X-Job-Id": e.args[0]})
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many background jobs queued.", headers={"Retry-After": "10"})
+    return JSONResponse(status_code=202, content={"status": "accepted", "job_id": job_id, "created": created})
+
+def job_to_dict(job: models.Job):
+    return {"id": job.id, "kind": job.kind, "status": job.status, "progress": job.progress, "message": job.message,
+            "created_at": job.created_at, "started_at": job.started_at, "finished_at": job.finished_at}
+
+def certbot_job(ctx, domain: str):
+    ctx.progress(10, "Requesting certificate from Let's Encrypt...")
+    result = ctx.run(["sudo", "certbot", "certonly", "--standalone", "-d", domain, "--non-interactive", "--agree-tos",
+                      "--email", f"admin@{domain}"], timeout=300)
+    if result.returncode != 0:
+        raise JobError(f"Certbot failed: {result.stderr.strip()}")
+    cert_path = f"/etc/letsencrypt/live/{domain}/fullchain.pem"
+    key_path = f"/etc/letsencrypt/live/{domain}/privkey.pem"
+    if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+        raise JobError("Certificate files not found after certbot run.")
+    db = SessionLocal()
+    try: crud.update_settings(db, {"domain_name": domain, "public_key_path": cert_path, "private_key_path": key_path})
+    finally: db.close()
+    return "Certificate obtained successfully! Please restart the panel."
+
+XRAY_ACTIONS = {"start": "started", "stop": "stopped", "restart": "restarted"}
+
+def xray_service_job(ctx, action: str):
+    ctx.progress(10, f"Running systemctl {action}...")
+    result = ctx.run(["sudo", "systemctl", action, "xray.service"], timeout=60)
+    if result.returncode != 0:
+        print(f"Error executing command: {result.stderr.strip()}")
+    if action == "restart": ctx.sleep(1)
+    running = get_xray_status() == "active"
+    xray_manager.restarted(running and action == "restart")
+    if running != (action != "stop"):
+        raise JobError(f"Failed to {action} Xray.")
+    return f"Xray {XRAY_ACTIONS[action]} successfully."
+
+@app.get("/api/v1/jobs", dependencies=[Depends(require_auth)])
+async def read_jobs(limit: int = Query(20, ge=1, le=200), db: Session = Depends(get_db)):
+    return [job_to_dict(job) for job in crud.get_jobs(db, limit)]
+
+@app.get("/api/v1/jobs/{job_id}", dependencies=[Depends(require_auth)])
+async def read_job(job_id: str, db: Session = Depends(get_db)):
+    job = crud.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job_to_dict(job)
+
+@app.post("/api/v1/jobs/{job_id}/cancel", dependencies=[Depends(require_auth)])
+async def cancel_job(job_id: str):
+    if not runner.cancel(job_id):
+        raise HTTPException(status_code=404, detail="No queued or running job with this id.")
+    return {"status": "success", "message": "Cancellation requested."}
+
 @app.post("/api/v1/panel/get-certificate", dependencies=[Depends(require_auth)])
-async def get_certificate(domain_info: DomainInfo, db: Session = Depends(get_db)):
+async def get_certificate(domain_info: DomainInfo):
     domain = domain_info.domain_name.strip()
     if not domain:
         raise HTTPException(status_code=400, detail="Domain name cannot be empty.")
-    command = f"sudo certbot certonly --standalone -d {domain} --non-interactive --agree-tos --email admin@{domain}"
-    try:
-        subprocess.run(command, shell=True, check=True, capture_output=True, text=True, timeout=300)
-        cert_path = f"/etc/letsencrypt/live/{domain}/fullchain.pem"
-        key_path = f"/etc/letsencrypt/live/{domain}/privkey.pem"
-        if os.path.exists(cert_path) and os.path.exists(key_path):
-            crud.update_settings(db, {"domain_name": domain, "public_key_path": cert_path, "private_key_path": key_path})
-            return {"status": "success", "message": "Certificate obtained successfully! Please restart the panel."}
-        else:
-            raise HTTPException(status_code=500, detail="Certificate files not found after certbot run.")
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=f"Certbot failed: {e.stderr.strip()}")
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=500, detail="Certbot command timed out.")
+    # One certbot run at a time (--standalone binds port 80); the same domain again returns the running job.
+    return submit_job(f"certbot-{domain}", certbot_job, domain, key="certbot")
 
 @app.post("/api/v1/panel/restart", dependencies=[Depends(require_auth)])
 async def restart_panel():
@@ -672,39 +833,31 @@ async def restart_panel():
     threading.Thread(target=restart_script).start()
     return {"status": "success", "message": "Panel is restarting..."}
 
-@app.post("/api/v1/xray/start", dependencies=[Depends(require_auth)])
-async def start_xray():
-    run_shell_command("sudo systemctl start xray.service")
-    if get_xray_status() == "active":
-        return {"status": "success", "message": "Xray started successfully."}
-    raise HTTPException(status_code=500, detail="Failed to start Xray.")
-
-@app.post("/api/v1/xray/stop", dependencies=[Depends(require_auth)])
-async def stop_xray():
-    run_shell_command("sudo systemctl stop xray.service")
-    if get_xray_status() != "active":
-        return {"status": "success", "message": "Xray stopped successfully."}
-    raise HTTPException(status_code=500, detail="Failed to stop Xray.")
-
-@app.post("/api/v1/xray/restart", dependencies=[Depends(require_auth)])
-async def restart_xray():
-    run_shell_command("sudo systemctl restart xray.service")
-    time.sleep(1)
-    if get_xray_status() == "active":
-        return {"status": "success", "message": "Xray restarted successfully."}
-    raise HTTPException(status_code=500, detail="Failed to restart Xray.")
+@app.get("/api/v1/xray/runtime", dependencies=[Depends(require_auth)])
+async def read_xray_runtime(minutes: int = Query(60, ge=1, le=24 * 60)):
+    # Ring-buffered GetSysStats samples; see app/health.py.
+    return FastJSONResponse(dict(sampler.summary(), samples=sampler.history(time.time() - minutes * 60)))
+
+@app.post("/api/v1/xray/{action}", dependencies=[Depends(require_auth)])
+async def control_xray(action: str):
+    if action not in XRAY_ACTIONS:
+        raise HTTPException(status_code=404, detail="Unknown action.")
+    # Single-flight across start/stop/restart: they all act on the same service.
+    return submit_job(f"xray-{action}", xray_service_job, action, key="xray")
 
 
 if __name__ == "__main__":
+    import uvicorn
+    create_db_and_tables()
     db = SessionLocal()
     
     # NEW: Read port from environment variable set by the service file
-    default_port = crud.get_settings(db).listen_port if crud.get_settings(db) else 2053
+    settings = crud.get_settings(db) # None on the very first run, when it creates the defaults
+    default_port = settings.listen_port if settings else 2053
     listen_port = int(os.environ.get("VUI_PORT", default_port))
 
-    settings = crud.get_settings(db)
-    public_key = settings.public_key_path
-    private_key = settings.private_key_path
+    public_key = settings.public_key_path if settings else ""
+    private_key = settings.private_key_path if settings else ""
     
     db.close()
     
@@ -723,4 +876,5 @@ if __name__ == "__main__":
         uvicorn_args["ssl_keyfile"] = private_key
         uvicorn_args["ssl_certfile"] = public_key
 
-    uvicorn.run("main:app", **uvicorn_args)
\ No newline at end of file
+    # Pass the app object itself: "main:app" would import this module a second time.
+    uvicorn.run(app, **uvicorn_args)
@@ -2,7 +2,8 @@
 document.addEventListener('DOMContentLoaded', () => {
     // --- STATE & CACHE ---
     let statsInterval = null;
-    const clientDataCache = new Map();
+    let clientTable = null;  // the expanded inbound's client table (see createClientTable)
+    const clientLinkCache = new Map();
 
     // --- DOM ELEMENTS ---
     const inboundsTbody = document.getElementById('inbounds-table-body');
@@ -34,7 +35,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const qrModal = setupModal(qrCodeModal, null);
 
     // --- HELPERS ---
-    const apiCall = async (url, options = {}) => {
+    const apiCall = async (url, options = {}, withHeaders = false) => {
         try {
             const response = await fetch(url, options);
             if (response.status === 401) {
@@ -46,6 +47,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorData.detail);
             }
             if (response.status === 204) return null;
+            if (withHeaders) return { data: await response.json(), headers: response.headers };
             return response.json();
         } catch (error) {
             console.error('API Call Failed:', error);
@@ -79,7 +81,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const renderInbounds = (inbounds) => {
         inboundsTbody.innerHTML = '';
         if (inbounds.length === 0) {
-            inboundsTbody.innerHTML = '<tr><td colspan="8" class="text-center">No inbounds found.</td></tr>';
+            inboundsTbody.innerHTML = '<tr><td colspan="9" class="text-center">No inbounds found.</td></tr>';
             return;
         }
         inbounds.forEach(ib => {
@@ -92,87 +94,205 @@ document.addEventListener('DOMContentLoaded', () => {
                     <td>${ib.port}</td>
                     <td><span class="protocol-tag">${ib.protocol}</span></td>
                     <td><span class="client-count">${ib.client_count}</span></td>
+                    <td><div class="traffic-text">↑ ${formatBytes(ib.up_traffic)} / ↓ ${formatBytes(ib.down_traffic)}</div><div class="traffic-text">${formatBytes(Math.round(ib.up_speed + ib.down_speed))}/s</div></td>
                     <td><button class="btn-danger btn-sm" data-action="delete-inbound">Delete</button></td>
                 </tr>
-                <tr class="clients-row" id="clients-row-${ib.id}"><td colspan="8" class="clients-container"></td></tr>
+                <tr class="clients-row" id="clients-row-${ib.id}"><td colspan="9" class="clients-container"></td></tr>
             `;
         });
     };
 
-    const renderClients = (inboundId, clients) => {
-        const container = document.querySelector(`#clients-row-${inboundId} .clients-container`);
-        if (!container) return; 
+    // --- CLIENT TABLE ---
+    // Only the rows in (or near) the viewport exist in the DOM; spacer rows stand in
+    // for the rest. Each refresh patches the cells whose text changed, keyed by
+    // client id, instead of rebuilding the table.
+    const CLIENT_ROW_HEIGHT = 56;  // keep in sync with .virtual-clients .client-row in inbounds.css
+    const CLIENT_OVERSCAN = 10;
+    const CLIENT_PAGE_SIZE = 1000;
+
+    const clientView = (c) => {
+        const totalBytes = c.total_gb * 1024 * 1024 * 1024;
+        const percentage = totalBytes > 0 ? (c.used_traffic_bytes / totalBytes) * 100 : 0;
+        return {
+            enabled: c.enabled,
+            online: c.online ? 'online-status online' : 'online-status offline',
+            onlineText: (c.online ? 'Online' : 'Offline') + (c.ip_count > 1 ? ` · ${c.ip_count} IPs` : ''),
+            remark: c.remark,
+            barWidth: `${Math.min(percentage, 100)}%`,
+            traffic: `${formatBytes(c.used_traffic_bytes)} ${c.total_gb > 0 ? `/ ${c.total_gb.toFixed(2)} GB` : '/ ∞'}`,
+            expiry: formatDate(c.expiry_time),
+        };
+    };
+
+    const createClientRow = (c) => {
+        const tr = document.createElement('tr');
+        tr.className = 'client-row';
+        tr.dataset.id = c.id;
+        tr.innerHTML = `
+            <td>
+                <div class="client-menu-icons">
+                    <i class="fas fa-qrcode" title="Show QR Code" data-action="show-qr"></i>
+                    <i class="fas fa-copy" title="Copy Link" data-action="copy-link"></i>
+                    <i class="fas fa-edit" title="Edit Client" data-action="edit-client"></i>
+                </div>
+            </td>
+            <td><label class="switch"><input type="checkbox" data-action="toggle-client"><span class="slider"></span></label></td>
+            <td><div class="online-status"><span class="dot"></span><span class="online-text"></span></div></td>
+            <td class="client-remark"></td>
+            <td>
+                <div class="traffic-bar"><div class="traffic-bar-fill"></div></div>
+                <div class="traffic-text"></div>
+            </td>
+            <td class="client-expiry"></td>
+            <td><button class="btn-danger btn-sm" data-action="delete-client">Delete</button></td>`;
+        tr._cells = {
+            enabled: tr.querySelector('[data-action="toggle-client"]'),
+            online: tr.querySelector('.online-status'),
+            onlineText: tr.querySelector('.online-text'),
+            remark: tr.querySelector('.client-remark'),
+            bar: tr.querySelector('.traffic-bar-fill'),
+            traffic: tr.querySelector('.traffic-text'),
+            expiry: tr.querySelector('.client-expiry'),
+        };
+        tr._shown = {};
+        patchClientRow(tr, c);
+        return tr;
+    };
 
-        clientDataCache.set(inboundId, clients);
+    const patchClientRow = (tr, c) => {
+        const view = clientView(c);
+        const shown = tr._shown;
+        const cells = tr._cells;
+        if (shown.enabled !== view.enabled) cells.enabled.checked = view.enabled;
+        if (shown.online !== view.online) cells.online.className = view.online;
+        if (shown.onlineText !== view.onlineText) cells.onlineText.textContent = view.onlineText;
+        if (shown.remark !== view.remark) cells.remark.textContent = view.remark;
+        if (shown.barWidth !== view.barWidth) cells.bar.style.width = view.barWidth;
+        if (shown.traffic !== view.traffic) cells.traffic.textContent = view.traffic;
+        if (shown.expiry !== view.expiry) cells.expiry.textContent = view.expiry;
+        tr._shown = view;
+    };
 
-        let clientsHtml = `
+    const createClientTable = (inboundId, container) => {
+        container.innerHTML = `
             <div class="clients-sub-table-wrapper">
                 <div class="sub-table-header">
-                    <h4>Clients</h4>
+                    <h4>Clients <span class="client-total"></span></h4>
                     <button class="btn btn-primary btn-sm" data-action="add-client"><i class="fas fa-plus"></i> Add Client</button>
                 </div>
-                <table>
-                    <thead>
-                        <tr>
-                            <th style="width: 15%;">Menu</th>
-                            <th style="width: 10%;">Enabled</th>
-                            <th style="width: 10%;">Online</th>
-                            <th>Client</th>
-                            <th style="width: 25%;">Traffic</th>
-                            <th style="width: 10%;">Duration</th>
-                            <th style="width: 10%;">Actions</th>
-                        </tr>
-                    </thead>
-                    <tbody>`;
-        if (clients.length > 0) {
-            clients.forEach(c => {
-                const totalBytes = c.total_gb * 1024 * 1024 * 1024;
-                const usedBytes = c.used_traffic_bytes;
-                const percentage = totalBytes > 0 ? (usedBytes / totalBytes) * 100 : 0;
-                const trafficLimitText = c.total_gb > 0 ? `/ ${c.total_gb.toFixed(2)} GB` : '/ ∞';
-                const onlineStatus = c.online ? 'online' : 'offline';
-                const onlineText = c.online ? 'Online' : 'Offline';
+                <div class="virtual-clients">
+                    <table>
+                        <thead>
+                            <tr>
+                                <th style="width: 15%;">Menu</th>
+                                <th style="width: 10%;">Enabled</th>
+                                <th style="width: 10%;">Online</th>
+                                <th>Client</th>
+                                <th style="width: 25%;">Traffic</th>
+                                <th style="width: 10%;">Duration</th>
+                                <th style="width: 10%;">Actions</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+                            <tr class="spacer-row"><td colspan="7"></td></tr>
+                            <tr class="empty-row" style="display: none;"><td colspan="7" class="text-center">No clients for this inbound.</td></tr>
+                            <tr class="spacer-row"><td colspan="7"></td></tr>
+                        </tbody>
+                    </table>
+                </div>
+            </div>`;
+        const scroller = container.querySelector('.virtual-clients');
+        const [topSpacer, bottomSpacer] = container.querySelectorAll('.spacer-row');
+        const table = {
+            inboundId: String(inboundId),
+            clients: [],
+            byId: new Map(),
+            rendered: new Map(),
+            loading: false,
+            scroller,
+            tbody: container.querySelector('tbody'),
+            emptyRow: container.querySelector('.empty-row'),
+            total: container.querySelector('.client-total'),
+            topSpacer: topSpacer.firstElementChild,
+            bottomSpacer,
+        };
+        table.render = () => renderClientWindow(table);
+        let frame = null;
+        scroller.addEventListener('scroll', () => {
+            if (frame) return;
+            frame = requestAnimationFrame(() => { frame = null; table.render(); });
+        });
+        return table;
+    };
 
-                clientsHtml += `
-                    <tr class="client-row" data-id="${c.id}">
-                        <td>
-                            <div class="client-menu-icons">
-                                <i class="fas fa-qrcode" title="Show QR Code" data-action="show-qr"></i>
-                                <i class="fas fa-copy" title="Copy Link" data-action="copy-link"></i>
-                                <i class="fas fa-edit" title="Edit Client" data-action="edit-client"></i>
-                            </div>
-                        </td>
-                        <td><label class="switch"><input type="checkbox" ${c.enabled ? 'checked' : ''} data-action="toggle-client"><span class="slider"></span></label></td>
-                        <td>
-                            <div class="online-status ${onlineStatus}">
-                                <span class="dot"></span>
-                                <span>${onlineText}</span>
-                            </div>
-                        </td>
-                        <td>${c.remark}</td>
-                        <td>
-                            <div class="traffic-bar"><div class="traffic-bar-fill" style="width: ${Math.min(percentage, 100)}%;"></div></div>
-                            <div class="traffic-text">${formatBytes(usedBytes)} ${trafficLimitText}</div>
-                        </td>
-                        <td>${formatDate(c.expiry_time)}</td>
-                        <td><button class="btn-danger btn-sm" data-action="delete-client">Delete</button></td>
-                    </tr>
-                `;
-            });
-        } else {
-            clientsHtml += '<tr><td colspan="7" class="text-center">No clients for this inbound.</td></tr>';
+    const renderClientWindow = (table) => {
+        const { clients, rendered, scroller } = table;
+        const viewport = scroller.clientHeight || 10 * CLIENT_ROW_HEIGHT;
+        const start = Math.max(0, Math.floor(scroller.scrollTop / CLIENT_ROW_HEIGHT) - CLIENT_OVERSCAN);
+        const end = Math.min(clients.length, Math.ceil((scroller.scrollTop + viewport) / CLIENT_ROW_HEIGHT) + CLIENT_OVERSCAN);
+        const visible = clients.slice(start, end);
+
+        const keep = new Set(visible.map(c => c.id));
+        rendered.forEach((tr, id) => {
+            if (!keep.has(id)) { tr.remove(); rendered.delete(id); }
+        });
+        let anchor = table.bottomSpacer;
+        for (let i = visible.length - 1; i >= 0; i--) {
+            const c = visible[i];
+            let tr = rendered.get(c.id);
+            if (tr) patchClientRow(tr, c);
+            else { tr = createClientRow(c); rendered.set(c.id, tr); }
+            if (tr.nextSibling !== anchor) table.tbody.insertBefore(tr, anchor);
+            anchor = tr;
+        }
+        table.topSpacer.style.height = `${start * CLIENT_ROW_HEIGHT}px`;
+        table.bottomSpacer.firstElementChild.style.height = `${(clients.length - end) * CLIENT_ROW_HEIGHT}px`;
+        table.emptyRow.style.display = clients.length ? 'none' : '';
+        table.total.textContent = clients.length ? `(${clients.length})` : '';
+    };
+
+    // Compact rows in pages; share links are fetched per client when needed (getClientLinks).
+    const fetchClients = async (inboundId) => {
+        const clients = [];
+        let cursor = null;
+        do {
+            const params = new URLSearchParams({ limit: CLIENT_PAGE_SIZE, fields: 'compact' });
+            if (cursor) params.set('cursor', cursor);
+            const page = await apiCall(`/api/v1/inbounds/${inboundId}/stats?${params}`, {}, true);
+            if (!page) return null;
+            clients.push(...page.data);
+            cursor = page.headers.get('X-Next-Cursor');
+        } while (cursor);
+        return clients;
+    };
+
+    const getClientLinks = async (clientId) => {
+        if (!clientLinkCache.has(clientId)) {
+            clientLinkCache.set(clientId, await apiCall(`/api/v1/clients/${clientId}/links`));
         }
-        clientsHtml += '</tbody></table></div>';
-        container.innerHTML = clientsHtml;
+        return clientLinkCache.get(clientId);
     };
 
     const updateStats = async (inboundId) => {
+        const container = document.querySelector(`#clients-row-${inboundId} .clients-container`);
+        if (!container) return;
+        if (!clientTable || clientTable.inboundId !== String(inboundId) || !container.contains(clientTable.scroller)) {
+            clientTable = createClientTable(inboundId, container);
+        }
+        const table = clientTable;
+        if (table.loading) return;  // the previous refresh is still walking its pages
+        table.loading = true;
         try {
-            const clients = await apiCall(`/api/v1/inbounds/${inboundId}/stats`);
-            renderClients(inboundId, clients);
+            const clients = await fetchClients(inboundId);
+            if (!clients || table !== clientTable) return;
+            table.clients = clients;
+            table.byId = new Map(clients.map(c => [String(c.id), c]));
+            table.render();
         } catch (error) {
             console.error("Failed to update stats:", error);
             if (statsInterval) clearInterval(statsInterval);
+        } finally {
+            table.loading = false;
         }
     };
 
@@ -188,10 +308,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const clientRow = target.closest('.client-row');
         const clientId = clientRow?.dataset.id;
 
-        const getClientData = (id) => {
-            const allClients = Array.from(clientDataCache.values()).flat();
-            return allClients.find(c => c.id == id);
-        }
+        const getClientData = (id) => clientTable?.byId.get(String(id));
 
         switch (action) {
             case 'expand':
@@ -199,6 +316,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 const isOpening = !clientsRow.classList.contains('active');
                 
                 if (statsInterval) clearInterval(statsInterval);
+                clientTable = null;
+                clientLinkCache.clear();
 
                 document.querySelectorAll('.clients-row.active').forEach(row => row.classList.remove('active'));
                 document.querySelectorAll('.expand-btn').forEach(btn => btn.textContent = '+');
@@ -215,6 +334,7 @@ document.addEventListener('DOMContentLoaded', () => {
             case 'show-qr': {
                 const client = getClientData(clientId);
                 if (!client) return;
+                const links = await getClientLinks(client.id);
             
                 const qrSubContainer = document.getElementById('qr-sub-container');
                 const qrClientContainer = document.getElementById('qr-client-container');
@@ -233,13 +353,13 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
             
                 qrClientRemark.textContent = `Client: ${client.remark}`;
-                qrClientContainer.dataset.linkDomain = client.config_link_domain || '';
-                qrClientContainer.dataset.linkIp = client.config_link_ip || '';
+                qrClientContainer.dataset.linkDomain = links.config_link_domain || '';
+                qrClientContainer.dataset.linkIp = links.config_link_ip || '';
                 
-                const defaultLink = client.config_link_domain || client.config_link_ip;
+                const defaultLink = links.config_link_domain || links.config_link_ip;
                 generateQrCode(qrClientContainer, defaultLink);
                 
-                qrUseIpToggle.checked = !client.config_link_domain;
+                qrUseIpToggle.checked = !links.config_link_domain;
                 
                 qrModal.show();
                 break;
@@ -255,11 +375,10 @@ document.addEventListener('DOMContentLoaded', () => {
                         headers: {'Content-Type': 'application/json'},
                         body: JSON.stringify({ enabled: newStatus })
                     });
-                    const allClients = Array.from(clientDataCache.values()).flat();
-                    allClients.forEach(c => {
+                    clientTable.clients.forEach(c => {
                         if (c.sub_remark === client.sub_remark) c.enabled = newStatus;
                     });
-                    renderClients(inboundId, clientDataCache.get(inboundId));
+                    clientTable.render();
                 } catch(e) {
                     target.checked = !newStatus;
                 }
@@ -290,7 +409,8 @@ document.addEventListener('DOMContentLoaded', () => {
             case 'copy-link': {
                 const client = getClientData(clientId);
                 if (!client) return;
-                const link = client.config_link_domain || client.config_link_ip;
+                const links = await getClientLinks(client.id);
+                const link = links.config_link_domain || links.config_link_ip;
                 navigator.clipboard.writeText(link).then(() => alert('Config link copied!'));
                 break;
             }
@@ -425,7 +545,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (expandBtn) expandBtn.click();
             }
         } catch (error) {
-            inboundsTbody.innerHTML = `<tr><td colspan="8" class="text-center">Error: ${error.message}</td></tr>`;
+            inboundsTbody.innerHTML = `<tr><td colspan="9" class="text-center">Error: ${error.message}</td></tr>`;
         }
     };
     main();